@@ -0,0 +1,129 @@
+"""冷启动测试：新启动的服务进程和新打开的会话多久能显示出第一屏
+
+每一轮启动一个新的进程（相当于重新启动服务），数据目录中预先放好评论和公告，然后用 AppTest：
+    first_session   进程中的第一个会话第一次运行页面（包括导入各模块、打开存储后端）
+    new_session     之后新打开的会话第一次运行页面
+    comments_tab    新会话切换到评论区（第一次需要读取评论）
+    search          在评论区搜索（第一次需要建立搜索索引）
+每个指标还单独统计页面脚本本身的运行时间（性能计时中的 rerun，不含 AppTest 的开销），记为 <指标>_script。
+启用性能计时（PERF_TIMING=1），最后输出第一个会话中各部分的耗时，作为启动过程的剖析。
+
+用法：
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --backend sqlite --comments 50000 --runs 5
+
+每个指标输出一行 JSON（各轮的百分位），最后一行是第一个会话中耗时最多的部分。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import make_announcements, make_comments  # noqa: E402
+from load_test import MAIN_SCRIPT, percentiles  # noqa: E402
+
+COMMENTS_TAB = "💬 评论区"
+SEARCH_QUERY = "海绵宝宝"
+
+
+def seed_data(workdir, backend, comments, announcements):
+    """按 main.py 的文件名在数据目录中写入评论和公告"""
+    import storage
+
+    store = storage.open_backend(
+        backend, os.path.join(workdir, "comments.json"), os.path.join(workdir, "announcements.json"),
+        log_file=os.path.join(workdir, "comments.log"),
+        snapshot_file=os.path.join(workdir, "comments.snapshot.json"),
+        db_file=os.path.join(workdir, "data.db"),
+    )
+    store.save_comments(make_comments(comments))
+    store.save_announcements(make_announcements(announcements))
+
+
+def cold_start(workdir, backend, sessions, settle):
+    """在新进程中运行：返回各指标的耗时（秒）和第一个会话的性能计时"""
+    os.chdir(workdir)
+    os.environ["DATA_DIR"] = workdir
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ["PARSER_PROBE"] = "0"
+    os.environ["PERF_TIMING"] = "1"
+    from streamlit.testing.v1 import AppTest
+
+    import perf
+
+    timings = {}
+
+    def script_seconds():
+        return sum(row['mean'] * row['count'] for row in perf.snapshot() if row['name'] == 'rerun')
+
+    def timed(name, fn):
+        script = script_seconds()
+        start = time.perf_counter()
+        result = fn()
+        timings.setdefault(name, []).append(time.perf_counter() - start)
+        timings.setdefault(f"{name}_script", []).append(script_seconds() - script)
+        if result.exception:
+            raise RuntimeError(f"{name}: {result.exception[0].message}")
+        return result
+
+    timed('first_session', lambda: AppTest.from_file(MAIN_SCRIPT, default_timeout=120).run())
+    profile = perf.snapshot()
+    # 服务启动后过一会儿才有新会话（预热在这段时间里完成）
+    time.sleep(settle)
+    for _ in range(sessions):
+        at = timed('new_session', lambda: AppTest.from_file(MAIN_SCRIPT, default_timeout=120).run())
+        at.session_state["main_tab"] = COMMENTS_TAB
+        at = timed('comments_tab', at.run)
+        at.text_input(key="comment_search").input(SEARCH_QUERY)
+        timed('search', at.run)
+    return timings, profile
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default=os.environ.get("STORAGE_BACKEND", "log"),
+                        choices=["json", "log", "sqlite"])
+    parser.add_argument("--comments", type=int, default=20000)
+    parser.add_argument("--announcements", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3, help="启动新进程的次数")
+    parser.add_argument("--sessions", type=int, default=3, help="每个进程中之后打开的新会话数")
+    parser.add_argument("--settle", type=float, default=1.0, help="第一个会话之后等待多久再打开新会话（秒）")
+    parser.add_argument("--top", type=int, default=8, help="启动剖析中列出的部分数")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    timings = {}
+    profiles = []
+    with tempfile.TemporaryDirectory() as workdir:
+        seed = context.Process(target=seed_data, args=(workdir, args.backend, args.comments, args.announcements))
+        seed.start()
+        seed.join()
+        for _ in range(args.runs):
+            with context.Pool(1) as pool:
+                run_timings, profile = pool.apply(cold_start, (workdir, args.backend, args.sessions, args.settle))
+            for name, samples in run_timings.items():
+                timings.setdefault(name, []).extend(samples)
+            profiles.append(profile)
+
+    for name, samples in timings.items():
+        print(json.dumps({'metric': name, 'backend': args.backend, 'comments': args.comments,
+                          **percentiles(samples)}, ensure_ascii=False), flush=True)
+    # 启动剖析：第一个会话中各部分的平均耗时（毫秒），按耗时排序
+    totals = {}
+    for profile in profiles:
+        for row in profile:
+            totals[row['name']] = totals.get(row['name'], 0.0) + row['mean'] * row['count']
+    top = sorted(totals.items(), key=lambda item: -item[1])[:args.top]
+    print(json.dumps({'metric': 'first_session_profile',
+                      'ms': {name: round(total / len(profiles) * 1000, 2) for name, total in top}},
+                     ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,124 @@
+"""评论存储基准测试：最初 main.py 中的整文件 JSON 读写 vs 追加日志存储
+
+用法：
+    python benchmarks/bench_comment_log.py --sizes 10000,100000,1000000 --ops 20
+
+每一行输出一个 JSON 结果，方便在不同提交之间对比。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import comment_log  # noqa: E402
+from datagen import make_comments  # noqa: E402
+
+
+# main.py 中原来的 load_comments / save_comments（保留作对比基准，只把 st.error 换成输出到 stderr、
+# 文件名改成参数）。原来每次页面运行都重新读取整个文件，点赞时改完内存中的列表再整体写回。
+def legacy_load_comments(comments_file):
+    """从JSON文件加载评论数据"""
+    try:
+        if os.path.exists(comments_file):
+            with open(comments_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"加载评论数据失败: {e}", file=sys.stderr)
+    return []
+
+
+def legacy_save_comments(comments_file, comments):
+    """保存评论数据到JSON文件"""
+    try:
+        with open(comments_file, 'w', encoding='utf-8') as f:
+            json.dump(comments, f, ensure_ascii=False, indent=2)
+        return True
+    except Exception as e:
+        print(f"保存评论数据失败: {e}", file=sys.stderr)
+        return False
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def bench_size(n, ops, workdir):
+    comments = make_comments(n)
+    results = []
+
+    # 旧实现：每次页面运行都重新读取，点赞时整文件重写
+    legacy_file = os.path.join(workdir, f"legacy_{n}.json")
+    legacy_save_comments(legacy_file, comments)
+
+    def legacy_read():
+        legacy_load_comments(legacy_file)
+
+    def legacy_like():
+        # 点赞按钮触发的那次页面运行：先读取，再改一条的点赞数并整体写回
+        current = legacy_load_comments(legacy_file)
+        current[0]['likes'] += 1
+        legacy_save_comments(legacy_file, current)
+
+    results.append(('legacy_json', 'read', timed(legacy_read, ops)))
+    results.append(('legacy_json', 'like', timed(legacy_like, ops)))
+
+    # 追加日志：冷启动从快照加载一次，之后只读取新增字节
+    log_path = os.path.join(workdir, f"log_{n}.log")
+    snapshot_path = os.path.join(workdir, f"log_{n}.snapshot.json")
+    comment_log.CommentLog(log_path, snapshot_path).import_comments(comments)
+
+    cold_start = time.perf_counter()
+    store = comment_log.CommentLog(log_path, snapshot_path)
+    store.refresh()
+    results.append(('comment_log', 'cold_load', time.perf_counter() - cold_start))
+
+    target = comments[0]['id']
+    results.append(('comment_log', 'read', timed(store.refresh, ops)))
+    results.append(('comment_log', 'like', timed(lambda: store.like(target), ops)))
+    results.append(('comment_log', 'add', timed(lambda: store.add("基准", "测试评论"), ops)))
+
+    # 另一个进程写入后，本进程只需读取新追加的字节
+    other = comment_log.CommentLog(log_path, snapshot_path)
+    other.refresh()
+
+    def tail_one():
+        other.like(target)
+        store.refresh()
+
+    results.append(('comment_log', 'tail_remote_like', timed(tail_one, ops)))
+
+    start = time.perf_counter()
+    store.compact()
+    results.append(('comment_log', 'compact', time.perf_counter() - start))
+
+    return [
+        {'bench': 'comment_store', 'impl': impl, 'op': op, 'comments': n, 'seconds': round(seconds, 6)}
+        for impl, op, seconds in results
+    ]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--ops", type=int, default=20, help="每项操作重复次数（取中位数）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in (int(size) for size in args.sizes.split(",")):
+            for row in bench_size(n, args.ops, workdir):
+                print(json.dumps(row, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,228 @@
+"""HLS 中继的本地测试：同一集视频有多个观众时，直接从上游播放 vs 经本机中继播放
+
+在本机启动一个模拟的上游（每个请求有固定延迟、每个连接限速），多个观众错开几秒开始观看同一个播放列表：
+观众先取播放列表，再按播放进度依次取分片（最多提前缓冲一个分片），分片没有按时到达时记为卡顿。
+
+用法：
+    python benchmarks/bench_hls_relay.py
+    python benchmarks/bench_hls_relay.py --viewers 16 --segments 10 --latency 0.2
+
+每种方式输出一行 JSON：起播时间（取到播放列表和第一个分片）、卡顿时间、上游请求数和流量；
+最后一行检查中继的签名校验、Range 请求，以及不转发内网地址。
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import hls_relay  # noqa: E402
+from load_test import percentiles  # noqa: E402
+
+PRIVATE_URL = "http://169.254.169.254/latest/meta-data/"
+
+
+def make_origin(segments, segment_bytes, segment_seconds, latency, bandwidth):
+    """模拟上游：/video/index.m3u8 和 /video/seg{i}.ts，记录请求数和发送的字节数；
+    /video/moved.m3u8 跳转到内网地址"""
+    counters = {'requests': 0, 'bytes': 0}
+    lock = threading.Lock()
+    playlist = "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:{}\n".format(int(segment_seconds) + 1)
+    playlist += "".join(f"#EXTINF:{segment_seconds:.3f},\nseg{i}.ts\n" for i in range(segments))
+    playlist += "#EXT-X-ENDLIST\n"
+
+    class OriginHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path == "/video/index.m3u8":
+                body = playlist.encode()
+            elif self.path.startswith("/video/seg") and self.path.endswith(".ts"):
+                seed = hashlib.sha1(self.path.encode()).digest()
+                body = (seed * (segment_bytes // len(seed) + 1))[:segment_bytes]
+            elif self.path == "/video/moved.m3u8":
+                self.send_response(302)
+                self.send_header("Location", PRIVATE_URL)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            else:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with lock:
+                counters['requests'] += 1
+                counters['bytes'] += len(body)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            # 按连接限速发送
+            step = max(1, int(bandwidth / 20))
+            for offset in range(0, len(body), step):
+                self.wfile.write(body[offset:offset + step])
+                time.sleep(step / bandwidth)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counters
+
+
+def watch(playlist_url, segment_seconds):
+    """一个观众：返回 (起播秒数, 卡顿秒数)"""
+    session = requests.Session()
+    start = time.perf_counter()
+    response = session.get(playlist_url, timeout=30)
+    response.raise_for_status()
+    lines = [line for line in response.text.splitlines() if line and not line.startswith('#')]
+    segment_urls = [requests.compat.urljoin(response.url, line) for line in lines]
+    startup = None
+    stall = 0.0
+    play_start = None
+    for index, url in enumerate(segment_urls):
+        if play_start is not None:
+            # 最多提前缓冲一个分片：等到上一个分片开始播放时才请求这一个
+            wait = play_start + (index - 1) * segment_seconds + stall - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        session.get(url, timeout=30).raise_for_status()
+        now = time.perf_counter()
+        if play_start is None:
+            play_start = now
+            startup = now - start
+        else:
+            late = now - (play_start + index * segment_seconds + stall)
+            if late > 0:
+                stall += late
+    return startup, stall
+
+
+def run_viewers(playlist_url, viewers, stagger, segment_seconds):
+    def viewer(i):
+        time.sleep(i * stagger)
+        return watch(playlist_url, segment_seconds)
+
+    with ThreadPoolExecutor(viewers) as pool:
+        return list(pool.map(viewer, range(viewers)))
+
+
+def report(mode, results, counters, args, extra=None):
+    startups = [startup for startup, _ in results]
+    stalls = [stall for _, stall in results]
+    row = {
+        'mode': mode,
+        'viewers': args.viewers,
+        'segments': args.segments,
+        'startup': percentiles(startups),
+        'rebuffer_total_s': round(sum(stalls), 3),
+        'viewers_rebuffered': sum(1 for stall in stalls if stall > 0.01),
+        'upstream_requests': counters['requests'],
+        'upstream_mb': round(counters['bytes'] / 1048576, 2),
+    }
+    row.update(extra or {})
+    print(json.dumps(row, ensure_ascii=False), flush=True)
+
+
+def check_relay(relay, base_url, playlist_url):
+    """签名校验和 Range 请求"""
+    forged = base_url + "/s/0000000000000000/" + hls_relay._encode("http://example.com/a.ts") + ".ts"
+    text = requests.get(relay.playlist_url(playlist_url, base_url), timeout=30).text
+    first = base_url + [line for line in text.splitlines() if line and not line.startswith('#')][0]
+    whole = requests.get(first, timeout=30).content
+    ranged = requests.get(first, headers={'Range': 'bytes=100-199'}, timeout=30)
+    suffix = requests.get(first, headers={'Range': 'bytes=-50'}, timeout=30)
+    return {
+        'forged_status': requests.get(forged, timeout=30).status_code,
+        'range_status': ranged.status_code,
+        'range_ok': ranged.content == whole[100:200],
+        'suffix_ok': suffix.content == whole[-50:],
+        'cors': ranged.headers.get('Access-Control-Allow-Origin'),
+    }
+
+
+def check_private(upstream, cache_dir):
+    """默认设置的中继：本机上游返回 403，播放列表中的内网地址不改写，跳转到内网地址也不跟随"""
+    relay = hls_relay.HlsRelay(cache_dir=cache_dir, max_bytes=256 * 1048576)
+    try:
+        port = relay.start("127.0.0.1", 0)
+        base_url = f"http://127.0.0.1:{port}"
+        local_status = requests.get(relay.playlist_url(upstream, base_url), timeout=30).status_code
+        playlist = f"#EXTM3U\n#EXTINF:1,\n{PRIVATE_URL}\n#EXTINF:1,\nhttp://10.0.0.1/a.ts\n#EXTINF:1,\nhttp://8.8.8.8/b.ts\n"
+        text, segments = hls_relay.rewrite_playlist(playlist, "http://8.8.8.8/index.m3u8", relay.relay_path, relay.allowed)
+        # 把本机上游当作公网地址，检查跳转的下一跳
+        relay._hosts.put("127.0.0.1", True)
+        moved = upstream.replace("index.m3u8", "moved.m3u8")
+        redirect_status = requests.get(relay.playlist_url(moved, base_url), timeout=30).status_code
+    finally:
+        relay.close()
+    return {
+        'private_upstream_status': local_status,
+        'private_redirect_status': redirect_status,
+        'private_lines_kept': PRIVATE_URL in text and "http://10.0.0.1/a.ts" in text,
+        'public_rewritten': segments == ["http://8.8.8.8/b.ts"],
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--viewers", type=int, default=8)
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--segment-kb", type=int, default=256, help="每个分片的大小（KB）")
+    parser.add_argument("--segment-seconds", type=float, default=0.25, help="每个分片的播放时长（秒）")
+    parser.add_argument("--latency", type=float, default=0.15, help="上游每个请求的延迟（秒）")
+    parser.add_argument("--bandwidth-mb", type=float, default=2.0, help="上游每个连接的速度（MB/s）")
+    parser.add_argument("--stagger", type=float, default=0.3, help="观众开始观看的间隔（秒）")
+    args = parser.parse_args()
+
+    def origin():
+        return make_origin(args.segments, args.segment_kb * 1024, args.segment_seconds,
+                           args.latency, args.bandwidth_mb * 1048576)
+
+    # 直接从上游播放
+    server, counters = origin()
+    upstream = f"http://127.0.0.1:{server.server_address[1]}/video/index.m3u8"
+    report('direct', run_viewers(upstream, args.viewers, args.stagger, args.segment_seconds), counters, args)
+    server.shutdown()
+
+    # 经中继播放（空的磁盘缓存）
+    server, counters = origin()
+    upstream = f"http://127.0.0.1:{server.server_address[1]}/video/index.m3u8"
+    cache_dir = tempfile.mkdtemp(prefix="hls_relay_bench_")
+    relay = hls_relay.HlsRelay(cache_dir=cache_dir, max_bytes=256 * 1048576, allow_private=True)
+    try:
+        port = relay.start("127.0.0.1", 0)
+        base_url = f"http://127.0.0.1:{port}"
+        results = run_viewers(relay.playlist_url(upstream, base_url), args.viewers, args.stagger,
+                              args.segment_seconds)
+        stats = relay.stats()
+        report('relay', results, counters, args, {
+            'segment_hit_ratio': round(stats['hit_ratio'], 3),
+            'prefetches': stats['prefetches'],
+            'served_mb': round(stats['served_bytes'] / 1048576, 2),
+        })
+        checks = {**check_relay(relay, base_url, upstream), **check_private(upstream, cache_dir)}
+        print(json.dumps({'mode': 'checks', **checks}), flush=True)
+    finally:
+        relay.close()
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,268 @@
+"""整体基准测试：存储读写、评论搜索、链接标准化、卡片HTML生成（不需要浏览器和网络）
+
+用法：
+    python benchmarks/bench_suite.py > results.jsonl
+    python benchmarks/bench_suite.py --groups storage --sizes 1000,10000 --backends json,sqlite
+    python benchmarks/bench_suite.py --compare baseline.jsonl
+
+每一行输出一个 JSON 结果（带当前提交号），同一组 (bench, impl, op, size) 可以在不同提交之间对比；
+--compare 会读取之前保存的结果，输出每一项的耗时比值（大于1表示变慢）。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cards  # noqa: E402
+import comment_log  # noqa: E402
+import storage  # noqa: E402
+import url_rules  # noqa: E402
+from datagen import make_announcements, make_comments, make_url_corpus  # noqa: E402
+
+GROUPS = ("storage", "search", "urls", "render")
+
+# 搜索测试用的查询：常见词、长短语、单个汉字、英文、多个词、没有结果
+SEARCH_QUERIES = ["海绵宝宝", "太好用了", "蟹", "1080P", "派大星 有点卡", "不存在的词"]
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def median_time(fn, repeat):
+    """重复 repeat 次，返回耗时中位数（秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def row(bench, impl, op, size, seconds, items=1):
+    return {
+        'bench': bench, 'impl': impl, 'op': op, 'size': size,
+        'seconds': round(seconds, 7),
+        'per_second': round(items / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def open_backend(kind, workdir, n):
+    comments_file = os.path.join(workdir, f"{kind}_{n}_comments.json")
+    announcements_file = os.path.join(workdir, f"{kind}_{n}_announcements.json")
+    if kind == "json":
+        return storage.JsonBackend(comments_file, announcements_file)
+    if kind == "log":
+        return storage.LogBackend(comments_file, announcements_file,
+                                  os.path.join(workdir, f"{kind}_{n}.log"),
+                                  os.path.join(workdir, f"{kind}_{n}.snapshot.json"))
+    return storage.SqliteBackend(os.path.join(workdir, f"{kind}_{n}.db"))
+
+
+def bench_storage(sizes, announcement_sizes, backends, repeat, workdir):
+    rows = []
+    for kind in backends:
+        for n in sizes:
+            comments = make_comments(n)
+            backend = open_backend(kind, workdir, n)
+            backend.save_comments(comments)
+
+            def save_one_like():
+                comments[0]['likes'] += 1
+                backend.save_comments(comments)
+
+            rows.append(row('storage', kind, 'save_comments', n, median_time(save_one_like, repeat)))
+            rows.append(row('storage', kind, 'load_comments', n, median_time(backend.load_comments, repeat)))
+            rows.append(row('storage', kind, 'page_comments', n,
+                            median_time(lambda: backend.page_comments("newest", 20), repeat)))
+            rows.append(row('storage', kind, 'page_comments_by_likes', n,
+                            median_time(lambda: backend.page_comments("likes", 20), repeat)))
+            target = comments[n // 2]['id']
+            rows.append(row('storage', kind, 'like_comment', n,
+                            median_time(lambda: backend.like_comment(target), repeat)))
+
+            # 同一条评论连续点赞 100 次：逐次写入 vs 合并成一次写入
+            def like_burst_direct():
+                for _ in range(100):
+                    backend.like_comment(target)
+
+            def like_burst_batched():
+                for _ in range(100):
+                    backend.like_batcher.add(target)
+                backend.like_batcher.flush()
+
+            rows.append(row('storage', kind, 'like_burst_100', n, median_time(like_burst_direct, repeat), 100))
+            rows.append(row('storage', kind, 'like_burst_100_batched', n,
+                            median_time(like_burst_batched, repeat), 100))
+
+        for n in announcement_sizes:
+            announcements = make_announcements(n)
+            backend = open_backend(kind, workdir, f"a{n}")
+            rows.append(row('storage', kind, 'save_announcements', n,
+                            median_time(lambda: backend.save_announcements(announcements), repeat)))
+            backend.announcement_cache.invalidate()
+            rows.append(row('storage', kind, 'load_announcements', n,
+                            median_time(backend.load_announcements, repeat)))
+            cache = backend.announcement_cache
+            cache.get()
+            rows.append(row('storage', kind, 'load_announcements_cached', n, median_time(cache.get, repeat)))
+    return rows
+
+
+def bench_search(sizes, repeat, workdir):
+    rows = []
+    for n in sizes:
+        backend = open_backend("log", workdir, f"s{n}")
+        backend.save_comments(make_comments(n))
+        index = backend.search_index
+        start = time.perf_counter()
+        index.refresh()
+        rows.append(row('search', 'comment_search', 'build_index', n, time.perf_counter() - start, n))
+        for query in SEARCH_QUERIES:
+            rows.append(row('search', 'comment_search', f'query:{query}', n,
+                            median_time(lambda: index.search(query), repeat)))
+
+        # 增量更新：发表一条评论后第一次搜索（应用变更 + 查询）
+        def add_then_search():
+            backend.add_comment("测试员", "新的海绵宝宝评论", "2024-06-24 12:00:00")
+            index.search("海绵宝宝")
+
+        rows.append(row('search', 'comment_search', 'add_then_search', n, median_time(add_then_search, repeat)))
+    return rows
+
+
+def bench_urls(count, repeat):
+    corpus = make_url_corpus(count)
+    rows = []
+
+    def normalize_all():
+        for url in corpus:
+            url_rules.normalize_url(url)
+
+    def build_all():
+        for url in corpus:
+            url_rules.build_play_url(url, "https://jx.xymp4.cc/?url=")
+
+    def build_cold():
+        url_rules.play_url_cache.clear()
+        build_all()
+
+    rows.append(row('urls', 'url_rules', 'normalize_url', count, median_time(normalize_all, repeat), count))
+    rows.append(row('urls', 'url_rules', 'normalize_many', count,
+                    median_time(lambda: url_rules.normalize_many(corpus), repeat), count))
+    rows.append(row('urls', 'url_rules', 'build_play_url_cold', count, median_time(build_cold, repeat), count))
+    build_all()
+    rows.append(row('urls', 'url_rules', 'build_play_url_cached', count, median_time(build_all, repeat), count))
+    return rows
+
+
+def bench_render(count, repeat):
+    comments = make_comments(count)
+    announcements = make_announcements(count)
+    rows = []
+
+    def clear_card_caches():
+        cards._comment_card.cache_clear()
+        cards._announcement_card.cache_clear()
+
+    def render(builder, items, cold=True):
+        # 卡片HTML按内容缓存：cold 每次先清空缓存，测量生成HTML的耗时；否则测量命中缓存的耗时
+        def run():
+            if cold:
+                clear_card_caches()
+            for item in items:
+                builder(item)
+        return run
+
+    builders = [
+        ('comment_card', cards.comment_card, comments),
+        ('announcement_card', cards.announcement_card, announcements),
+        ('pinned_announcement_card', cards.pinned_announcement_card, announcements),
+    ]
+    for op, builder, items in builders:
+        rows.append(row('render', 'cards', op, count, median_time(render(builder, items), repeat), count))
+    for op, builder, items in builders:
+        render(builder, items)()    # 先填满缓存
+        rows.append(row('render', 'cards', f"{op}_cached", count,
+                        median_time(render(builder, items, cold=False), repeat), count))
+    # 评论区一页（20条）
+    page = comments[:20]
+    rows.append(row('render', 'cards', 'comment_page_20', 20,
+                    median_time(render(cards.comment_card, page), repeat)))
+    rows.append(row('render', 'cards', 'comment_page_20_cached', 20,
+                    median_time(render(cards.comment_card, page, cold=False), repeat)))
+    clear_card_caches()
+    return rows
+
+
+def compare(rows, baseline_path):
+    """和之前保存的结果对比，返回每一项的耗时比值"""
+    baseline = {}
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                old = json.loads(line)
+                baseline[(old['bench'], old['impl'], old['op'], old['size'])] = old
+    result = []
+    for new in rows:
+        old = baseline.get((new['bench'], new['impl'], new['op'], new['size']))
+        if old is None or not old['seconds']:
+            continue
+        result.append({
+            'bench': new['bench'], 'impl': new['impl'], 'op': new['op'], 'size': new['size'],
+            'baseline_commit': old.get('commit'), 'commit': new.get('commit'),
+            'baseline_seconds': old['seconds'], 'seconds': new['seconds'],
+            'ratio': round(new['seconds'] / old['seconds'], 3),
+        })
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", default=",".join(GROUPS), help="要运行的测试组：storage,search,urls,render")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="评论数量")
+    parser.add_argument("--announcement-sizes", default="10,100,1000", help="公告数量")
+    parser.add_argument("--backends", default=",".join(storage.BACKENDS))
+    parser.add_argument("--urls", type=int, default=50000, help="链接语料数量")
+    parser.add_argument("--cards", type=int, default=1000, help="生成卡片数量")
+    parser.add_argument("--repeat", type=int, default=7, help="每项重复次数（取中位数）")
+    parser.add_argument("--compare", metavar="BASELINE", help="与之前保存的 JSON Lines 结果对比")
+    args = parser.parse_args()
+
+    groups = args.groups.split(",")
+    commit = current_commit()
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        if "storage" in groups:
+            rows += bench_storage([int(n) for n in args.sizes.split(",")],
+                                  [int(n) for n in args.announcement_sizes.split(",")],
+                                  args.backends.split(","), args.repeat, workdir)
+        if "search" in groups:
+            rows += bench_search([int(n) for n in args.sizes.split(",")], args.repeat, workdir)
+        if "urls" in groups:
+            rows += bench_urls(args.urls, args.repeat)
+        if "render" in groups:
+            rows += bench_render(args.cards, args.repeat)
+        comment_log._stores.clear()
+
+    for result in rows:
+        result['commit'] = commit
+    if args.compare:
+        rows = compare(rows, args.compare)
+    for result in rows:
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main_cli()
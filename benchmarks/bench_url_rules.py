@@ -0,0 +1,93 @@
+"""链接标准化微基准：旧的 if 链实现 vs url_rules 查表实现
+
+用法：
+    python benchmarks/bench_url_rules.py --count 100000
+
+每一行输出一个 JSON 结果，方便在不同提交之间对比。
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import url_rules  # noqa: E402
+from datagen import make_url_corpus  # noqa: E402
+
+
+def legacy_process_video_url(url):
+    """main.py 中原来的 process_video_url（保留作对比基准）"""
+    original_url = url
+
+    if 'v.qq.com' in url:
+        parsed_url = urlparse(url)
+        query_params = parse_qs(parsed_url.query)
+        if 'vid' in query_params:
+            vid = query_params['vid'][0]
+            processed_url = f"https://v.qq.com/x/cover/{vid}.html"
+            return processed_url, f"🎬 腾讯视频链接已转换: {vid}"
+        else:
+            vid_match = re.search(r'vid=([^&]+)', url)
+            if vid_match:
+                vid = vid_match.group(1)
+                processed_url = f"https://v.qq.com/x/cover/{vid}.html"
+                return processed_url, f"🎬 腾讯视频链接已转换: {vid}"
+
+    if 'iqiyi.com' in url:
+        if 'm.iqiyi.com' in url:
+            processed_url = url.replace('m.iqiyi.com', 'www.iqiyi.com')
+            return processed_url, "📺 爱奇艺链接已转换为PC版"
+
+    if 'youku.com' in url:
+        if 'm.youku.com' in url:
+            processed_url = url.replace('m.youku.com', 'v.youku.com')
+            return processed_url, "🎞️ 优酷链接已转换为PC版"
+
+    if 'bilibili.com' in url:
+        if 'm.bilibili.com' in url:
+            processed_url = url.replace('m.bilibili.com', 'www.bilibili.com')
+            return processed_url, "📱 B站链接已转换为PC版"
+        if '/bangumi/play/' in url and 'ep' in url:
+            ep_match = re.search(r'ep(\d+)', url)
+            if ep_match:
+                ep_id = ep_match.group(1)
+                processed_url = f"https://www.bilibili.com/bangumi/play/ep{ep_id}"
+                return processed_url, f"📺 B站番剧链接已标准化: ep{ep_id}"
+
+    return original_url, None
+
+
+def bench(name, fn, corpus, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(corpus)
+        samples.append(time.perf_counter() - start)
+    best = min(samples)
+    return {'bench': 'url_normalize', 'impl': name, 'urls': len(corpus),
+            'seconds': round(best, 6), 'urls_per_second': round(len(corpus) / best)}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = make_url_corpus(args.count)
+    rows = [
+        bench('legacy_if_chain', lambda urls: [legacy_process_video_url(url) for url in urls], corpus, args.repeat),
+        bench('url_rules', lambda urls: [url_rules.normalize_url(url) for url in urls], corpus, args.repeat),
+        bench('url_rules_batch', url_rules.normalize_many, corpus, args.repeat),
+    ]
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,125 @@
+"""评论日志压缩的多进程测试：几个进程同时发表、点赞，日志被频繁压缩，最后检查评论和点赞一条不少
+
+每个进程用自己的 CommentLog 实例（相当于不同的服务进程）写同一个日志文件，压缩阈值设得很小，
+让每个进程都多次看到其他进程压缩后的日志。压缩替换日志文件时 inode 可能被重复使用，
+读者必须靠压缩代号（而不是 inode）发现日志已被替换，否则会从旧的位置继续读，之后压缩时用旧状态覆盖快照。
+
+另外检查翻页：读者拿到第一页的游标后，另一个进程删除最旧的几条评论并压缩，
+读者重新读取快照后第二页应该正好接着第一页（按最新和按点赞两种排序），不重复也不跳过。
+
+用法：
+    python benchmarks/compaction_test.py
+    python benchmarks/compaction_test.py --processes 8 --likes 300 --threshold 20
+
+输出一行 JSON；评论数或点赞数不对时退出码为 1。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import comment_log  # noqa: E402
+
+SEED_COMMENTS = 5
+PAGING_COMMENTS = 50
+PAGING_DELETED = 10
+PAGE_SIZE = 20
+
+
+def paths(workdir):
+    return os.path.join(workdir, "comments.log"), os.path.join(workdir, "comments.snapshot.json")
+
+
+def worker(workdir, seed, likes, adds, threshold, targets):
+    rng = random.Random(seed)
+    store = comment_log.CommentLog(*paths(workdir), compact_threshold=threshold)
+    actions = ['like'] * likes + ['add'] * adds
+    rng.shuffle(actions)
+    for i, action in enumerate(actions):
+        if action == 'like':
+            store.like(rng.choice(targets))
+        else:
+            store.add(f"进程{seed}", f"第{i}条")
+
+
+def delete_and_compact(workdir, comment_ids):
+    store = comment_log.CommentLog(*paths(workdir))
+    for comment_id in comment_ids:
+        store.delete(comment_id)
+    store.compact()
+
+
+def check_paging(context, workdir):
+    """另一个进程删除旧评论并压缩之后，用压缩前拿到的游标读第二页，返回各排序方式是否正确"""
+    store = comment_log.CommentLog(*paths(workdir))
+    for i in range(PAGING_COMMENTS):
+        comment = store.add("翻页", f"评论{i}", date="2026-01-01 12:00:00")
+        store.like(comment['id'], i % 7)
+    oldest = [comment['id'] for comment in store.page("newest", PAGING_COMMENTS)[0]][-PAGING_DELETED:]
+    first_pages = {order: store.page(order, PAGE_SIZE) for order in ("newest", "likes")}
+    # 第二页应该是压缩前第一页之后、没有被删除的评论
+    expected = {order: [comment['id'] for comment in store.page(order, PAGING_COMMENTS)[0][PAGE_SIZE:]
+                        if comment['id'] not in oldest][:PAGE_SIZE]
+                for order in ("newest", "likes")}
+
+    process = context.Process(target=delete_and_compact, args=(workdir, oldest))
+    process.start()
+    process.join()
+    store.refresh()
+    result = {}
+    for order, (_, cursor) in first_pages.items():
+        second, _ = store.page(order, PAGE_SIZE, cursor)
+        result[order] = [comment['id'] for comment in second] == expected[order]
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=6)
+    parser.add_argument("--likes", type=int, default=200, help="每个进程的点赞次数")
+    parser.add_argument("--adds", type=int, default=20, help="每个进程发表的评论数")
+    parser.add_argument("--threshold", type=int, default=30, help="压缩阈值（日志中的事件数）")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        store = comment_log.CommentLog(*paths(workdir), compact_threshold=args.threshold)
+        targets = [store.add("种子", f"评论{i}")['id'] for i in range(SEED_COMMENTS)]
+        processes = [context.Process(target=worker, args=(workdir, seed, args.likes, args.adds,
+                                                          args.threshold, targets))
+                     for seed in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        # 用一个新的实例从文件读取最终状态
+        final = comment_log.CommentLog(*paths(workdir))
+        final.refresh()
+        paging_dir = os.path.join(workdir, "paging")
+        os.mkdir(paging_dir)
+        paging = check_paging(context, paging_dir)
+        report = {
+            'processes': args.processes,
+            'comments': len(final),
+            'expected_comments': SEED_COMMENTS + args.processes * args.adds,
+            'likes': final.total_likes(),
+            'expected_likes': args.processes * args.likes,
+            'worker_failures': sum(1 for process in processes if process.exitcode != 0),
+            'paging_after_compaction': paging,
+        }
+    report['ok'] = (report['comments'] == report['expected_comments']
+                    and report['likes'] == report['expected_likes'] and not report['worker_failures']
+                    and all(paging.values()))
+    print(json.dumps(report, ensure_ascii=False), flush=True)
+    sys.exit(0 if report['ok'] else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,105 @@
+"""基准测试用的合成数据：带真实风格中文内容的评论、公告和视频链接
+
+所有生成器都接受 seed，同样的参数总是生成同样的数据，方便在不同提交之间对比。
+"""
+import random
+
+# 常用汉字（按评论区里常见的字挑选），用来拼出长度不一的句子
+COMMON_CHARS = (
+    "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感"
+)
+PHRASES = [
+    "海绵宝宝", "派大星", "蟹老板", "章鱼哥", "珊迪", "比奇堡", "蟹堡王", "痞老板",
+    "这个播放器", "解析速度", "画质", "清晰度", "弹幕", "追剧", "更新", "会员",
+    "太好用了", "终于能看了", "有点卡", "加载很快", "换了线路", "推荐", "收藏了", "支持一下",
+    "腾讯视频", "爱奇艺", "优酷", "B站", "芒果TV", "番剧", "电视剧", "综艺",
+]
+PUNCTUATION = "，。！？～、"
+EMOJIS = ["😂", "👍", "🍍", "🧽", "⭐", "❤️", "🎉", "😭", "🔥"]
+LATIN = ["666", "nice", "OK", "1080P", "4K", "bug", "yyds", "App"]
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何林"
+GIVEN_NAMES = ["小海绵", "派大星粉", "蟹堡", "珊迪", "阿强", "晓明", "丽丽", "大熊", "追剧人", "路人甲"]
+
+ANNOUNCEMENT_TITLES = ["🎉 新功能上线", "🔧 解析线路更新", "📢 维护通知", "🆕 版本更新", "💡 使用小技巧"]
+
+# 真实风格的链接模板
+URL_TEMPLATES = [
+    "https://m.v.qq.com/x/m/play?cid=mzc00200{n}&vid=v00{n}abc",
+    "https://v.qq.com/x/cover/mzc00200{n}/x00{n}.html",
+    "https://m.iqiyi.com/v_19rr{n}.html?vfm=m_331",
+    "https://www.iqiyi.com/v_19rr{n}.html",
+    "https://m.youku.com/alipay_video/id_XNT{n}.html",
+    "https://v.youku.com/v_show/id_XNT{n}.html?spm=a2hja",
+    "https://m.bilibili.com/video/BV1{n}xK4y1",
+    "https://www.bilibili.com/bangumi/play/ep{n}?from_spmid=666.25",
+    "https://www.bilibili.com/video/BV1{n}xK4y1?p=2",
+    "https://m.mgtv.com/b/{n}/1{n}.html",
+    "https://m.miguvideo.com/m/detail/{n}",
+    "https://m.tv.cctv.com/2024/06/24/VIDE{n}.shtml",
+    "https://m.tv.sohu.com/v/MjAyNDA{n}.html",
+    "https://www.example.com/watch?v={n}",
+]
+
+
+def cjk_text(rng, min_len=4, max_len=80):
+    """生成一段中文为主、夹杂标点、表情和少量英文数字的文字"""
+    target = rng.randint(min_len, max_len)
+    parts = []
+    length = 0
+    while length < target:
+        roll = rng.random()
+        if roll < 0.35:
+            piece = rng.choice(PHRASES)
+        elif roll < 0.8:
+            piece = "".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(1, 6)))
+        elif roll < 0.9:
+            piece = rng.choice(PUNCTUATION)
+        elif roll < 0.96:
+            piece = rng.choice(EMOJIS)
+        else:
+            piece = rng.choice(LATIN)
+        parts.append(piece)
+        length += len(piece)
+    return "".join(parts)[:max_len]
+
+
+def username(rng):
+    if rng.random() < 0.6:
+        return rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES)
+    return f"{rng.choice(GIVEN_NAMES)}{rng.randint(1, 9999)}"
+
+
+def make_comments(n, seed=0):
+    """生成 n 条评论（最新的在前），点赞数呈长尾分布"""
+    rng = random.Random(seed)
+    return [
+        {
+            'id': f"{i:012x}",
+            'username': username(rng),
+            'content': cjk_text(rng),
+            'date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                    f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+            'likes': int(rng.paretovariate(1.5)) - 1
+        }
+        for i in range(n, 0, -1)
+    ]
+
+
+def make_announcements(n, seed=0):
+    """生成 n 条公告（最新的在前）"""
+    rng = random.Random(seed)
+    return [
+        {
+            'title': f"{rng.choice(ANNOUNCEMENT_TITLES)} {cjk_text(rng, 4, 16)}",
+            'content': cjk_text(rng, 40, 400),
+            'date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'author': "海绵宝宝"
+        }
+        for _ in range(n)
+    ]
+
+
+def make_url_corpus(count, seed=0):
+    """生成 count 个各平台混合的视频链接"""
+    rng = random.Random(seed)
+    return [rng.choice(URL_TEMPLATES).format(n=rng.randint(100000, 999999)) for _ in range(count)]
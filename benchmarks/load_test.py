@@ -0,0 +1,177 @@
+"""本地压测：用 Streamlit 的 AppTest 模拟许多同时在线的会话
+
+每个会话反复执行随机操作：发表评论、点赞、刷新页面、输入链接并播放。只有打开的标签页会运行，
+发表评论、点赞之前先切换到评论区（计入 tab 操作），点击播放时页面自动回到视频播放标签页。AppTest 不是线程安全的，所以每个会话在单独的进程中运行，所有进程共用同一个数据目录，
+相当于多个服务进程同时读写同一份数据（比单进程多会话更严格）。
+
+用法：
+    python benchmarks/load_test.py --sessions 20 --actions 30
+    python benchmarks/load_test.py --sessions 40 --parallel 8 --backend json
+
+输出一行 JSON：吞吐量、各操作的延迟百分位，以及丢失的更新数
+（点赞成功但最终没有计入的次数、发表成功但最终不存在的评论数）。
+全程只在本地运行：数据文件放在临时目录，后台线路探测被关闭，播放只用手动选择的解析器（不做线路竞速）。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import cjk_text, make_url_corpus, username  # noqa: E402
+
+MAIN_SCRIPT = os.path.join(ROOT, "main.py")
+PLAY_PARSER = "🍍 默认解析器（优酷专项）"
+COMMENTS_TAB = "💬 评论区"
+
+# 各操作的权重
+ACTIONS = {
+    'post': 2,
+    'like': 5,
+    'rerun': 4,
+    'play': 2,
+}
+
+
+def percentiles(samples):
+    if not samples:
+        return {'count': 0}
+    samples = sorted(samples)
+
+    def pick(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000, 2)
+
+    return {'count': len(samples), 'p50_ms': pick(50), 'p95_ms': pick(95), 'p99_ms': pick(99),
+            'max_ms': round(samples[-1] * 1000, 2)}
+
+
+def run_session(actions, seed, urls):
+    """运行一个会话，返回 {latencies: {操作: [秒]}, likes: 成功点赞次数, posts: 成功发表次数, errors: 次数}"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    result = {'latencies': {}, 'likes': 0, 'posts': 0, 'errors': 0}
+
+    def timed(action, fn):
+        start = time.perf_counter()
+        at = fn()
+        result['latencies'].setdefault(action, []).append(time.perf_counter() - start)
+        if at.exception:
+            result['errors'] += 1
+        return at
+
+    at = AppTest.from_file(MAIN_SCRIPT, default_timeout=120)
+    at = timed('first_load', at.run)
+    names, weights = zip(*ACTIONS.items())
+    for _ in range(actions):
+        action = rng.choices(names, weights)[0]
+        if action in ('post', 'like') and at.session_state["main_tab"] != COMMENTS_TAB:
+            at.session_state["main_tab"] = COMMENTS_TAB
+            at = timed('tab', at.run)
+        if action == 'post':
+            at.text_input(key="comment_username").input(username(rng))
+            at.text_area(key="comment_text").input(cjk_text(rng))
+            at = timed(action, at.button(key="submit_comment").click().run)
+            if not any("评论保存失败" in str(e.value) for e in at.error):
+                result['posts'] += 1
+        elif action == 'like':
+            buttons = [b for b in at.button if (b.key or "").startswith("like_comment_")]
+            if not buttons:
+                at = timed('rerun', at.run)
+                continue
+            at = timed(action, rng.choice(buttons).click().run)
+            if not any("点赞失败" in str(e.value) for e in at.error):
+                result['likes'] += 1
+        elif action == 'play':
+            at.sidebar.text_input[0].input(rng.choice(urls))
+            at.selectbox(key="selected_parser").set_value(PLAY_PARSER)
+            play = [b for b in at.sidebar.button if b.label == "🚀 开始播放"][0]
+            at = timed(action, play.click().run)
+        else:
+            at = timed(action, at.run)
+    return result
+
+
+def run_worker(actions, seed, workdir, backend):
+    """在单独的进程中运行一个会话"""
+    os.chdir(workdir)
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ["PARSER_PROBE"] = "0"
+    result = run_session(actions, seed, make_url_corpus(200, seed))
+    # 进程池的工作进程退出时不执行 atexit，主动写入缓冲中的点赞
+    import storage
+    storage.flush_pending_likes()
+    return result
+
+
+def count_stored(workdir, backend):
+    """压测结束后直接从数据文件统计 (评论数, 总点赞数)"""
+    import storage
+    os.chdir(workdir)
+    if backend == "sqlite":
+        store = storage.SqliteBackend("data.db")
+    elif backend == "log":
+        store = storage.LogBackend("comments.json", "announcements.json",
+                                   "comments.log", "comments.snapshot.json")
+    else:
+        store = storage.JsonBackend("comments.json", "announcements.json")
+    return store.comment_stats()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="并发会话总数")
+    parser.add_argument("--actions", type=int, default=30, help="每个会话执行的操作数")
+    parser.add_argument("--parallel", type=int, default=None, help="同时运行的会话数（默认等于 --sessions）")
+    parser.add_argument("--backend", default=os.environ.get("STORAGE_BACKEND", "log"),
+                        choices=["json", "log", "sqlite"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.parallel or args.sessions) as pool:
+            futures = [pool.submit(run_worker, args.actions, args.seed * 1000 + i, workdir, args.backend)
+                       for i in range(args.sessions)]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+        stored_comments, stored_likes = count_stored(workdir, args.backend)
+        os.chdir(cwd)
+
+    latencies = {}
+    for result in results:
+        for action, samples in result['latencies'].items():
+            latencies.setdefault(action, []).extend(samples)
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    posts = sum(result['posts'] for result in results)
+    likes = sum(result['likes'] for result in results)
+    report = {
+        'backend': args.backend,
+        'sessions': args.sessions,
+        'parallel': args.parallel or args.sessions,
+        'actions_per_session': args.actions,
+        'seconds': round(elapsed, 3),
+        'requests': len(all_samples),
+        'throughput_rps': round(len(all_samples) / elapsed, 2),
+        'latency': percentiles(all_samples),
+        'latency_by_action': {action: percentiles(samples) for action, samples in sorted(latencies.items())},
+        'errors': sum(result['errors'] for result in results),
+        'comments_posted': posts,
+        'comments_stored': stored_comments,
+        'lost_comments': max(0, posts - stored_comments),
+        'likes_clicked': likes,
+        'likes_stored': stored_likes,
+        'lost_likes': max(0, likes - stored_likes),
+    }
+    print(json.dumps(report, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,183 @@
+"""多进程部署的本地测试：一个服务进程写入的评论、公告多久能在另一个进程中看到
+
+两个工作进程共用同一个临时数据目录，各自用 AppTest 运行一个会话，相当于反向代理后面的两个
+`streamlit run main.py` 进程：进程 A 发表评论（以及发布公告），进程 B 不断重跑页面，直到看到新内容。
+同时统计进程 B 空闲重跑时对数据文件的检查次数（stat / 读取日志 / 查询数据库）和整体重新读取的次数。
+
+用法：
+    python benchmarks/multi_worker_test.py
+    python benchmarks/multi_worker_test.py --backend sqlite --watch poll --rounds 10
+
+输出一行 JSON：传播延迟的百分位（从 A 点击发表算起）、超时次数，以及 B 每次空闲重跑的检查/读取次数。
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import MAIN_SCRIPT, percentiles  # noqa: E402
+
+ADMIN_PASSWORD = "000"
+COMMENTS_TAB = "💬 评论区"
+ADMIN_TAB = "🔧 管理中心"
+
+
+def setup_worker(workdir, backend, watch):
+    os.chdir(workdir)
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ["DATA_WATCH"] = watch
+    os.environ["PARSER_PROBE"] = "0"
+
+
+def count_calls(counters):
+    """统计数据文件的检查次数和整体重新读取的次数（只在测试进程中包装，不改变行为）"""
+    import comment_log
+    import storage
+
+    def wrap(owner, name, key):
+        original = getattr(owner, name)
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            counters[key] += 1
+            return original(*args, **kwargs)
+
+        setattr(owner, name, wrapper)
+
+    wrap(storage, "file_version", "checks")                        # JSON 文件的 stat
+    wrap(comment_log.CommentLog, "refresh", "checks")               # 评论日志的 stat + 读取新追加的部分
+    wrap(storage.SqliteBackend, "_query_changes", "checks")         # 查询数据库的变更记录
+    wrap(storage.SqliteBackend, "announcements_version", "checks")
+    wrap(storage, "read_json_file", "full_reads")                   # 整个 JSON 文件重新解析
+    wrap(comment_log.CommentLog, "_load_snapshot", "full_reads")    # 从快照重建评论日志
+    wrap(storage.SqliteBackend, "load_comments", "full_reads")
+
+
+def writer(workdir, backend, watch, commands, results):
+    """进程 A：收到命令后发表评论或发布公告，回报点击前的时间"""
+    setup_worker(workdir, backend, watch)
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(MAIN_SCRIPT, default_timeout=120).run()
+    while True:
+        command = commands.get()
+        if command is None:
+            return
+        kind, text = command
+        # 只有打开的标签页会运行：发表评论前切换到评论区，发布公告前切换到管理中心
+        tab = COMMENTS_TAB if kind == "comment" else ADMIN_TAB
+        if at.session_state["main_tab"] != tab:
+            at.session_state["main_tab"] = tab
+            at = at.run()
+        if kind == "comment":
+            at.text_input(key="comment_username").input("进程A")
+            at.text_area(key="comment_text").input(text)
+            button = at.button(key="submit_comment")
+        else:
+            if not ("admin_logged_in" in at.session_state and at.session_state["admin_logged_in"]):
+                at.text_input(key="admin_password").input(ADMIN_PASSWORD)
+                at = at.button(key="admin_login_btn").click().run()
+            at.text_input(key="new_announcement_title").input(text)
+            at.text_area(key="new_announcement_content").input(text)
+            button = at.button(key="publish_announcement")
+        start = time.time()
+        at = button.click().run()
+        results.put((start, bool(at.exception)))
+
+
+def page_text(at):
+    return "\n".join(element.value for element in at.markdown)
+
+
+def reader(args, workdir, commands, results):
+    """进程 B：空闲重跑统计检查次数，然后等待进程 A 写入的内容出现"""
+    setup_worker(workdir, args.backend, args.watch)
+    counters = {'checks': 0, 'full_reads': 0}
+    count_calls(counters)
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(MAIN_SCRIPT, default_timeout=120).run()
+    # 停在评论区（公告的置顶部分在每个标签页都显示）
+    at.session_state["main_tab"] = COMMENTS_TAB
+    at = at.run()
+    # 空闲重跑：没有任何写入时每次重跑的检查/读取次数（先等一轮定期失效过去）
+    time.sleep(0.2)
+    for key in counters:
+        counters[key] = 0
+    for _ in range(args.idle_reruns):
+        at = at.run()
+    idle = {key: round(value / args.idle_reruns, 2) for key, value in counters.items()}
+
+    delays = {'comment': [], 'announcement': []}
+    timeouts = 0
+    kinds = ["comment"] * args.rounds + (["announcement"] if args.announcement else [])
+    for round_number, kind in enumerate(kinds):
+        text = f"来自进程A的{kind}{round_number}-{time.time_ns()}"
+        commands.put((kind, text))
+        start, failed = results.get()
+        if failed:
+            timeouts += 1
+            continue
+        deadline = time.time() + args.timeout
+        while True:
+            at = at.run()
+            if text in page_text(at):
+                delays[kind].append(time.time() - start)
+                break
+            if time.time() > deadline:
+                timeouts += 1
+                break
+            time.sleep(args.poll)
+    commands.put(None)
+
+    import data_watcher
+    return {
+        'backend': args.backend,
+        'watch': data_watcher.get_watcher().mode,
+        'comment_delay': percentiles(delays['comment']),
+        'announcement_delay': percentiles(delays['announcement']),
+        'timeouts': timeouts,
+        'idle_checks_per_rerun': idle['checks'],
+        'idle_full_reads_per_rerun': idle['full_reads'],
+        'notifications': data_watcher.get_watcher().stats()['notifications'],
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default=os.environ.get("STORAGE_BACKEND", "log"),
+                        choices=["json", "log", "sqlite"])
+    parser.add_argument("--watch", default="auto", choices=["auto", "inotify", "poll", "off"])
+    parser.add_argument("--rounds", type=int, default=5, help="进程 A 发表评论的次数")
+    parser.add_argument("--idle-reruns", type=int, default=10)
+    parser.add_argument("--poll", type=float, default=0.05, help="进程 B 两次重跑之间的间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=10, help="等待多久算没有传播过去（秒）")
+    parser.add_argument("--no-announcement", dest="announcement", action="store_false",
+                        help="不测试公告的传播")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        commands = context.Queue()
+        results = context.Queue()
+        process = context.Process(target=writer, args=(workdir, args.backend, args.watch, commands, results))
+        process.start()
+        try:
+            report = reader(args, workdir, commands, results)
+        finally:
+            commands.put(None)
+            process.join(30)
+            if process.is_alive():
+                process.terminate()
+    print(json.dumps(report, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main_cli()
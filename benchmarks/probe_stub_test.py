@@ -0,0 +1,142 @@
+"""解析器健康检测的本地测试：对本机模拟的解析接口探测，检查健康分类和线路排序
+
+每种解析接口单独启动一个本机 HTTP 服务（各自是一个域名，不访问外网）：
+    ok      立即返回 200                      -> 🟢 可用
+    slow    延迟返回 200（超过较慢的阈值）    -> 🟡 较慢
+    error   返回 500                          -> 🟠 异常
+    dead    端口上没有服务（连接被拒绝），连续失败 FAILURE_THRESHOLD 次 -> 🔴 失效
+    idle    不探测                            -> ⚪ 未探测
+同一个地址分别用 parser_health.probe_parser（requests）和 probe_scheduler.http_probe（asyncio）探测，
+两者的结果都要符合预期；最后按健康状况排序，顺序应为 ok、slow、idle、error、dead。
+
+用法：
+    python benchmarks/probe_stub_test.py
+    python benchmarks/probe_stub_test.py --delay 0.8 --slow-latency 0.5
+
+每种解析接口输出一行 JSON，最后一行是排序结果；有不符合预期的结果时退出码为 1。
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import parser_health  # noqa: E402
+import probe_scheduler  # noqa: E402
+
+# 各解析接口的预期：(是否可用, 状态码, 健康标记前缀)
+EXPECTED = {
+    "ok": (True, 200, "🟢"),
+    "slow": (True, 200, "🟡"),
+    "error": (False, 500, "🟠"),
+    "dead": (False, None, "🔴"),
+    "idle": (None, None, "⚪"),
+}
+EXPECTED_ORDER = ["ok", "slow", "idle", "error", "dead"]
+
+
+def make_handler(kind, delay, hits):
+    class StubProbeHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            hits[kind] = hits.get(kind, 0) + 1
+            if kind == "slow":
+                time.sleep(delay)
+            status = 500 if kind == "error" else 200
+            body = "解析失败".encode("utf-8") if status >= 400 else b"<html><body>player</body></html>"
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StubProbeHandler
+
+
+def unused_port():
+    """一个当前没有服务监听的本机端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.5, help="slow 接口的响应延迟（秒）")
+    parser.add_argument("--slow-latency", type=float, default=0.3, help="视为较慢的延迟阈值（秒）")
+    parser.add_argument("--timeout", type=float, default=3.0, help="单次探测超时（秒）")
+    args = parser.parse_args()
+    # 本地接口的延迟远小于线上，按测试的阈值区分较慢的线路
+    parser_health.SLOW_LATENCY = args.slow_latency
+
+    hits = {}
+    servers = []
+    parsers = {}
+    for kind in ("error", "dead", "idle", "slow", "ok"):    # 故意打乱顺序，检查排序
+        if kind == "dead":
+            port = unused_port()
+        else:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(kind, args.delay, hits))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append(server)
+            port = server.server_address[1]
+        parsers[kind] = f"http://127.0.0.1:{port}/jx/?url="
+
+    registry = parser_health.ParserHealthRegistry()
+    session = parser_health.make_session(len(parsers))
+    failures = 0
+    try:
+        for kind, parser_url in parsers.items():
+            want_ok, want_status, want_badge = EXPECTED[kind]
+            rounds = 0 if kind == "idle" else parser_health.FAILURE_THRESHOLD if kind == "dead" else 1
+            sync_results = []
+            for _ in range(rounds):
+                ok, status, latency, error = parser_health.probe_parser(session, parser_url, args.timeout)
+                sync_results.append((ok, status))
+                if ok:
+                    registry.record_success(parser_url, status, latency)
+                else:
+                    registry.record_failure(parser_url, status, error, latency)
+            async_result = None
+            if rounds:
+                ok, status, _, _ = asyncio.run(probe_scheduler.http_probe(parser_url, args.timeout))
+                async_result = (ok, status)
+            badge = registry.badge(parser_url)
+            passed = (all(result == (want_ok, want_status) for result in sync_results)
+                      and (async_result is None or async_result == (want_ok, want_status))
+                      and badge.startswith(want_badge))
+            failures += not passed
+            record = registry.get(parser_url) or {}
+            print(json.dumps({
+                'parser': kind,
+                'ok': passed,
+                'badge': badge,
+                'status': record.get('status'),
+                'error': record.get('error'),
+                'latency_ms': round(record['latency'] * 1000, 2) if record.get('latency') is not None else None,
+                'probes': rounds,
+                'async_probe': async_result,
+                'requests': hits.get(kind, 0),
+            }, ensure_ascii=False), flush=True)
+
+        order = registry.rank_parsers(parsers)
+        failures += order != EXPECTED_ORDER
+        print(json.dumps({'ranking': order, 'ok': order == EXPECTED_ORDER}, ensure_ascii=False), flush=True)
+    finally:
+        session.close()
+        for server in servers:
+            server.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
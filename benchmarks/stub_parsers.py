@@ -0,0 +1,156 @@
+"""服务器端直链解析的本地测试：启动几个模拟的解析接口页面，检查能否找出直链以及缓存的效果
+
+模拟的解析页面（都在本机的 HTTP 服务上，不访问外网）：
+    /direct?url=   脚本变量中的 m3u8 直链
+    /api?url=      JSON 接口，直链带 \\/ 转义
+    /nested?url=   外层页面只有 iframe，直链在内层页面的相对路径中
+    /encoded?url=  直链经过 URL 编码，放在播放器页面的参数里
+    /mp4?url=      video 标签中的 mp4 直链
+    /none?url=     没有直链的页面
+    /slow?url=     响应慢的解析页面（用来对比缓存前后的耗时）
+    /slownone?url= 响应慢、没有直链的页面
+
+用法：
+    python benchmarks/stub_parsers.py
+    python benchmarks/stub_parsers.py --delay 0.5 --sessions 8
+
+每个解析页面输出一行 JSON：解析出的直链是否正确、第一次和再次解析的耗时、解析页面被请求的次数；
+最后几行是多个会话同时解析同一个视频时（解析成功和失败都只应请求一次解析页面）的结果，
+以及换一条线路重播时是否重新解析。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import stream_resolver  # noqa: E402
+
+VIDEO_URL = "https://v.youku.com/v_show/id_XNTk0MjQ2ODAwMA==.html"
+
+
+def make_handler(delay, hits):
+    class StubParserHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body, content_type="text/html; charset=utf-8"):
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            hits[parsed.path] = hits.get(parsed.path, 0) + 1
+            video = parse_qs(parsed.query).get("url", [""])[0]
+            origin = f"http://{self.headers['Host']}"
+            if parsed.path == "/direct":
+                self._send(f'<script>var player = {{"url": "{origin}/media/direct/index.m3u8?sign=abc"}};</script>')
+            elif parsed.path == "/api":
+                self._send(json.dumps({"code": 200, "url": f"{origin}/media/api/index.m3u8"}).replace("/", "\\/"),
+                           "application/json")
+            elif parsed.path == "/nested":
+                self._send(f'<html><body><iframe src="/inner?url={quote(video)}" allowfullscreen></iframe></body></html>')
+            elif parsed.path == "/inner":
+                self._send('<script>const source = "../media/inner/playlist.m3u8";</script>')
+            elif parsed.path == "/encoded":
+                self._send(f'<iframe src="/player.html?url={quote(origin + "/media/encoded/index.m3u8", safe="")}"></iframe>')
+            elif parsed.path == "/mp4":
+                self._send(f'<video src="{origin}/media/mp4/video.mp4" controls></video>')
+            elif parsed.path == "/slow":
+                time.sleep(delay)
+                self._send(f'<script>var url = "{origin}/media/slow/index.m3u8";</script>')
+            else:
+                if parsed.path == "/slownone":
+                    time.sleep(delay)
+                self._send("<html><body>解析失败，请更换线路</body></html>")
+
+    return StubParserHandler
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.3, help="/slow 页面的响应延迟（秒）")
+    parser.add_argument("--sessions", type=int, default=8, help="同时解析同一个视频的会话数")
+    args = parser.parse_args()
+
+    hits = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.delay, hits))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    expected = {
+        "direct": f"{origin}/media/direct/index.m3u8?sign=abc",
+        "api": f"{origin}/media/api/index.m3u8",
+        "nested": f"{origin}/media/inner/playlist.m3u8",
+        "encoded": f"{origin}/media/encoded/index.m3u8",
+        "mp4": f"{origin}/media/mp4/video.mp4",
+        "none": None,
+        "slow": f"{origin}/media/slow/index.m3u8",
+    }
+
+    try:
+        for name, want in expected.items():
+            # 每个解析页面单独一个解析器，互不共用缓存
+            resolver = stream_resolver.StreamResolver()
+            parser_url = f"{origin}/{name}?url="
+            start = time.perf_counter()
+            stream, _ = resolver.resolve(VIDEO_URL, parser_url)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            again, cached = resolver.resolve(VIDEO_URL, parser_url)
+            warm = time.perf_counter() - start
+            got = stream['url'] if stream else None
+            print(json.dumps({
+                'parser': name,
+                'ok': got == want and (again['url'] if again else None) == want,
+                'stream': got,
+                'kind': stream['kind'] if stream else None,
+                'cold_ms': round(cold * 1000, 2),
+                'cached_ms': round(warm * 1000, 3),
+                'second_from_cache': cached,
+                'page_requests': resolver.resolves,
+            }, ensure_ascii=False), flush=True)
+
+        # 多个会话同时播放同一个视频：不论解析成功还是失败，都只请求一次解析页面
+        resolver = stream_resolver.StreamResolver()
+        for name in ("slow", "slownone"):
+            want = expected.get(name)
+            before = hits.get(f"/{name}", 0)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.sessions) as pool:
+                results = list(pool.map(lambda _: resolver.resolve(VIDEO_URL, f"{origin}/{name}?url=")[0],
+                                        range(args.sessions)))
+            requests_made = hits.get(f"/{name}", 0) - before
+            print(json.dumps({
+                'parser': name,
+                'concurrent_sessions': args.sessions,
+                'ok': all((result['url'] if result else None) == want for result in results) and requests_made == 1,
+                'seconds': round(time.perf_counter() - start, 3),
+                'page_requests': requests_made,
+            }, ensure_ascii=False), flush=True)
+
+        # 换一条线路重播：不使用其他线路缓存的直链
+        stream, cached = resolver.resolve(VIDEO_URL, f"{origin}/direct?url=")
+        print(json.dumps({
+            'parser': 'direct',
+            'replay_after': 'slow',
+            'ok': not cached and stream is not None and stream['url'] == expected['direct'],
+            'from_cache': cached,
+            'stream_parser': stream['parser'] if stream else None,
+        }, ensure_ascii=False), flush=True)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main_cli()
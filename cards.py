@@ -0,0 +1,193 @@
+"""页面中的HTML片段：样式表、评论和公告卡片、首页的固定内容
+
+模板在导入时准备好，卡片按内容缓存（内容不变的公告、评论不会重复拼接），
+样式表作为静态文件由浏览器缓存，每次重跑只发送一行 @import。
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+
+# 卡片缓存容量（按内容区分，超过后淘汰最久未用的）
+CARD_CACHE_SIZE = 4096
+
+STYLESHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
+STYLESHEET_URL = "app/static/style.css"
+
+
+def _minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,])\s*", r"\1", css).strip()
+
+
+@functools.lru_cache(maxsize=None)
+def _stylesheet(static_serving):
+    with open(STYLESHEET_PATH, 'r', encoding='utf-8') as f:
+        css = f.read()
+    if static_serving:
+        # 文件内容的摘要作为版本号，样式修改后浏览器会重新下载
+        version = hashlib.sha1(css.encode('utf-8')).hexdigest()[:10]
+        return f'<style>@import url("{STYLESHEET_URL}?v={version}");</style>'
+    return f"<style>{_minify_css(css)}</style>"
+
+
+def stylesheet_html(static_serving):
+    """页面样式。开启静态文件服务时只引用 static/style.css，否则内联（压缩后的）样式表"""
+    return _stylesheet(bool(static_serving))
+
+
+COMMENT_CARD = (
+    '<div style="background: #F0F8FF; padding: 1rem; border-radius: 10px; margin: 0.8rem 0; border-left: 4px solid #4169E1;">'
+    '<div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.5rem;">'
+    '<h5 style="color: #4169E1; margin: 0; font-family: \'Comic Sans MS\', cursive;">👤 {username}</h5>'
+    '<small style="color: #666;">🕒 {date}</small>'
+    '</div>'
+    '<p style="margin: 0.5rem 0; color: #333; line-height: 1.5;">{content}</p>'
+    '<div style="text-align: right; margin-top: 0.5rem;">'
+    '<span style="color: #FF1493;">❤️ {likes} 个赞</span>'
+    '</div>'
+    '</div>'
+)
+
+ANNOUNCEMENT_CARD = (
+    '<div style="background: linear-gradient(45deg, #FFFACD, #F0F8FF); padding: 1.5rem; border-radius: 15px; margin: 1rem 0; border: 3px solid #FF6B35; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">'
+    '<h3 style="color: #FF6B35; margin: 0; font-family: \'Comic Sans MS\', cursive;">{title}</h3>'
+    '<p style="margin: 1rem 0; color: #333; font-size: 1.1rem; line-height: 1.6;">{content}</p>'
+    '<div style="text-align: right;">'
+    '<small style="color: #666; font-style: italic;">📅 {date} | ✍️ {author}</small>'
+    '</div>'
+    '</div>'
+)
+
+PINNED_ANNOUNCEMENT_CARD = (
+    '<div style="background: linear-gradient(45deg, #FFE4E1, #FFF0F5); padding: 1rem; border-radius: 15px; margin: 0.5rem 0; border: 3px solid #FF1493; box-shadow: 0 4px 8px rgba(255,20,147,0.3); animation: glow 2s infinite alternate;">'
+    '<div style="display: flex; justify-content: space-between; align-items: center;">'
+    '<h4 style="color: #FF1493; margin: 0; font-family: \'Comic Sans MS\', cursive; text-shadow: 1px 1px 2px rgba(0,0,0,0.1);">🔥 {title}</h4>'
+    '<span style="background: #FF1493; color: white; padding: 0.2rem 0.8rem; border-radius: 20px; font-size: 0.8rem; font-weight: bold;">置顶</span>'
+    '</div>'
+    '<p style="margin: 0.8rem 0; color: #333; font-size: 1rem; line-height: 1.5;">{content}</p>'
+    '<div style="display: flex; justify-content: space-between; align-items: center;">'
+    '<small style="color: #666; font-style: italic;">📅 {date} | ✍️ {author}</small>'
+    '<small style="color: #FF1493; cursor: pointer;">📢 点击公告板查看详情</small>'
+    '</div>'
+    '</div>'
+)
+
+ADMIN_ANNOUNCEMENT_CARD = (
+    '<div style="background: #FFE4E1; padding: 1rem; border-radius: 10px; margin: 0.5rem 0; border-left: 5px solid #FF69B4;">'
+    '<h4 style="color: #FF1493; margin: 0;">{title}</h4>'
+    '<p style="margin: 0.5rem 0; color: #333;">{content}</p>'
+    '<small style="color: #666;">发布时间: {date} | 作者: {author}</small>'
+    '</div>'
+)
+
+# 直链 m3u8 播放器：Safari 原生播放，其他浏览器用 hls.js
+HLS_PLAYER = (
+    '<video id="player" controls autoplay playsinline '
+    'style="width: 100%; height: 580px; border-radius: 15px; background: #000;"></video>'
+    '<script src="https://cdn.jsdelivr.net/npm/hls.js@1"></script>'
+    '<script>'
+    'var video = document.getElementById("player"), src = {src};'
+    'if (video.canPlayType("application/vnd.apple.mpegurl")) {{ video.src = src; }}'
+    'else if (window.Hls && Hls.isSupported()) {{ var hls = new Hls(); hls.loadSource(src); hls.attachMedia(video); }}'
+    'else {{ video.src = src; }}'
+    '</script>'
+)
+
+TITLE = '<div class="title">🍍 海绵宝宝的神奇视频播放器 🧽</div>'
+DECORATION_LEFT = '<div class="decoration">🐠</div>'
+DECORATION_RIGHT = '<div class="decoration">🪸</div>'
+
+WELCOME_BANNER = (
+    '<div style="text-align: center; padding: 2rem; background: linear-gradient(45deg, #FFFACD, #F0F8FF); border-radius: 20px; margin: 2rem 0; border: 3px solid #FF6B35;">'
+    '<h2 style="color: #FF6B35; font-family: \'Comic Sans MS\', cursive;">🌊 欢迎来到比奇堡的视频播放器！</h2>'
+    '<p style="font-size: 1.2rem; color: #4169E1; font-family: \'Comic Sans MS\', cursive;">我是海绵宝宝！我准备好了！🧽✨</p>'
+    '<p style="color: #FF1493; font-family: \'Comic Sans MS\', cursive;">在左边的控制中心输入视频链接，然后点击播放按钮就可以开始观看啦！</p>'
+    '</div>'
+)
+
+_FEATURE_TILE = (
+    '<div style="background: {background}; padding: 1rem; border-radius: 15px; text-align: center; border: 2px solid {border};">'
+    '<h3 style="color: {color};">{title}</h3>'
+    '<p>{text}</p>'
+    '</div>'
+)
+
+# 首页功能展示的四个小方块
+FEATURE_TILES = [
+    _FEATURE_TILE.format(background="#FFE4E1", border="#FF69B4", color="#FF1493",
+                         title="🔧 多核解析", text="18个精选稳定解析器！"),
+    _FEATURE_TILE.format(background="#E0FFFF", border="#00CED1", color="#008B8B",
+                         title="🌐 内置浏览器", text="一站式搜索播放体验！"),
+    _FEATURE_TILE.format(background="#FFFACD", border="#FFD700", color="#FF8C00",
+                         title="🚀 智能解析", text="自动处理各种链接格式！"),
+    _FEATURE_TILE.format(background="#F0E68C", border="#DAA520", color="#B8860B",
+                         title="💬 互动社区", text="公告板和评论区等你！"),
+]
+
+FOOTER = (
+    '<div style="text-align: center; color: #FF6B35; font-family: \'Comic Sans MS\', cursive; padding: 1rem;">'
+    '🍍 Made with love in Bikini Bottom 🧽 | 海绵宝宝 © 2024'
+    '<br><small>我准备好了！I\'m ready! 🎵</small>'
+    '<br><small>🆕 全新功能：🌐 内置浏览器 | 📢 公告板 | 💬 评论区 | 🔧 管理系统</small>'
+    '<br><small style="color: #FF1493;">✨ 现在支持8大视频平台的内置浏览器搜索！</small>'
+    '</div>'
+)
+
+
+# 卡片按内容缓存：参数相同（内容没有变化）时直接返回之前拼好的字符串
+
+@functools.lru_cache(maxsize=CARD_CACHE_SIZE)
+def _comment_card(username, date, content, likes):
+    return COMMENT_CARD.format(username=username, date=date, content=content, likes=likes)
+
+
+@functools.lru_cache(maxsize=CARD_CACHE_SIZE)
+def _announcement_card(template, title, content, date, author):
+    return template.format(title=title, content=content, date=date, author=author)
+
+
+def comment_card(comment):
+    """评论卡片"""
+    return _comment_card(comment['username'], comment['date'], comment['content'], comment['likes'])
+
+
+def announcement_card(announcement):
+    """公告板中的公告卡片"""
+    return _announcement_card(ANNOUNCEMENT_CARD, announcement['title'], announcement['content'],
+                              announcement['date'], announcement['author'])
+
+
+def pinned_announcement_card(announcement):
+    """首页置顶公告卡片（内容只显示前100个字）"""
+    content = announcement['content']
+    if len(content) > 100:
+        content = content[:100] + '...'
+    return _announcement_card(PINNED_ANNOUNCEMENT_CARD, announcement['title'], content,
+                              announcement['date'], announcement['author'])
+
+
+def admin_announcement_card(announcement):
+    """管理中心中可删除的公告卡片"""
+    return _announcement_card(ADMIN_ANNOUNCEMENT_CARD, announcement['title'], announcement['content'],
+                              announcement['date'], announcement['author'])
+
+
+def hls_player(url):
+    """播放 m3u8 直链的HTML（放在 components.html 中）"""
+    return HLS_PLAYER.format(src=json.dumps(url).replace("</", "<\\/"))
+
+
+def cache_stats():
+    """卡片缓存的命中情况"""
+    stats = {'hits': 0, 'misses': 0, 'size': 0}
+    for cached in (_comment_card, _announcement_card):
+        info = cached.cache_info()
+        stats['hits'] += info.hits
+        stats['misses'] += info.misses
+        stats['size'] += info.currsize
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+    return stats
@@ -0,0 +1,453 @@
+"""评论日志存储 - 每次发表、点赞、删除只追加一行事件，定期压缩成快照
+
+每次压缩的代号加一，写在快照和新日志的第一行（{"op": "compact", "generation": n}）中。
+其他进程读取日志时比较代号，代号变了就重新读取快照（压缩后的新日志可能重用旧文件的 inode，不能靠 inode 判断）。
+旧格式的快照（评论列表）和没有第一行代号的日志都当作代号 0。
+"""
+import bisect
+import collections
+import itertools
+import json
+import os
+import secrets
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只保留进程内的锁
+    fcntl = None
+
+# 日志中累计多少条事件后自动压缩
+COMPACT_THRESHOLD = 5000
+
+# 变更记录保留的条数，落后更多的读者需要整页重新读取
+CHANGE_FEED_SIZE = 1000
+
+
+_ID_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# 进程内递增计数器，起点随机，避免同一毫秒内、以及不同进程之间的ID重复
+_id_counter = itertools.count(secrets.randbits(32))
+
+
+def new_comment_id():
+    """生成紧凑的唯一评论ID：毫秒时间戳 + 32位计数器，base62 编码（约13个字符，按时间大致有序）"""
+    value = (time.time_ns() // 1_000_000) << 32 | (next(_id_counter) & 0xFFFFFFFF)
+    chars = []
+    while value:
+        value, rem = divmod(value, 62)
+        chars.append(_ID_ALPHABET[rem])
+    return "".join(reversed(chars))
+
+
+_ID_VALUES = {char: i for i, char in enumerate(_ID_ALPHABET)}
+
+
+def comment_id_value(comment_id):
+    """把 new_comment_id() 生成的ID解码回整数，越新越大；无法解码的ID（外部导入的）返回 -1"""
+    value = 0
+    for char in comment_id or "":
+        digit = _ID_VALUES.get(char)
+        if digit is None:
+            return -1
+        value = value * 62 + digit
+    return value
+
+
+def comment_time_key(comment):
+    """评论的先后顺序：发表时间，同一秒内按时间生成的ID。
+
+    只由评论本身决定，和它在列表或日志中的位置无关，用作分页游标时不受删除、压缩的影响。
+    """
+    comment_id = comment.get('id') or ""
+    return (comment.get('date') or "", comment_id_value(comment_id), comment_id)
+
+
+def cursor_key(order, cursor):
+    """把游标还原成排序键（游标经过 JSON 往返后元组会变成列表）"""
+    if order == "likes":
+        return (cursor[0], tuple(cursor[1]))
+    return tuple(cursor)
+
+
+def _read_header(f):
+    """读取日志第一行的压缩代号，返回 (代号, 第一行的字节数)；旧格式的日志没有这一行，代号为 0"""
+    first = f.readline()
+    if first.endswith(b'\n'):
+        try:
+            event = json.loads(first)
+        except ValueError:
+            event = None
+        if isinstance(event, dict) and event.get('op') == 'compact':
+            return event.get('generation', 0), len(first)
+    return 0, 0
+
+
+class FileLock:
+    """跨进程的建议锁（基于 flock），用于追加和压缩，也用于 JSON 文件的读-改-写。
+
+    不可重入：同一进程内需要先持有线程锁再获取。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class CommentLog:
+    """追加写入的评论存储。
+
+    状态 = 快照 + 快照之后追加的事件。每个进程在内存中维护一份状态，
+    refresh() 只读取上次读取位置之后新追加的字节。
+
+    每个生效的事件使进程内的版本号加一，最近的变更保存在 _changes 中，
+    changes_since() 按版本号取出增量（版本号只在本进程内有意义）。
+    """
+
+    def __init__(self, log_path, snapshot_path, compact_threshold=COMPACT_THRESHOLD):
+        self.log_path = log_path
+        self.snapshot_path = snapshot_path
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(log_path + ".lock")
+        self._comments = {}      # id -> 评论，按写入日志的先后排列
+        self._keys = {}          # id -> 时间键（comment_time_key）
+        self._by_time = []       # 从旧到新排好序的时间键，最后一项是ID；时间键也用作分页游标
+        self._by_likes = None    # 按 (点赞数, 时间键) 从小到大排好序，第一次按点赞排序时建立
+        self._total_likes = 0
+        self._offset = 0         # 已读取的日志字节数
+        self._generation = None  # 当前状态对应的压缩代号
+        self._log_events = 0     # 当前日志中的事件条数
+        self._loaded = False
+        self._version = 0        # 进程内单调递增的版本号
+        self._changes = collections.deque(maxlen=CHANGE_FEED_SIZE)  # (版本号, 变更)
+        self._changes_start = 0  # 从这个版本号之后的变更是完整的
+
+    # ---- 读取 ----
+
+    def _reset_changes(self):
+        """状态被整体替换（重新读取快照、导入），之前的版本号无法再给出增量"""
+        self._version += 1
+        self._changes.clear()
+        self._changes_start = self._version
+
+    def _load_snapshot(self):
+        """从快照重建状态，返回快照的压缩代号"""
+        self._comments = {}
+        self._keys = {}
+        self._by_time = []
+        self._by_likes = None
+        self._total_likes = 0
+        generation = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                generation = data.get('generation', 0)
+                data = data.get('comments', [])
+            for comment in data:
+                self._insert(comment, keep_sorted=False)
+            self._by_time.sort()
+        self._offset = 0
+        self._log_events = 0
+        self._reset_changes()
+        return generation
+
+    def _likes_key(self, comment):
+        return (comment.get('likes', 0), self._keys[comment['id']])
+
+    def _insert(self, comment, keep_sorted=True):
+        """keep_sorted=False 时只追加时间键，由调用方最后统一排序（从快照批量加载）"""
+        comment_id = comment['id']
+        if comment_id in self._comments:
+            return
+        key = self._keys[comment_id] = comment_time_key(comment)
+        if not keep_sorted or not self._by_time or key > self._by_time[-1]:
+            # 新评论通常是最新的，直接追加
+            self._by_time.append(key)
+        else:
+            bisect.insort(self._by_time, key)
+        self._comments[comment_id] = comment
+        self._total_likes += comment.get('likes', 0)
+        if self._by_likes is not None:
+            bisect.insort(self._by_likes, self._likes_key(comment))
+
+    def _remove(self, comment_id):
+        comment = self._comments.pop(comment_id, None)
+        if comment is None:
+            return
+        self._total_likes -= comment.get('likes', 0)
+        if self._by_likes is not None:
+            index = bisect.bisect_left(self._by_likes, self._likes_key(comment))
+            del self._by_likes[index]
+        del self._by_time[bisect.bisect_left(self._by_time, self._keys.pop(comment_id))]
+
+    def _add_likes(self, comment_id, n):
+        comment = self._comments.get(comment_id)
+        if comment is None:
+            return
+        if self._by_likes is not None:
+            index = bisect.bisect_left(self._by_likes, self._likes_key(comment))
+            del self._by_likes[index]
+        comment['likes'] = comment.get('likes', 0) + n
+        self._total_likes += n
+        if self._by_likes is not None:
+            bisect.insort(self._by_likes, self._likes_key(comment))
+
+    def _apply(self, event):
+        op = event.get('op')
+        change = None
+        if op == 'new':
+            comment = event['comment']
+            if comment['id'] not in self._comments:
+                self._insert(comment)
+                change = {'op': 'new', 'comment': dict(comment)}
+        elif op == 'like':
+            comment_id = event['id']
+            if comment_id in self._comments:
+                self._add_likes(comment_id, event.get('n', 1))
+                change = {'op': 'like', 'id': comment_id, 'likes': self._comments[comment_id]['likes']}
+        elif op == 'delete':
+            if event['id'] in self._comments:
+                self._remove(event['id'])
+                change = {'op': 'delete', 'id': event['id']}
+        self._log_events += 1
+        if change is not None:
+            self._version += 1
+            self._changes.append((self._version, change))
+
+    def refresh(self):
+        """读取其他会话/进程新追加的事件，返回是否有变化"""
+        with self._lock:
+            return self._refresh(locked=False)
+
+    def _refresh(self, locked):
+        """locked 表示调用方已持有文件锁。需要重新读取快照时在文件锁内进行，保证快照和日志是同一次压缩的"""
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            f = None
+        try:
+            if f is None:
+                generation, start, size = 0, 0, 0
+            else:
+                size = os.fstat(f.fileno()).st_size
+                generation, start = _read_header(f)
+            changed = False
+            if not self._loaded or generation != self._generation or size < self._offset:
+                # 首次加载，或者日志已被其他进程压缩替换：从快照重建
+                if not locked:
+                    if f is not None:
+                        f.close()
+                        f = None
+                    with self._file_lock:
+                        self._refresh(locked=True)
+                    return True
+                snapshot_generation = self._load_snapshot()
+                if f is None or snapshot_generation != generation:
+                    # 没有日志，或者上次压缩在写完快照、替换日志之间中断（快照已包含旧日志中的全部事件）
+                    start = size = self._write_log(snapshot_generation)
+                    generation = snapshot_generation
+                self._generation = generation
+                self._offset = start
+                self._loaded = True
+                changed = True
+            if size <= self._offset:
+                return changed
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        finally:
+            if f is not None:
+                f.close()
+        # 只处理完整的行，写到一半的行留给下次
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._offset += end
+        return changed or end > 0
+
+    def comments(self):
+        """返回评论列表（最新的在前）"""
+        with self._lock:
+            if not self._loaded:
+                self.refresh()
+            return [dict(comment) for comment in reversed(self._comments.values())]
+
+    def get(self, comment_id):
+        """按ID查找评论（O(1)），不存在时返回None"""
+        with self._lock:
+            if not self._loaded:
+                self.refresh()
+            comment = self._comments.get(comment_id)
+            return dict(comment) if comment else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._comments)
+
+    def total_likes(self):
+        with self._lock:
+            return self._total_likes
+
+    def version(self):
+        """当前版本号（不读取文件，需要最新状态时先调用 refresh()）"""
+        with self._lock:
+            return self._version
+
+    def changes_since(self, version):
+        """返回 (当前版本号, version 之后的变更列表)。
+
+        变更是 {'op': 'new', 'comment': 评论} / {'op': 'like', 'id', 'likes': 点赞总数} /
+        {'op': 'delete', 'id'}，按发生顺序排列；version 太旧（变更已被丢弃或状态被整体替换）
+        或者不是本进程给出的版本号时，变更列表为None，调用方需要重新读取。
+        """
+        with self._lock:
+            if version == self._version:
+                return self._version, []
+            oldest = self._changes[0][0] if self._changes else self._version + 1
+            if version > self._version or version < self._changes_start or version < oldest - 1:
+                return self._version, None
+            skip = version - oldest + 1
+            return self._version, [change for _, change in itertools.islice(self._changes, skip, None)]
+
+    def page(self, order="newest", limit=20, cursor=None):
+        """游标分页，返回 (本页评论, 下一页游标)，没有下一页时游标为None。
+
+        order 为 "newest" 时游标是本页最后一条评论的时间键，为 "likes" 时是 (点赞数, 时间键)；
+        下一页从游标的位置二分查找，其他进程删除、压缩评论之后游标仍然指向同一个位置。
+        每次只访问本页的评论，不会遍历全部数据。
+        """
+        with self._lock:
+            if not self._loaded:
+                self.refresh()
+            if order == "likes":
+                if self._by_likes is None:
+                    self._by_likes = sorted(self._likes_key(comment) for comment in self._comments.values())
+                keys = self._by_likes
+            else:
+                keys = self._by_time
+            # 键从小到大排列，从游标（或末尾）往前取 limit + 1 个，多出的一个用来判断有没有下一页
+            end = len(keys) if cursor is None else bisect.bisect_left(keys, cursor_key(order, cursor))
+            page = keys[max(0, end - limit - 1):end][::-1]
+            next_cursor = page[limit - 1] if len(page) > limit else None
+            return [dict(self._comments[self._key_id(key, order)]) for key in page[:limit]], next_cursor
+
+    @staticmethod
+    def _key_id(key, order):
+        """排序键中的评论ID（时间键的最后一项）"""
+        return key[1][-1] if order == "likes" else key[-1]
+
+    # ---- 写入 ----
+
+    def _append(self, *events):
+        data = b"".join((json.dumps(event, ensure_ascii=False) + "\n").encode('utf-8') for event in events)
+        with self._lock, self._file_lock:
+            with open(self.log_path, 'ab') as f:
+                f.write(data)
+            # 追加后读取新字节，顺带应用其他进程在此之前写入的事件
+            self._refresh(locked=True)
+            if self._log_events >= self.compact_threshold:
+                self._compact_locked()
+
+    def add(self, username, content, date=None, comment_id=None, likes=0):
+        """发表评论，返回新评论（comment_id 为None时生成新ID）"""
+        comment = {
+            'id': comment_id or new_comment_id(),
+            'username': username,
+            'content': content,
+            'date': date or time.strftime("%Y-%m-%d %H:%M:%S"),
+            'likes': likes
+        }
+        self._append({'op': 'new', 'comment': comment})
+        return comment
+
+    def like(self, comment_id, n=1):
+        self._append({'op': 'like', 'id': comment_id, 'n': n})
+
+    def like_many(self, counts):
+        """一次追加多条点赞事件 {评论ID: 次数}，只写一次文件"""
+        if counts:
+            self._append(*({'op': 'like', 'id': comment_id, 'n': n} for comment_id, n in counts.items()))
+
+    def delete(self, comment_id):
+        self._append({'op': 'delete', 'id': comment_id})
+
+    # ---- 压缩 ----
+
+    def _write_log(self, generation):
+        """用只有代号一行的新文件替换日志，返回这一行的字节数"""
+        header = (json.dumps({'op': 'compact', 'generation': generation}) + "\n").encode('utf-8')
+        log_tmp = self.log_path + ".tmp"
+        with open(log_tmp, 'wb') as f:
+            f.write(header)
+        os.replace(log_tmp, self.log_path)
+        return len(header)
+
+    def _compact_locked(self):
+        # 在文件锁内先读到最新状态（包括其他进程的压缩），新代号才不会和别人的重复
+        self._refresh(locked=True)
+        generation = self._generation + 1
+        snapshot_tmp = self.snapshot_path + ".tmp"
+        with open(snapshot_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'generation': generation, 'comments': list(self._comments.values())}, f, ensure_ascii=False)
+        os.replace(snapshot_tmp, self.snapshot_path)
+        # 先写快照再替换日志：其他进程看到新日志的代号时，对应的快照已经在了
+        self._offset = self._write_log(generation)
+        self._generation = generation
+        self._log_events = 0
+
+    def compact(self):
+        """把当前状态写成快照并清空日志"""
+        with self._lock, self._file_lock:
+            self._compact_locked()
+
+    def import_comments(self, comments):
+        """存储为空时，一次性导入旧的评论列表（最新的在前）"""
+        with self._lock, self._file_lock:
+            self._refresh(locked=True)
+            if self._comments or os.path.exists(self.snapshot_path):
+                return False
+            for comment in reversed(comments):
+                comment = dict(comment)
+                comment.setdefault('id', new_comment_id())
+                comment.setdefault('likes', 0)
+                self._insert(comment, keep_sorted=False)
+            self._by_time.sort()
+            self._reset_changes()
+            self._compact_locked()
+            return True
+
+
+# 进程内共享的存储实例，所有Streamlit会话共用
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(log_path, snapshot_path, legacy_comments=None):
+    """获取（必要时创建）进程内共享的评论日志存储。
+
+    legacy_comments 是一个返回旧评论列表的函数，只在存储第一次创建且为空时调用。
+    """
+    key = (os.path.abspath(log_path), os.path.abspath(snapshot_path))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = CommentLog(log_path, snapshot_path)
+            if legacy_comments is not None and not os.path.exists(log_path) \
+                    and not os.path.exists(snapshot_path):
+                store.import_comments(legacy_comments())
+            _stores[key] = store
+        return store
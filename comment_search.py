@@ -0,0 +1,176 @@
+"""评论全文搜索 - 中文按相邻两个字（bigram）、英文数字按单词建立倒排索引
+
+索引跟着存储后端的变更记录（comment_changes）增量更新：新评论加入、删除的评论移出，
+不会因为一条评论重新建立整个索引；只有变更无法给出时（第一次搜索、变更记录已经过期、
+JSON 后端）才从全部评论重建。每个后端一个索引，进程内所有会话共用。
+"""
+import array
+import heapq
+import re
+import threading
+
+# 中日韩文字连续的一段，和英文/数字连续的一段
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_RE = re.compile(f"([{_CJK}]+)|([0-9A-Za-z\u00c0-\u024f]+)")
+_CJK_CHAR_RE = re.compile(f"[{_CJK}]")
+
+
+def tokenize(text):
+    """切分成索引词：中文连续的一段切成相邻两字（只有一个字时保留单字），英文数字转小写整词"""
+    terms = []
+    for match in _TOKEN_RE.finditer(text or ""):
+        cjk, word = match.groups()
+        if cjk:
+            if len(cjk) == 1:
+                terms.append(cjk)
+            else:
+                terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            terms.append(word.lower())
+    return terms
+
+
+class CommentSearchIndex:
+    """评论的倒排索引。
+
+    每条评论分配一个递增的内部编号，词 -> 编号数组（array('I')，按编号升序），
+    删除时从这条评论出现过的词的数组中移除。查询返回包含所有查询词的评论（中文相邻两字都命中，
+    近似于包含这段文字），查询词占评论内容比例高（内容短而切题）的排在前面，再按点赞数、发表时间排序。
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}     # 词 -> array('I') 内部编号
+        self._docs = {}         # 内部编号 -> (评论ID, 小写昵称, 内容)
+        self._doc_of = {}       # 评论ID -> 内部编号
+        self._by_user = {}      # 小写昵称 -> 内部编号集合
+        self._rank = {}         # 内部编号 -> 排序键 (-索引词个数, 点赞数, 编号)，越大越靠前
+        self._next_doc = 0
+        self.rebuilds = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+    # ---- 维护 ----
+
+    def _clear(self):
+        self._postings = {}
+        self._docs = {}
+        self._doc_of = {}
+        self._by_user = {}
+        self._rank = {}
+        self._next_doc = 0
+
+    def _add(self, comment):
+        if comment['id'] in self._doc_of:
+            return
+        doc = self._next_doc
+        self._next_doc += 1
+        username = comment.get('username', '').lower()
+        self._docs[doc] = (comment['id'], username, comment.get('content', ''))
+        self._doc_of[comment['id']] = doc
+        self._by_user.setdefault(username, set()).add(doc)
+        terms = set(tokenize(comment.get('content', '')))
+        self._rank[doc] = (-len(terms), comment.get('likes', 0), doc)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = array.array('I')
+            postings.append(doc)
+
+    def _remove(self, comment_id):
+        doc = self._doc_of.pop(comment_id, None)
+        if doc is None:
+            return
+        _, username, content = self._docs.pop(doc)
+        del self._rank[doc]
+        users = self._by_user.get(username)
+        if users is not None:
+            users.discard(doc)
+            if not users:
+                del self._by_user[username]
+        for term in set(tokenize(content)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.remove(doc)
+                if not postings:
+                    del self._postings[term]
+
+    def _rebuild(self):
+        # 先取版本号再读取，读取期间的变更下次还会取到（重复的新增会被忽略）
+        version = self.backend.comment_version()
+        self._clear()
+        for comment in reversed(self.backend.load_comments()):
+            self._add(comment)
+        self._version = version
+        self.rebuilds += 1
+
+    def refresh(self):
+        """应用上次以来的变更（没有变更时只是一次版本号比较）"""
+        with self._lock:
+            if self._version is None:
+                self._rebuild()
+                return
+            version, changes = self.backend.comment_changes(self._version)
+            if version == self._version:
+                return
+            if changes is None:
+                self._rebuild()
+                return
+            for change in changes:
+                if change['op'] == 'new':
+                    self._add(change['comment'])
+                elif change['op'] == 'delete':
+                    self._remove(change['id'])
+                else:
+                    doc = self._doc_of.get(change['id'])
+                    if doc is not None:
+                        length, _, _ = self._rank[doc]
+                        self._rank[doc] = (length, change['likes'], doc)
+            self._version = version
+
+    # ---- 查询 ----
+
+    def _matching(self, term):
+        """包含这个词的评论编号集合；单个汉字匹配所有包含这个字的词"""
+        if len(term) == 1 and _CJK_CHAR_RE.match(term):
+            return set().union(*(postings for key, postings in self._postings.items() if term in key))
+        return set(self._postings.get(term, ()))
+
+    def search(self, query="", username=None, limit=20):
+        """返回 (匹配的评论ID列表（按相关度排序，最多 limit 个）, 匹配总数)。
+
+        query 为空时只按昵称筛选（最新的在前）；username 不区分大小写、完整匹配。
+        """
+        self.refresh()
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            allowed = None
+            if username:
+                allowed = self._by_user.get(username.strip().lower(), set())
+            if not terms:
+                if allowed is None:
+                    return [], 0
+                docs = heapq.nlargest(limit, allowed)
+                return [self._docs[doc][0] for doc in docs], len(allowed)
+
+            # 集合运算都在 C 层完成，从最小的集合开始求交集
+            matched = sorted((self._matching(term) for term in terms), key=len)
+            if allowed is not None:
+                matched.insert(0, allowed)
+            result = matched[0].intersection(*matched[1:])
+            # 所有结果都包含全部查询词，内容越短越切题；排序键预先算好，比较在 C 层完成
+            top = heapq.nlargest(limit, result, key=self._rank.__getitem__)
+            return [self._docs[doc][0] for doc in top], len(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'comments': len(self._docs),
+                'terms': len(self._postings),
+                'postings': sum(len(postings) for postings in self._postings.values()),
+                'rebuilds': self.rebuilds,
+            }
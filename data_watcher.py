@@ -0,0 +1,207 @@
+"""数据文件变化通知 - 每个进程一个监视线程，数据文件被（任何进程）改动后递增它的变化代号
+
+会话每次重跑都要确认评论、公告有没有被改过。有了变化代号，文件没有变化时只需比较两个整数，
+不用每个会话每次都 stat 文件或查询数据库；多个服务进程共用一个数据目录时，
+一个进程写入后，其他进程的监视线程收到通知，下一次读取就会重新检查。
+
+模式（环境变量 DATA_WATCH）：
+    auto     默认：Linux 上用 inotify，不可用时改为轮询
+    inotify  只用 inotify（不可用时报错）
+    poll     每 POLL_INTERVAL 秒比较一次文件的 (inode, 修改时间, 大小)；
+             数据目录在网络文件系统上时用这个（inotify 收不到其他机器上的改动）
+    off      不监视，每次读取都直接检查文件（最初的行为）
+不论哪种模式，所有代号每 REVALIDATE_INTERVAL 秒都会变化一次，万一漏掉了通知，最多延迟这么久。
+本进程的写入由存储后端调用 touch() 立即递增，不等通知。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+WATCH_MODE = os.environ.get("DATA_WATCH", "auto")
+POLL_INTERVAL = 0.5
+REVALIDATE_INTERVAL = 5.0
+
+# inotify 事件（见 inotify(7)）。不监视 IN_CLOSE_WRITE：SQLite 每个连接关闭时都会产生，即使什么也没写
+IN_MODIFY = 0x002
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")   # wd, mask, cookie, len
+
+
+def _stat_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class _Inotify:
+    """用 ctypes 调用 libc 的 inotify，监视目录（原子替换写入的文件 inode 会变，只能监视所在目录）"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._directories = {}   # watch descriptor -> 目录
+
+    def add(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视目录 {directory}")
+        self._directories[wd] = directory
+
+    def read(self, timeout):
+        """等待最多 timeout 秒，返回改动的文件路径列表；事件队列溢出时列表中有一个None"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                paths.append(None)
+            elif name and wd in self._directories:
+                paths.append(os.path.join(self._directories[wd], os.fsdecode(name)))
+        return paths
+
+
+class FileWatcher:
+    """进程内的数据文件监视器：文件路径 -> 变化代号"""
+
+    def __init__(self, mode=WATCH_MODE, poll_interval=POLL_INTERVAL, revalidate_interval=REVALIDATE_INTERVAL):
+        self.poll_interval = poll_interval
+        self.revalidate_interval = revalidate_interval
+        self._lock = threading.Lock()
+        self._generations = {}   # 绝对路径 -> 代号
+        self._versions = {}      # 轮询模式下上次看到的 (inode, 修改时间, 大小)
+        self._directories = set()
+        self._epoch = 0          # 定期递增，让所有代号失效
+        self._inotify = None
+        self.notifications = 0   # 收到的（本进程以外的）改动次数
+        self.overflows = 0
+        if mode == "off":
+            self.mode = "off"
+            return
+        if mode in ("auto", "inotify"):
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                if mode == "inotify":
+                    raise
+        self.mode = "inotify" if self._inotify is not None else "poll"
+        threading.Thread(target=self._run, name="data-watcher", daemon=True).start()
+
+    def watch(self, *paths):
+        """开始监视这些文件（文件可以还不存在），返回它们的绝对路径，之后传给 generation / touch"""
+        paths = tuple(os.path.abspath(path) for path in paths)
+        for path in paths:
+            directory = os.path.dirname(path)
+            with self._lock:
+                if path in self._generations:
+                    continue
+                self._generations[path] = 0
+                self._versions[path] = _stat_version(path)
+                new_directory = directory not in self._directories
+                self._directories.add(directory)
+            if new_directory and self._inotify is not None:
+                self._inotify.add(directory)
+        return paths
+
+    def generation(self, paths):
+        """这组文件的变化代号，代号相同说明期间没有改动；不监视（off 模式）时返回None，调用方每次都要检查"""
+        if self.mode == "off":
+            return None
+        with self._lock:
+            return self._epoch, sum(self._generations.get(path, 0) for path in paths)
+
+    def touch(self, paths):
+        """本进程写入了这些文件：立即递增代号（通知是异步的，不能等它）"""
+        with self._lock:
+            for path in paths:
+                if path in self._generations:
+                    self._generations[path] += 1
+
+    def _changed(self, paths):
+        with self._lock:
+            for path in paths:
+                if path is None:
+                    # 事件队列溢出，不知道哪些文件变了
+                    self.overflows += 1
+                    self._epoch += 1
+                elif path in self._generations:
+                    self._generations[path] += 1
+                    self.notifications += 1
+
+    def _poll(self):
+        with self._lock:
+            paths = list(self._generations)
+        changed = []
+        for path in paths:
+            version = _stat_version(path)
+            with self._lock:
+                if version != self._versions.get(path):
+                    self._versions[path] = version
+                    changed.append(path)
+        if changed:
+            self._changed(changed)
+
+    def _run(self):
+        revalidate_at = time.monotonic() + self.revalidate_interval
+        while True:
+            now = time.monotonic()
+            if now >= revalidate_at:
+                with self._lock:
+                    self._epoch += 1
+                revalidate_at = now + self.revalidate_interval
+            timeout = min(self.poll_interval, max(0.0, revalidate_at - now))
+            if self._inotify is not None:
+                paths = self._inotify.read(timeout)
+                if paths:
+                    self._changed(paths)
+            else:
+                time.sleep(timeout)
+                self._poll()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'files': len(self._generations),
+                'notifications': self.notifications,
+                'overflows': self.overflows,
+                'epoch': self._epoch,
+            }
+
+
+# 不监视：直接创建后端（基准测试、脚本）时的默认值，行为和没有监视器时一样
+UNWATCHED = FileWatcher("off")
+
+# 进程内共享的监视器
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher():
+    """获取（必要时启动）本进程的数据文件监视器（模式由 DATA_WATCH 决定）"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = FileWatcher()
+        return _watcher
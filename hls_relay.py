@@ -0,0 +1,574 @@
+"""HLS 本地中继 - 把直链播放列表改写成指向本机的地址，分片从上游下载一次，存在磁盘上给所有观众共用
+
+观看同一集的观众请求的是同样的分片：第一个观众请求某个分片时从上游下载（同时预读后面几个分片），
+之后的观众直接从本机磁盘读取，看的人越多，省下的上游流量越多、起播和卡顿越少。
+磁盘缓存有总大小上限，超过后删除最久未用的分片；发送文件用 sendfile（零拷贝）。
+中继只转发自己改写过的地址（地址带签名），不是开放代理；上游只能是解析到公网地址的 http(s) 地址，
+播放列表里指向内网、本机的地址不改写也不下载（防止借中继访问服务器所在的内网）。
+
+Streamlit 不能添加自定义的 HTTP 路由，中继服务在单独的端口上运行（每个进程启动一次）。环境变量：
+    HLS_RELAY_HOST        中继监听的地址（默认 127.0.0.1，只有本机能访问；要让其他机器直接访问时设置成 0.0.0.0，
+                          或者放在反向代理后面并设置 HLS_RELAY_PUBLIC_URL）
+    HLS_RELAY_PORT        中继端口（默认 8502）
+    HLS_RELAY_PUBLIC_URL  浏览器访问中继的地址（默认与页面同一主机名、中继端口；放在反向代理后面时设置）
+    HLS_CACHE_DIR         分片缓存目录（默认在系统临时目录下）
+    HLS_CACHE_MB          分片缓存大小上限（默认 2048 MB）
+    HLS_RELAY_SECRET      地址签名密钥（多个进程共用同一个中继端口时设置成相同的值）
+"""
+import base64
+import hashlib
+import hmac
+import ipaddress
+import mimetypes
+import os
+import re
+import secrets
+import socket
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+import parser_health
+import url_rules
+
+RELAY_HOST = os.environ.get("HLS_RELAY_HOST", "127.0.0.1")
+RELAY_PORT = int(os.environ.get("HLS_RELAY_PORT", "8502"))
+RELAY_PUBLIC_URL = os.environ.get("HLS_RELAY_PUBLIC_URL")
+RELAY_SECRET = os.environ.get("HLS_RELAY_SECRET")
+CACHE_DIR = os.environ.get("HLS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "spongebob_hls_cache"))
+CACHE_BYTES = int(os.environ.get("HLS_CACHE_MB", "2048")) * 1024 * 1024
+
+READ_AHEAD = 3                 # 每次请求分片后预读之后的几个分片
+UPSTREAM_WORKERS = 4           # 同时从上游下载的分片数
+UPSTREAM_TIMEOUT = (5, 20)     # (连接超时, 读取超时) 秒
+CHUNK_SIZE = 64 * 1024
+PLAYLIST_CACHE_SIZE = 256
+PLAYLIST_CACHE_TTL = 300       # 点播列表（有 #EXT-X-ENDLIST）缓存 5 分钟，直播列表每次重新请求
+SEGMENT_INDEX_SIZE = 100000    # 记住多少个分片的下一个分片（预读用）
+SEGMENT_INDEX_TTL = 6 * 3600
+HOST_CHECK_SIZE = 1024         # 记住多少个上游主机名是否为公网地址
+HOST_CHECK_TTL = 60
+MAX_REDIRECTS = 5              # 上游跳转时每一跳都重新检查地址
+
+# 分片扩展名 -> Content-Type（mimetypes 不认识的）
+SEGMENT_TYPES = {
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+    '.aac': 'audio/aac',
+    '.key': 'application/octet-stream',
+}
+PLAYLIST_TYPE = 'application/vnd.apple.mpegurl'
+
+class UpstreamNotAllowed(Exception):
+    """上游地址不是公网的 http(s) 地址"""
+
+
+_URI_ATTR_RE = re.compile(r'URI="([^"]+)"')
+_PATH_RE = re.compile(r"/([ps])/([0-9a-f]{16})/([A-Za-z0-9_-]+)(\.[A-Za-z0-9]{1,5})?")
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def _encode(url):
+    return base64.urlsafe_b64encode(url.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode(token):
+    return base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+
+
+def _key(url):
+    """分片在磁盘缓存中的文件名"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _extension(url):
+    ext = os.path.splitext(urlsplit(url).path)[1]
+    return ext if re.fullmatch(r"\.[A-Za-z0-9]{1,5}", ext) else ''
+
+
+def is_public_host(hostname):
+    """主机名的所有地址都是公网地址时返回True（内网、本机、链路本地、保留、组播地址都不算）"""
+    try:
+        infos = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP)
+    except (OSError, UnicodeError, ValueError):
+        return False
+    if not infos:
+        return False
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            return False
+    return True
+
+
+def rewrite_playlist(text, base_url, relay_path, allowed=None):
+    """把播放列表中的地址改写成中继地址，返回 (改写后的文本, 按顺序排列的分片地址)。
+
+    relay_path(地址, 类型) 返回中继地址，类型 'p' 是播放列表，'s' 是分片。
+    master 列表中的子播放列表和 EXT-X-MEDIA 的地址按播放列表改写，其余（分片、密钥、初始化分片）按分片改写。
+    allowed(地址) 返回False的地址（以及不是 http(s) 的地址）保持原样，不经过中继。
+    """
+    master = '#EXT-X-STREAM-INF' in text
+    lines, segments = [], []
+
+    def relayable(url):
+        return url.startswith(('http://', 'https://')) and (allowed is None or allowed(url))
+
+    def rewrite_attr(kind):
+        def replace(match):
+            url = urljoin(base_url, match.group(1))
+            return f'URI="{relay_path(url, kind)}"' if relayable(url) else match.group(0)
+        return replace
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            if 'URI="' in stripped:
+                kind = 'p' if stripped.startswith(('#EXT-X-MEDIA:', '#EXT-X-I-FRAME-STREAM-INF:')) else 's'
+                line = _URI_ATTR_RE.sub(rewrite_attr(kind), line)
+        elif stripped:
+            url = urljoin(base_url, stripped)
+            if relayable(url):
+                if master:
+                    line = relay_path(url, 'p')
+                else:
+                    if not segments or segments[-1] != url:
+                        segments.append(url)
+                    line = relay_path(url, 's')
+        lines.append(line)
+    return "\n".join(lines) + "\n", segments
+
+
+def public_base_url(host_header=None, port=RELAY_PORT):
+    """浏览器访问中继的地址：设置了 HLS_RELAY_PUBLIC_URL 时用它，否则用页面的主机名加中继端口"""
+    if RELAY_PUBLIC_URL:
+        return RELAY_PUBLIC_URL.rstrip('/')
+    hostname = urlsplit(f"//{host_header or 'localhost'}").hostname or 'localhost'
+    if ':' in hostname:
+        hostname = f"[{hostname}]"
+    return f"http://{hostname}:{port}"
+
+
+class SegmentCache:
+    """磁盘上的分片缓存：文件名是上游地址的摘要，总大小超过上限时删除最久未用的分片"""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # 文件名 -> 字节数，最久未用的在前
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # 进程重启后沿用目录中已有的分片，按修改时间排出使用顺序
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            for _, name, size in sorted(files):
+                self._entries[name] = size
+                self.size += size
+            self._evict()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key):
+        """已缓存时返回文件路径（并标记为最近使用），否则返回None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self.path(key)
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def store(self, key, chunks):
+        """把下载的内容写入缓存（先写临时文件再改名，读到的文件总是完整的），返回写入的字节数"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old
+            self._entries[key] = size
+            self.size += size
+            self._evict()
+        return size
+
+    def discard(self, key):
+        """文件已经不在了（例如被其他进程删除）时移出索引"""
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self.size -= size
+
+    def _evict(self):
+        # 至少保留刚写入的一个分片；正在发送的文件被删除后仍可以读完
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+class HlsRelay:
+    """HLS 中继：改写播放列表、下载并缓存分片、预读，以及对外提供这些地址的 HTTP 服务"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_BYTES, secret=RELAY_SECRET,
+                 read_ahead=READ_AHEAD, workers=UPSTREAM_WORKERS, session=None, allow_private=False):
+        self.cache = SegmentCache(cache_dir, max_bytes)
+        self.secret = secret.encode('utf-8') if secret else secrets.token_bytes(32)
+        self.read_ahead = read_ahead
+        self.workers = workers
+        self.session = session or parser_health.make_session(workers)
+        self.playlists = url_rules.LRUCache(PLAYLIST_CACHE_SIZE, PLAYLIST_CACHE_TTL)
+        self._following = url_rules.LRUCache(SEGMENT_INDEX_SIZE, SEGMENT_INDEX_TTL)   # 分片地址 -> (分片列表, 位置)
+        self.allow_private = allow_private   # 本地测试时上游在本机
+        self._hosts = url_rules.LRUCache(HOST_CHECK_SIZE, HOST_CHECK_TTL)   # 主机名 -> 是否为公网地址
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="hls-fetch")
+        self._lock = threading.Lock()
+        self._inflight = {}   # 文件名 -> 正在下载的 Future
+        self.upstream_bytes = 0
+        self.served_bytes = 0
+        self.prefetches = 0
+        self.server = None
+        self.port = None
+
+    # ---- 地址 ----
+
+    def _sign(self, kind, url):
+        return hmac.new(self.secret, f"{kind}:{url}".encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+    def relay_path(self, url, kind='s'):
+        """上游地址对应的中继路径（带签名，扩展名与上游相同）"""
+        return f"/{kind}/{self._sign(kind, url)}/{_encode(url)}{_extension(url)}"
+
+    def playlist_url(self, url, base_url):
+        """浏览器播放用的中继播放列表地址"""
+        return f"{base_url.rstrip('/')}{self.relay_path(url, 'p')}"
+
+    def verify(self, path):
+        """中继路径 -> (类型, 上游地址)；不是中继签发的路径返回None"""
+        match = _PATH_RE.fullmatch(path)
+        if match is None:
+            return None
+        kind, signature, token, _ = match.groups()
+        try:
+            url = _decode(token)
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(kind, url)):
+            return None
+        return kind, url
+
+    # ---- 上游 ----
+
+    def allowed(self, url):
+        """中继是否可以访问这个上游地址：http(s) 地址，并且主机名解析到公网地址"""
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return False
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return False
+        if self.allow_private:
+            return True
+        public = self._hosts.get(parts.hostname)
+        if public is None:
+            public = is_public_host(parts.hostname)
+            self._hosts.put(parts.hostname, public)
+        return public
+
+    def _get(self, url, **kwargs):
+        """请求上游；跳转由这里处理，每一跳的地址都要检查"""
+        for _ in range(MAX_REDIRECTS + 1):
+            if not self.allowed(url):
+                raise UpstreamNotAllowed(url)
+            response = self.session.get(url, timeout=UPSTREAM_TIMEOUT, allow_redirects=False, **kwargs)
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(url, response.headers['Location'])
+        raise requests.TooManyRedirects(f"超过 {MAX_REDIRECTS} 次跳转")
+
+    def playlist(self, url):
+        """改写后的播放列表文本，同时预读开头的几个分片"""
+        cached = self.playlists.get(url)
+        if cached is None:
+            response = self._get(url)
+            response.raise_for_status()
+            with self._lock:
+                self.upstream_bytes += len(response.content)
+            text, segments = rewrite_playlist(response.text, response.url, self.relay_path, self.allowed)
+            for position, segment in enumerate(segments):
+                self._following.put(segment, (segments, position))
+            cached = (text, segments)
+            if '#EXT-X-ENDLIST' in text:
+                self.playlists.put(url, cached)
+        text, segments = cached
+        self._prefetch(segments[:self.read_ahead])
+        return text
+
+    def _download(self, url, key):
+        received = 0
+
+        def chunks(response):
+            nonlocal received
+            for chunk in response.iter_content(CHUNK_SIZE):
+                received += len(chunk)
+                yield chunk
+
+        try:
+            with self._get(url, stream=True) as response:
+                response.raise_for_status()
+                self.cache.store(key, chunks(response))
+        finally:
+            with self._lock:
+                self.upstream_bytes += received
+        return self.cache.path(key)
+
+    def _fetch(self, url):
+        """下载分片的 Future；同一个分片正在下载时共用同一个"""
+        key = _key(url)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._inflight[key] = self._pool.submit(self._download, url, key)
+        # 在锁外登记回调：已经完成的 Future 会在当前线程立即调用回调
+        future.add_done_callback(lambda _: self._finished(key))
+        return future
+
+    def _finished(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _prefetch(self, urls):
+        """在后台下载还没有缓存的分片；排队的下载数有上限，观众拖动进度条时不会堆积大量旧的预读"""
+        for url in urls:
+            key = _key(url)
+            with self._lock:
+                if key in self._inflight or len(self._inflight) >= self.workers * 2:
+                    continue
+            if key in self.cache:
+                continue
+            self._fetch(url)
+            with self._lock:
+                self.prefetches += 1
+
+    def segment_path(self, url):
+        """分片的本地文件路径（没有缓存时从上游下载，多个观众同时请求只下载一次），并预读之后的分片"""
+        key = _key(url)
+        path = self.cache.lookup(key)
+        if path is None:
+            path = self._fetch(url).result()
+        following = self._following.get(url)
+        if following is not None:
+            segments, position = following
+            self._prefetch(segments[position + 1:position + 1 + self.read_ahead])
+        return path
+
+    # ---- 服务 ----
+
+    def start(self, host=RELAY_HOST, port=RELAY_PORT):
+        """在后台线程中启动 HTTP 服务，返回实际端口（port 为 0 时随机分配）"""
+        handler = type("RelayHandler", (_RelayHandler,), {'relay': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="hls-relay", daemon=True).start()
+        return self.port
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self._lock:
+            stats.update({
+                'upstream_bytes': self.upstream_bytes,
+                'served_bytes': self.served_bytes,
+                'prefetches': self.prefetches,
+                'downloading': len(self._inflight),
+                'running': self.server is not None,
+            })
+        return stats
+
+
+class _RelayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    relay = None
+
+    def log_message(self, *args):
+        pass
+
+    def _cors(self):
+        # 播放器在页面的 iframe 中，和中继不同源
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Headers", "Range")
+        self.send_header("Access-Control-Expose-Headers", "Content-Length, Content-Range")
+
+    def _error(self, status):
+        self.send_response(status)
+        self._cors()
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._cors()
+        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        target = self.relay.verify(urlsplit(self.path).path)
+        if target is None:
+            self._error(404)
+            return
+        kind, url = target
+        try:
+            if kind == 'p':
+                self._send_playlist(self.relay.playlist(url))
+            else:
+                self._send_segment(url)
+        except UpstreamNotAllowed:
+            self._error(403)
+        except requests.RequestException:
+            self._error(502)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except OSError:
+            # 磁盘写满等，不影响其他请求
+            self._error(502)
+
+    def _send_playlist(self, text):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self._cors()
+        self.send_header("Content-Type", PLAYLIST_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_segment(self, url):
+        try:
+            f = open(self.relay.segment_path(url), 'rb')
+        except FileNotFoundError:
+            # 刚好被淘汰或被其他进程删除了，重新下载一次
+            self.relay.cache.discard(_key(url))
+            f = open(self.relay.segment_path(url), 'rb')
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            start, end, status = 0, size - 1, 200
+            match = _RANGE_RE.fullmatch(self.headers.get("Range", "").strip())
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                else:
+                    start = max(0, size - int(match.group(2)))
+                if start > end:
+                    self.send_response(416)
+                    self._cors()
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status = 206
+            ext = _extension(url).lower()
+            content_type = SEGMENT_TYPES.get(ext) or mimetypes.guess_type(f"x{ext}")[0] or 'application/octet-stream'
+            length = end - start + 1
+            self.send_response(status)
+            self._cors()
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Cache-Control", "public, max-age=86400")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            if length > 0:
+                # socket.sendfile 在 Linux 上使用 os.sendfile，文件内容不经过用户态
+                self.connection.sendfile(f, start, length)
+            with self.relay._lock:
+                self.relay.served_bytes += length
+
+
+# 进程内共享的中继
+_relay = None
+_relay_lock = threading.Lock()
+
+
+def ensure_relay():
+    """启动（仅一次）本进程的中继服务，返回中继。
+
+    端口已被占用时（例如同一台机器上另一个进程已经启动了中继）不再启动服务，只改写地址，
+    这时各进程需要设置相同的 HLS_RELAY_SECRET。
+    """
+    global _relay
+    with _relay_lock:
+        if _relay is None:
+            _relay = HlsRelay()
+            try:
+                _relay.start()
+            except OSError:
+                _relay.port = RELAY_PORT
+        return _relay
+
+
+def current_relay():
+    """已经启动的中继（还没有人用过中继时为None）"""
+    return _relay
@@ -1,12 +1,19 @@
 import streamlit as st
-import base64
-import requests
-from urllib.parse import quote, urlparse, parse_qs
-import re
+from streamlit.errors import StreamlitAPIException
 from datetime import datetime
-import json
+import importlib
 import os
 
+import cards
+import data_watcher
+import perf
+import parser_health
+import play_stats
+import probe_scheduler
+import storage
+import url_rules
+import warmup
+
 # 设置页面配置
 st.set_page_config(
     page_title="🍍 海绵宝宝视频播放器 🍍",
@@ -15,43 +22,123 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 数据文件路径
-COMMENTS_FILE = "comments.json"
-ANNOUNCEMENTS_FILE = "announcements.json"
+# 数据文件路径（多个服务进程共用同一个 DATA_DIR，见 README 的多进程部署）
+DATA_DIR = os.environ.get("DATA_DIR", ".")
+COMMENTS_FILE = os.path.join(DATA_DIR, "comments.json")
+COMMENTS_LOG_FILE = os.path.join(DATA_DIR, "comments.log")
+COMMENTS_SNAPSHOT_FILE = os.path.join(DATA_DIR, "comments.snapshot.json")
+ANNOUNCEMENTS_FILE = os.path.join(DATA_DIR, "announcements.json")
+DATABASE_FILE = os.path.join(DATA_DIR, "data.db")
+PLAY_STATS_FILE = os.path.join(DATA_DIR, "play_stats.json")
+
+# 评论区每页显示的评论数
+COMMENTS_PAGE_SIZE = 20
+
+# 实时更新时评论列表的刷新间隔（秒）
+COMMENT_REFRESH_SECONDS = 2
+
+# 评论排序方式
+COMMENT_ORDER_LABELS = {
+    "newest": "🕒 最新发表",
+    "likes": "❤️ 最多点赞"
+}
+
+# 存储后端：json / log / sqlite（见 storage.py）
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "log")
+
+# 获取存储后端（进程内共享）
+def get_storage():
+    """获取当前配置的存储后端"""
+    return storage.open_backend(
+        STORAGE_BACKEND, COMMENTS_FILE, ANNOUNCEMENTS_FILE,
+        log_file=COMMENTS_LOG_FILE, snapshot_file=COMMENTS_SNAPSHOT_FILE, db_file=DATABASE_FILE
+    )
+
+# 分页读取评论
+@perf.timed("storage.page_comments")
+def page_comments(order="newest", cursor=None, limit=None):
+    """按游标读取一页评论，返回 (本页评论, 下一页游标)"""
+    try:
+        return get_storage().page_comments(order, limit or COMMENTS_PAGE_SIZE, cursor)
+    except Exception as e:
+        st.error(f"加载评论数据失败: {e}")
+        return [], None
+
+# 评论统计
+@perf.timed("storage.comment_stats")
+def comment_stats():
+    """返回 (评论数量, 总点赞数)"""
+    try:
+        return get_storage().comment_stats()
+    except Exception as e:
+        st.error(f"加载评论数据失败: {e}")
+        return 0, 0
+
+# 评论变更
+@perf.timed("storage.comment_changes")
+def comment_changes(since):
+    """返回 (当前版本号, since 之后的变更)；变更为None时需要重新读取"""
+    try:
+        return get_storage().comment_changes(since)
+    except Exception as e:
+        st.error(f"加载评论数据失败: {e}")
+        return None, None
 
-# 加载评论数据
-def load_comments():
-    """从JSON文件加载评论数据"""
+# 评论版本号
+@perf.timed("storage.comment_version")
+def comment_version():
     try:
-        if os.path.exists(COMMENTS_FILE):
-            with open(COMMENTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        return get_storage().comment_version()
     except Exception as e:
         st.error(f"加载评论数据失败: {e}")
-    return []
+        return None
 
-# 保存评论数据
-def save_comments(comments):
-    """保存评论数据到JSON文件"""
+# 搜索评论
+@perf.timed("storage.search_comments")
+def search_comments(query, username=None):
+    """全文搜索评论（倒排索引，见 comment_search.py），返回 (按相关度排序的评论, 匹配总数)"""
     try:
-        with open(COMMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(comments, f, ensure_ascii=False, indent=2)
+        backend = get_storage()
+        ids, total = backend.search_index.search(query, username, COMMENTS_PAGE_SIZE)
+        return backend.get_comments(ids), total
+    except Exception as e:
+        st.error(f"搜索评论失败: {e}")
+        return [], 0
+
+# 发表评论
+@perf.timed("storage.add_comment")
+def add_comment(username, content):
+    """发表一条评论"""
+    try:
+        get_storage().add_comment(username, content, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         return True
     except Exception as e:
         st.error(f"保存评论数据失败: {e}")
         return False
 
-# 加载公告数据
-def load_announcements():
-    """从JSON文件加载公告数据"""
+# 点赞评论
+@perf.timed("storage.like_comment")
+def like_comment(comment_id):
+    """给评论点赞：先记在进程内的缓冲中，由后台每隔几百毫秒合并写入一次"""
     try:
-        if os.path.exists(ANNOUNCEMENTS_FILE):
-            with open(ANNOUNCEMENTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        get_storage().like_batcher.add(comment_id)
+        return True
     except Exception as e:
-        st.error(f"加载公告数据失败: {e}")
-    
-    # 返回默认公告
+        st.error(f"保存评论数据失败: {e}")
+        return False
+
+# 删除评论
+@perf.timed("storage.delete_comment")
+def delete_comment(comment_id):
+    """删除一条评论"""
+    try:
+        return get_storage().delete_comment(comment_id)
+    except Exception as e:
+        st.error(f"保存评论数据失败: {e}")
+        return False
+
+# 默认公告（从未发布过公告时显示）
+def default_announcements():
     return [
         {
             'title': '🎉 欢迎使用海绵宝宝视频播放器！',
@@ -61,81 +148,89 @@ def load_announcements():
         }
     ]
 
-# 保存公告数据
-def save_announcements(announcements):
-    """保存公告数据到JSON文件"""
+# 加载公告数据
+@perf.timed("storage.load_announcements")
+def load_announcements():
+    """从存储后端加载公告数据"""
     try:
-        with open(ANNOUNCEMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(announcements, f, ensure_ascii=False, indent=2)
-        return True
+        # 进程内共享缓存，文件/数据库没有变化时不读取磁盘
+        announcements = get_storage().announcement_cache.get()
+        if announcements is not None:
+            return announcements
+    except Exception as e:
+        st.error(f"加载公告数据失败: {e}")
+    
+    # 返回默认公告
+    return default_announcements()
+
+# 修改公告数据
+@perf.timed("storage.update_announcements")
+def update_announcements(mutate):
+    """读-改-写公告列表（mutate 原地修改），其他管理员同时修改时不会互相覆盖；返回最新的公告列表，失败时返回None"""
+    backend = get_storage()
+    try:
+        return backend.update_announcements(mutate, default_announcements())
     except Exception as e:
         st.error(f"保存公告数据失败: {e}")
-        return False
+        return None
+    finally:
+        backend.announcement_cache.invalidate()
 
-# 初始化session state和数据
-if 'admin_logged_in' not in st.session_state:
-    st.session_state.admin_logged_in = False
+# 片段（评论区、公告板、内置浏览器、播放队列各自是一个片段）
+def fragment(func=None, *, run_every=None):
+    """@fragment 或 @fragment(run_every=秒数)。旧版本 Streamlit 没有 st.fragment，
+    退回到普通函数，随整页一起重跑（评论列表不会定时刷新）"""
+    if not hasattr(st, "fragment"):
+        return func if func is not None else (lambda f: f)
+    if func is None:
+        return st.fragment(run_every=run_every)
+    return st.fragment(func)
 
-# 加载共享数据
-if 'shared_comments' not in st.session_state:
-    st.session_state.shared_comments = load_comments()
+# 只重跑当前片段
+def rerun_fragment():
+    """在片段单独重跑时只重跑这个片段；整页重跑期间（或旧版本 Streamlit 不支持 scope）时退回到整页重跑"""
+    try:
+        st.rerun(scope="fragment")
+    except (StreamlitAPIException, TypeError):
+        st.rerun()
 
-if 'shared_announcements' not in st.session_state:
-    st.session_state.shared_announcements = load_announcements()
+# 标签页：只运行当前打开的那一个（见 main_tabs）
+MAIN_TABS = ["🎬 视频播放", "📢 公告板", "💬 评论区", "🔧 管理中心"]
 
-# 添加视频链接处理函数
-def process_video_url(url):
-    """处理各种视频网站的链接，进行标准化"""
-    original_url = url
-    
-    # 腾讯视频处理
-    if 'v.qq.com' in url:
-        # 提取vid参数
-        parsed_url = urlparse(url)
-        query_params = parse_qs(parsed_url.query)
-        
-        if 'vid' in query_params:
-            vid = query_params['vid'][0]
-            # 转换为PC版标准链接
-            processed_url = f"https://v.qq.com/x/cover/{vid}.html"
-            return processed_url, f"🎬 腾讯视频链接已转换: {vid}"
-        else:
-            # 尝试从路径中提取
-            vid_match = re.search(r'vid=([^&]+)', url)
-            if vid_match:
-                vid = vid_match.group(1)
-                processed_url = f"https://v.qq.com/x/cover/{vid}.html"
-                return processed_url, f"🎬 腾讯视频链接已转换: {vid}"
-    
-    # 爱奇艺处理
-    if 'iqiyi.com' in url:
-        # 移动版转PC版
-        if 'm.iqiyi.com' in url:
-            processed_url = url.replace('m.iqiyi.com', 'www.iqiyi.com')
-            return processed_url, "📺 爱奇艺链接已转换为PC版"
-    
-    # 优酷处理
-    if 'youku.com' in url:
-        if 'm.youku.com' in url:
-            processed_url = url.replace('m.youku.com', 'v.youku.com')
-            return processed_url, "🎞️ 优酷链接已转换为PC版"
-    
-    # 哔哩哔哩处理
-    if 'bilibili.com' in url:
-        if 'm.bilibili.com' in url:
-            processed_url = url.replace('m.bilibili.com', 'www.bilibili.com')
-            return processed_url, "📱 B站链接已转换为PC版"
-        
-        # 处理番剧链接（ep开头的）
-        if '/bangumi/play/' in url and 'ep' in url:
-            # 提取ep号并转换为标准格式
-            ep_match = re.search(r'ep(\d+)', url)
-            if ep_match:
-                ep_id = ep_match.group(1)
-                processed_url = f"https://www.bilibili.com/bangumi/play/ep{ep_id}"
-                return processed_url, f"📺 B站番剧链接已标准化: ep{ep_id}"
-    
-    return original_url, None
+# 切换标签页后要保留的输入（没有运行的控件，Streamlit 会在重跑结束时清除它的值）
+TAB_WIDGET_KEYS = {
+    "🎬 视频播放": ("browser_platform", "browser_url_input", "browse_option", "extracted_video_url"),
+    "💬 评论区": ("comment_username", "comment_text", "comment_live", "comment_order",
+                 "comment_search", "comment_search_user"),
+    "🔧 管理中心": ("new_announcement_title", "new_announcement_content"),
+}
+
+def tab_opened(tab):
+    """标签页是否需要运行（不跟踪状态时 .open 为None，全部运行）"""
+    return getattr(tab, "open", None) is not False
+
+def main_tabs():
+    """创建标签页。切换标签页时重跑，只运行打开的标签页：没打开评论区时不读取评论，也不启动评论列表的定时刷新。
+    旧版本 Streamlit 的标签页不跟踪状态，退回到每次运行全部标签页"""
+    try:
+        tabs = st.tabs(MAIN_TABS, key="main_tab", on_change="rerun")
+    except TypeError:
+        return st.tabs(MAIN_TABS)
+    for label, tab in zip(MAIN_TABS, tabs):
+        if not tab_opened(tab):
+            # 重新赋值一次，这些控件的值就不会被清除（只对这次不运行的控件赋值，否则会出现默认值冲突的警告）
+            for key in TAB_WIDGET_KEYS.get(label, ()):
+                if key in st.session_state:
+                    st.session_state[key] = st.session_state[key]
+    return tabs
+
+def show_tab(label):
+    """切换到指定的标签页（用作按钮回调，在重跑之前生效）"""
+    st.session_state.main_tab = label
+
+# 初始化session state（公告、评论等数据在用到的地方才读取）
+if 'admin_logged_in' not in st.session_state:
+    st.session_state.admin_logged_in = False
 
 # 管理员登录函数
 def admin_login():
@@ -151,6 +246,7 @@ def admin_login():
             st.error("❌ 密码错误！")
 
 # 公告管理功能
+@perf.timed("section.announcement_management")
 def announcement_management():
     """公告管理界面"""
     st.markdown("### 📢 公告管理")
@@ -170,8 +266,9 @@ def announcement_management():
                         'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
                         'author': '管理员'
                     }
-                    st.session_state.shared_announcements.insert(0, new_announcement)
-                    if save_announcements(st.session_state.shared_announcements):
+                    announcements = update_announcements(lambda items: items.insert(0, new_announcement))
+                    if announcements is not None:
+                        st.session_state.shared_announcements = announcements
                         st.success("✅ 公告发布成功！")
                         st.rerun()
                     else:
@@ -189,23 +286,24 @@ def announcement_management():
     st.markdown("### 📋 现有公告")
     for i, announcement in enumerate(st.session_state.shared_announcements):
         with st.container():
-            st.markdown(f"""
-            <div style="background: #FFE4E1; padding: 1rem; border-radius: 10px; margin: 0.5rem 0; border-left: 5px solid #FF69B4;">
-                <h4 style="color: #FF1493; margin: 0;">{announcement['title']}</h4>
-                <p style="margin: 0.5rem 0; color: #333;">{announcement['content']}</p>
-                <small style="color: #666;">发布时间: {announcement['date']} | 作者: {announcement['author']}</small>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(cards.admin_announcement_card(announcement), unsafe_allow_html=True)
             
             if st.button(f"🗑️ 删除公告", key=f"delete_announcement_{i}"):
-                st.session_state.shared_announcements.pop(i)
-                if save_announcements(st.session_state.shared_announcements):
+                # 按内容删除：其他管理员可能已经增删过公告，序号不一定还对得上
+                def remove(items, target=announcement):
+                    if target in items:
+                        items.remove(target)
+                announcements = update_announcements(remove)
+                if announcements is not None:
+                    st.session_state.shared_announcements = announcements
                     st.success("✅ 公告删除成功！")
                     st.rerun()
                 else:
                     st.error("❌ 公告删除失败！")
 
 # 公告显示功能
+@fragment
+@perf.timed("section.display_announcements")
 def display_announcements():
     """显示公告板"""
     st.markdown("### 📢 软件公告板")
@@ -217,25 +315,18 @@ def display_announcements():
         st.info("🤔 暂时没有公告呢~")
         return
     
-    for announcement in st.session_state.shared_announcements:
-        st.markdown(f"""
-        <div style="background: linear-gradient(45deg, #FFFACD, #F0F8FF); padding: 1.5rem; border-radius: 15px; margin: 1rem 0; border: 3px solid #FF6B35; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-            <h3 style="color: #FF6B35; margin: 0; font-family: 'Comic Sans MS', cursive;">{announcement['title']}</h3>
-            <p style="margin: 1rem 0; color: #333; font-size: 1.1rem; line-height: 1.6;">{announcement['content']}</p>
-            <div style="text-align: right;">
-                <small style="color: #666; font-style: italic;">📅 {announcement['date']} | ✍️ {announcement['author']}</small>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    # 所有公告卡片拼成一段HTML，一次发送
+    st.markdown("".join(cards.announcement_card(announcement)
+                        for announcement in st.session_state.shared_announcements),
+                unsafe_allow_html=True)
 
 # 评论区功能（升级版 - 共享评论）
+@fragment
+@perf.timed("section.comment_section")
 def comment_section():
     """评论区功能 - 所有用户共享评论"""
     st.markdown("### 💬 用户评论区")
     
-    # 重新加载最新评论
-    st.session_state.shared_comments = load_comments()
-    
     # 显示共享提示
     st.info("🌟 **评论区已升级！** 现在所有用户都能看到彼此的评论了！快来互动吧！")
     
@@ -252,16 +343,9 @@ def comment_section():
             st.markdown("<br>", unsafe_allow_html=True)
             if st.button("🚀 发表评论", key="submit_comment", use_container_width=True):
                 if user_name and comment_text:
-                    new_comment = {
-                        'username': user_name,
-                        'content': comment_text,
-                        'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        'likes': 0
-                    }
-                    st.session_state.shared_comments.insert(0, new_comment)
-                    if save_comments(st.session_state.shared_comments):
+                    if add_comment(user_name, comment_text):
                         st.success("✅ 评论发表成功！所有用户都能看到你的评论了！")
-                        st.rerun()
+                        rerun_fragment()
                     else:
                         st.error("❌ 评论保存失败！")
                 else:
@@ -269,207 +353,173 @@ def comment_section():
     
     st.markdown("---")
     
-    # 显示评论
-    st.markdown(f"#### 💭 所有用户评论 ({len(st.session_state.shared_comments)})")
-    
-    if not st.session_state.shared_comments:
-        st.info("🤔 还没有评论，快来做第一个评论的人吧！")
-        return
+    # 实时模式下评论列表定时重跑，只在版本号变化时读取变更
+    if st.toggle("⚡ 实时更新（新评论自动出现）", value=True, key="comment_live"):
+        comment_board_live()
+    else:
+        comment_board_static()
+
+def apply_comment_changes(view, changes, first_page):
+    """把变更应用到已显示的一页上，返回 False 表示需要重新读取这一页。
+
+    按最新排序时，不在本页的变更只更新计数，本页评论的点赞数就地更新；
+    第一页的新评论、本页评论被删除、按点赞排序时的任何变化都会改变本页内容
+    """
+    page = {comment['id']: comment for comment in view['page']}
+    for change in changes:
+        if change['op'] == 'new':
+            if first_page or view['order'] == "likes":
+                return False
+            view['total'] += 1
+            view['unseen'] += 1
+        elif change['op'] == 'delete':
+            if change['id'] in page:
+                return False
+            view['total'] -= 1
+        elif view['order'] == "likes":
+            return False
+        elif change['id'] in page:
+            page[change['id']]['likes'] = change['likes']
+    return True
+
+def load_comment_view(order, cursors):
+    """返回当前页 {order, cursor, version, total, page, next_cursor, unseen}。
+
+    和上次显示的是同一页时先按版本号取变更：没有变化直接复用（不读取评论），
+    能就地应用的变更直接更新，其余情况才重新读取这一页
+    """
+    view = st.session_state.get('comment_view')
+    if view is not None and view['order'] == order and view['cursor'] == cursors[-1] \
+            and view['version'] is not None:
+        version, changes = comment_changes(view['version'])
+        if version == view['version']:
+            return view
+        if changes is not None and apply_comment_changes(view, changes, len(cursors) == 1):
+            view['version'] = version
+            return view
     
-    for i, comment in enumerate(st.session_state.shared_comments):
-        with st.container():
-            st.markdown(f"""
-            <div style="background: #F0F8FF; padding: 1rem; border-radius: 10px; margin: 0.8rem 0; border-left: 4px solid #4169E1;">
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.5rem;">
-                    <h5 style="color: #4169E1; margin: 0; font-family: 'Comic Sans MS', cursive;">👤 {comment['username']}</h5>
-                    <small style="color: #666;">🕒 {comment['date']}</small>
-                </div>
-                <p style="margin: 0.5rem 0; color: #333; line-height: 1.5;">{comment['content']}</p>
-                <div style="text-align: right; margin-top: 0.5rem;">
-                    <span style="color: #FF1493;">❤️ {comment['likes']} 个赞</span>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # 点赞按钮
-            col1, col2, col3 = st.columns([6, 1, 1])
-            with col2:
-                if st.button("👍", key=f"like_comment_{i}"):
-                    st.session_state.shared_comments[i]['likes'] += 1
-                    if save_comments(st.session_state.shared_comments):
-                        st.success("👍 点赞成功！")
-                        st.rerun()
+    # 先取版本号再读取，读取期间发生的变更下次还会取到
+    version = comment_version()
+    total, _ = comment_stats()
+    page, next_cursor = page_comments(order, cursors[-1])
+    if not page and len(cursors) > 1:
+        # 当前页的评论都被删除了，回到上一页
+        cursors.pop()
+        page, next_cursor = page_comments(order, cursors[-1])
+    unseen = view['unseen'] if view is not None and view['order'] == order and len(cursors) > 1 else 0
+    view = {'order': order, 'cursor': cursors[-1], 'version': version, 'total': total,
+            'page': page, 'next_cursor': next_cursor, 'unseen': unseen}
+    st.session_state.comment_view = view
+    return view
+
+def comment_item(comment):
+    """一条评论：卡片 + 点赞/删除按钮"""
+    with st.container():
+        st.markdown(cards.comment_card(comment), unsafe_allow_html=True)
+        
+        # 点赞按钮（按评论ID区分，不受其他用户插入新评论影响）
+        col1, col2, col3 = st.columns([6, 1, 1])
+        with col2:
+            if st.button("👍", key=f"like_comment_{comment['id']}"):
+                if like_comment(comment['id']):
+                    # 点赞稍后才写入，先在本会话显示的这一页上加一，写入后由变更同步为准确值
+                    comment['likes'] = comment.get('likes', 0) + 1
+                    st.success("👍 点赞成功！")
+                    rerun_fragment()
+                else:
+                    st.error("❌ 点赞失败！")
+        with col3:
+            # 管理员可以删除评论
+            if st.session_state.admin_logged_in:
+                if st.button("🗑️", key=f"delete_comment_{comment['id']}"):
+                    if delete_comment(comment['id']):
+                        st.success("✅ 评论删除成功！")
+                        rerun_fragment()
                     else:
-                        st.error("点赞失败！")
-            with col3:
-                # 管理员可以删除评论
-                if st.session_state.admin_logged_in:
-                    if st.button("🗑️", key=f"delete_comment_{i}"):
-                        st.session_state.shared_comments.pop(i)
-                        if save_comments(st.session_state.shared_comments):
-                            st.success("✅ 评论删除成功！")
-                            st.rerun()
-                        else:
-                            st.error("❌ 评论删除失败！")
+                        st.error("❌ 评论删除失败！")
 
-# 自定义CSS样式 - 海绵宝宝风格
-def load_css():
-    st.markdown("""
-    <style>
-    /* 主要背景 */
-    .main {
-        background: linear-gradient(135deg, #87CEEB 0%, #B0E0E6 50%, #87CEEB 100%);
-        background-image: 
-            radial-gradient(circle at 20% 20%, rgba(255, 255, 0, 0.1) 0%, transparent 50%),
-            radial-gradient(circle at 80% 80%, rgba(255, 182, 193, 0.1) 0%, transparent 50%),
-            radial-gradient(circle at 40% 40%, rgba(255, 255, 255, 0.1) 0%, transparent 50%);
-    }
-    
-    /* 标题样式 */
-    .title {
-        font-family: 'Comic Sans MS', cursive;
-        font-size: 3rem;
-        color: #FF6B35;
-        text-align: center;
-        text-shadow: 3px 3px 0px #FFD700, 6px 6px 0px #FF69B4;
-        margin-bottom: 2rem;
-        animation: bounce 2s infinite;
-    }
+@perf.timed("section.comment_board")
+def comment_board():
+    """评论列表（分页，每次只渲染一页）"""
+    # 排序方式，切换时回到第一页
+    order = st.session_state.get("comment_order", "newest")
+    if st.session_state.get('comment_page_order') != order:
+        st.session_state.comment_page_order = order
+        st.session_state.comment_cursors = [None]
     
-    @keyframes bounce {
-        0%, 20%, 50%, 80%, 100% {
-            transform: translateY(0);
-        }
-        40% {
-            transform: translateY(-10px);
-        }
-        60% {
-            transform: translateY(-5px);
-        }
-    }
+    # comment_cursors 保存每一页的起始游标，最后一个是当前页
+    cursors = st.session_state.comment_cursors
+    view = load_comment_view(order, cursors)
+    total_comments = view['total']
+    st.markdown(f"#### 💭 所有用户评论 ({total_comments})")
     
-    /* 侧边栏样式 */
-    .css-1d391kg {
-        background: linear-gradient(180deg, #FFE4B5 0%, #FFEFD5 100%);
-        border-right: 3px solid #FF6B35;
-    }
-    
-    /* 按钮样式 */
-    .stButton > button {
-        background: linear-gradient(45deg, #FF6B35, #FFD700);
-        color: white;
-        border: 3px solid #FF1493;
-        border-radius: 25px;
-        font-family: 'Comic Sans MS', cursive;
-        font-weight: bold;
-        font-size: 1.2rem;
-        padding: 10px 20px;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-    }
-    
-    .stButton > button:hover {
-        transform: scale(1.05);
-        box-shadow: 0 6px 12px rgba(0,0,0,0.3);
-    }
-    
-    /* 输入框样式 */
-    .stTextInput > div > div > input {
-        border: 3px solid #FF6B35;
-        border-radius: 15px;
-        padding: 10px;
-        font-family: 'Comic Sans MS', cursive;
-        background: #FFFACD;
-        color: #000000 !important;
-    }
-    
-    /* 文本域样式 */
-    .stTextArea > div > div > textarea {
-        border: 3px solid #FF6B35;
-        border-radius: 15px;
-        padding: 10px;
-        font-family: 'Comic Sans MS', cursive;
-        background: #FFFACD;
-        color: #000000 !important;
-    }
-    
-    /* 选择框样式 */
-    .stSelectbox > div > div > div {
-        border: 3px solid #FF6B35;
-        border-radius: 15px;
-        background: #FFFACD;
-        font-family: 'Comic Sans MS', cursive;
-        color: #000000 !important;
-    }
-    
-    /* 选择框选项样式 */
-    .stSelectbox > div > div > div > div {
-        color: #000000 !important;
-    }
-    
-    /* 强制所有输入元素文字为黑色 */
-    .stTextInput input, 
-    .stSelectbox select,
-    .stSelectbox div[data-baseweb="select"] > div,
-    .stSelectbox div[data-baseweb="select"] span {
-        color: #000000 !important;
-    }
-    
-    /* 视频容器样式 */
-    .video-container {
-        border: 5px solid #FF6B35;
-        border-radius: 20px;
-        padding: 20px;
-        background: linear-gradient(45deg, #FFFACD, #F0F8FF);
-        box-shadow: 0 8px 16px rgba(0,0,0,0.2);
-        margin: 20px 0;
-    }
-    
-    /* 装饰性元素 */
-    .decoration {
-        font-size: 2rem;
-        animation: float 3s ease-in-out infinite;
-    }
-    
-    @keyframes float {
-        0% { transform: translateY(0px); }
-        50% { transform: translateY(-10px); }
-        100% { transform: translateY(0px); }
-    }
-    
-    /* 置顶公告发光效果 */
-    @keyframes glow {
-        0% { box-shadow: 0 4px 8px rgba(255,20,147,0.3); }
-        100% { box-shadow: 0 6px 16px rgba(255,20,147,0.6); }
-    }
+    if not total_comments:
+        st.info("🤔 还没有评论，快来做第一个评论的人吧！")
+        return
     
-    /* 提示框样式 */
-    .stAlert {
-        border-radius: 15px;
-        border: 2px solid #FF6B35;
-        font-family: 'Comic Sans MS', cursive;
-    }
+    # 搜索：关键词（中文、英文都可以）和昵称，任一项不为空时显示搜索结果
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("🔍 搜索评论", placeholder="输入关键词，例如：海绵宝宝", key="comment_search")
+    with col2:
+        username = st.text_input("👤 只看昵称", placeholder="完整昵称", key="comment_search_user")
+    if query.strip() or username.strip():
+        results, total = search_comments(query, username)
+        if not total:
+            st.info("🤷 没有找到相关评论，换个关键词试试吧！")
+            return
+        shown = f"，显示最相关的 {len(results)} 条" if total > len(results) else ""
+        st.markdown(f"**🔍 找到 {total} 条相关评论{shown}**")
+        for comment in results:
+            comment_item(comment)
+        return
     
-    /* 标签页样式 */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-    }
+    st.radio(
+        "排序方式：",
+        list(COMMENT_ORDER_LABELS.keys()),
+        format_func=lambda key: COMMENT_ORDER_LABELS[key],
+        horizontal=True,
+        key="comment_order"
+    )
+    if view['unseen']:
+        st.info(f"🆕 有 {view['unseen']} 条新评论，回到第一页查看")
     
-    .stTabs [data-baseweb="tab"] {
-        background-color: #FFE4B5;
-        border-radius: 15px;
-        color: #FF6B35;
-        font-family: 'Comic Sans MS', cursive;
-        font-weight: bold;
-        border: 2px solid #FF6B35;
-    }
+    for comment in view['page']:
+        comment_item(comment)
     
-    .stTabs [aria-selected="true"] {
-        background-color: #FF6B35;
-        color: white;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    # 翻页
+    total_pages = (total_comments + COMMENTS_PAGE_SIZE - 1) // COMMENTS_PAGE_SIZE
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if len(cursors) > 1 and st.button("⬅️ 上一页", key="comment_prev_page", use_container_width=True):
+            cursors.pop()
+            rerun_fragment()
+    with col2:
+        st.markdown(f"<p style='text-align: center; color: #666;'>第 {len(cursors)} / {total_pages} 页</p>", unsafe_allow_html=True)
+    with col3:
+        if view['next_cursor'] is not None and st.button("下一页 ➡️", key="comment_next_page", use_container_width=True):
+            cursors.append(view['next_cursor'])
+            rerun_fragment()
+
+# 评论列表的两种运行方式：实时模式每隔几秒重跑一次，否则只在操作时重跑
+@fragment(run_every=COMMENT_REFRESH_SECONDS)
+def comment_board_live():
+    comment_board()
+
+@fragment
+def comment_board_static():
+    comment_board()
+
+# 自定义CSS样式 - 海绵宝宝风格
+@perf.timed("section.load_css")
+def load_css():
+    # 样式表作为静态文件由浏览器缓存，每次重跑只发送一行 @import（见 cards.py）
+    html = cards.stylesheet_html(st.get_option("server.enableStaticServing"))
+    if hasattr(st, "html"):
+        st.html(html)
+    else:
+        # 旧版本 Streamlit 没有 st.html
+        st.markdown(html, unsafe_allow_html=True)
 
 # 解析器配置
 PARSERS = {
@@ -500,6 +550,9 @@ PARSERS = {
   "1907解析": "https://im1907.top/?jx="
 }
 
+# 自动模式：竞速选出可用的解析器
+AUTO_PARSER = "🤖 自动选择（智能切换线路）"
+
 # 视频平台配置
 VIDEO_PLATFORMS = {
     "🎬 腾讯视频": "https://v.qq.com",
@@ -512,7 +565,44 @@ VIDEO_PLATFORMS = {
     "🌟 搜狐视频": "https://tv.sohu.com"
 }
 
+# 各平台的预设推荐线路（原来写在小贴士里的经验），真实播放数据积累后以数据为准
+PLATFORM_PARSER_PRIORS = {
+    "🎬 腾讯视频": "🍍 默认解析器（优酷专项）",
+    "🎞️ 优酷": "🍍 默认解析器（优酷专项）",
+    "📱 哔哩哔哩": "🧽 新海绵解析器（其他视频专项）",
+    "📺 爱奇艺": "🧽 新海绵解析器（其他视频专项）"
+}
+
+# 平台域名 -> 平台名称
+PLATFORM_LOOKUP = play_stats.platform_lookup(VIDEO_PLATFORMS)
+
+# 获取播放结果统计（进程内共享）
+def get_play_stats():
+    """获取按 (平台, 解析器) 累计的播放成功率统计"""
+    return play_stats.open_stats(PLAY_STATS_FILE, PLATFORM_PARSER_PRIORS)
+
+# 只在播放时用到的模块（服务器端解析直链、HLS 中继），页面第一次显示时不导入，由预热线程提前导入
+WARMUP_IMPORTS = ("requests", "stream_resolver", "hls_relay")
+
+def import_deferred_modules():
+    for name in WARMUP_IMPORTS:
+        importlib.import_module(name)
+
+# 进程预热任务（在后台线程中执行，见 warmup.py）
+def warmup_tasks():
+    """返回 (名称, 函数) 列表；任务直接调用存储后端，不调用 st 的函数"""
+    backend = get_storage()
+    return [
+        ("imports", import_deferred_modules),
+        ("announcements", backend.announcement_cache.get),
+        ("comments", lambda: backend.page_comments("newest", COMMENTS_PAGE_SIZE)),
+        ("search_index", backend.search_index.refresh),
+        ("play_stats", lambda: get_play_stats().snapshot()),
+    ]
+
 # 内置浏览器功能
+@fragment
+@perf.timed("section.built_in_browser")
 def built_in_browser():
     """内置浏览器功能"""
     st.markdown("### 🌐 内置浏览器 - 一站式搜索")
@@ -533,6 +623,7 @@ def built_in_browser():
         selected_platform = st.selectbox(
             "🎯 选择视频平台",
             list(VIDEO_PLATFORMS.keys()),
+            key="browser_platform",
             help="选择你想要搜索视频的平台"
         )
         
@@ -612,13 +703,13 @@ def built_in_browser():
         
         with browser_col3:
             if st.button("🏠 回主页", key="browser_home"):
-                st.rerun()
+                rerun_fragment()
         
         with browser_col4:
             if st.button("❌ 关闭", key="browser_close"):
                 st.session_state.browser_opened = False
                 st.success("👋 浏览器已关闭")
-                st.rerun()
+                rerun_fragment()
         
         # 快速平台切换
         st.markdown("#### 🚀 快速平台切换")
@@ -631,7 +722,7 @@ def built_in_browser():
                     st.session_state.current_platform = platform_name
                     st.session_state.current_browser_url = platform_url_quick
                     st.success(f"🎯 已切换到 {platform_name}")
-                    st.rerun()
+                    rerun_fragment()
         
         if len(platform_items) > 4:
             platform_cols2 = st.columns(4)
@@ -641,7 +732,7 @@ def built_in_browser():
                         st.session_state.current_platform = platform_name
                         st.session_state.current_browser_url = platform_url_quick
                         st.success(f"🎯 已切换到 {platform_name}")
-                        st.rerun()
+                        rerun_fragment()
         
         # 真实浏览器内容区域
         st.markdown("#### 🌐 真实浏览器内容")
@@ -767,6 +858,8 @@ def built_in_browser():
                     st.success("✅ 链接已提取！请到下方选择解析器进行播放！")
                     # 通过session state传递URL到主播放功能
                     st.session_state.auto_fill_url = extracted_url
+                    # 侧边栏不在浏览器片段内，需要整页重跑才能填入链接
+                    st.rerun()
                 else:
                     st.error("❌ 请先输入视频链接！")
         
@@ -830,22 +923,177 @@ def built_in_browser():
         - 建议复制完整的URL，包含所有参数
         """)
 
+# 播放器区域
+@perf.timed("section.render_player")
+def render_player(full_url, stream=None):
+    """用iframe嵌入解析播放器；有服务器端解析出的直链时直接播放直链"""
+    st.markdown('<div class="video-container">', unsafe_allow_html=True)
+    
+    if stream is not None and stream['kind'] == 'hls':
+        stream_url = stream['url']
+        if st.session_state.get('hls_relay'):
+            # 经本机中继播放：分片在服务器上缓存，看同一集的观众共用（用到时才导入，见 WARMUP_IMPORTS）
+            import hls_relay
+            relay = hls_relay.ensure_relay()
+            host = st.context.headers.get("Host") if hasattr(st, "context") else None
+            stream_url = relay.playlist_url(stream_url, hls_relay.public_base_url(host, relay.port))
+        if hasattr(st, "iframe"):
+            st.iframe(cards.hls_player(stream_url), height=600)
+        else:
+            # 旧版本 Streamlit 没有 st.iframe
+            import streamlit.components.v1 as components
+            components.html(cards.hls_player(stream_url), height=600)
+    elif stream is not None:
+        st.video(stream['url'])
+    else:
+        # 使用iframe嵌入播放器
+        st.markdown(f"""
+        <iframe src="{full_url}" 
+                width="100%" 
+                height="600" 
+                frameborder="0" 
+                allowfullscreen="true"
+                style="border-radius: 15px;">
+        </iframe>
+        """, unsafe_allow_html=True)
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def resolve_stream(video_url, parser_url):
+    """开启服务器端解析时找出直链（按视频和线路缓存）；没开启或找不到直链时返回None"""
+    if not st.session_state.get('server_resolve'):
+        return None
+    import stream_resolver
+    with st.spinner("🎯 正在服务器端解析直链..."), perf.section("stream.resolve"):
+        stream, cached = stream_resolver.get_resolver().resolve(video_url, parser_url)
+    if stream is None:
+        st.caption("🎯 没有解析出直链，使用解析页面播放")
+    elif cached:
+        st.caption(f"⚡ 使用缓存的{'m3u8' if stream['kind'] == 'hls' else 'mp4'}直链播放")
+    else:
+        st.caption(f"🎯 已解析出{'m3u8' if stream['kind'] == 'hls' else 'mp4'}直链，直接播放")
+    return stream
+
+# 生成播放队列
+def build_playlist(urls, selected_parser):
+    """批量标准化链接并为每个链接选好解析器，返回播放队列"""
+    normalized = url_rules.normalize_many(urls)
+    processed_urls = [processed_url for processed_url, _ in normalized]
+    health = parser_health.registry
+    if selected_parser == AUTO_PARSER:
+        # 同一网站只竞速一次，不同网站并发竞速
+        parser_names = parser_health.resolve_many(PARSERS, processed_urls, health, parser_health.winners)
+        fallback = health.rank_parsers(PARSERS)[0]
+        parser_names = [name or fallback for name in parser_names]
+    else:
+        parser_names = [selected_parser] * len(urls)
+    
+    playlist = []
+    for url, (processed_url, conversion_msg), parser_name in zip(urls, normalized, parser_names):
+        _, _, full_url = url_rules.build_play_url(url, PARSERS[parser_name])
+        playlist.append({
+            'url': url,
+            'processed_url': processed_url,
+            'conversion_msg': conversion_msg,
+            'parser': parser_name,
+            'full_url': full_url
+        })
+    return playlist
+
+# 播放队列
+@fragment
+@perf.timed("section.playlist_player")
+def playlist_player():
+    """按顺序播放队列中的视频，可以上一集/下一集切换"""
+    playlist = st.session_state.playlist
+    index = min(st.session_state.get('playlist_index', 0), len(playlist) - 1)
+    item = playlist[index]
+    
+    st.markdown(f"### 📃 播放队列 · 第 {index + 1} / {len(playlist)} 集")
+    if item['conversion_msg']:
+        st.info(item['conversion_msg'])
+    st.success(f"🎉 正在使用 {item['parser']} 播放队列中的第 {index + 1} 个视频！")
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if index > 0 and st.button("⏮️ 上一集", key="playlist_prev", use_container_width=True):
+            st.session_state.playlist_index = index - 1
+            rerun_fragment()
+    with col2:
+        st.markdown(f"<p style='text-align: center; color: #666; word-break: break-all;'>{item['processed_url']}</p>", unsafe_allow_html=True)
+    with col3:
+        if index < len(playlist) - 1 and st.button("下一集 ⏭️", key="playlist_next", use_container_width=True):
+            st.session_state.playlist_index = index + 1
+            rerun_fragment()
+    
+    render_player(item['full_url'], resolve_stream(item['url'], PARSERS[item['parser']]))
+    
+    # 队列列表，点击直接跳转
+    with st.expander(f"📋 全部队列（{len(playlist)} 个视频）"):
+        for i, entry in enumerate(playlist):
+            col1, col2 = st.columns([6, 1])
+            with col1:
+                marker = "▶️ " if i == index else ""
+                st.markdown(f"{marker}**{i + 1}.** `{entry['processed_url']}` · {entry['parser']}")
+            with col2:
+                if i != index and st.button("播放", key=f"playlist_goto_{i}"):
+                    st.session_state.playlist_index = i
+                    rerun_fragment()
+
+# 性能监控面板（仅管理员可见）
+def performance_panel():
+    """显示页面各部分和存储调用的耗时分布，所有会话共同汇总"""
+    st.markdown("---")
+    st.markdown("### ⏱️ 性能监控")
+    enabled = st.toggle("开启计时", value=perf.is_enabled(), key="perf_enabled",
+                        help="开启后记录每次页面刷新中各部分和存储调用的耗时，关闭时几乎没有额外开销")
+    if enabled != perf.is_enabled():
+        perf.enable() if enabled else perf.disable()
+    
+    rows = perf.snapshot()
+    if not rows:
+        st.info("还没有计时数据，开启计时后刷新几次页面再来看看吧！")
+        return
+    table = [{
+        '名称': row['name'],
+        '次数': row['count'],
+        '平均(ms)': round(row['mean'] * 1000, 2),
+        'p50(ms)': round(row['p50'] * 1000, 2),
+        'p95(ms)': round(row['p95'] * 1000, 2),
+        'p99(ms)': round(row['p99'] * 1000, 2),
+        '最大(ms)': round(row['max'] * 1000, 2)
+    } for row in rows]
+    try:
+        st.dataframe(table, width="stretch", hide_index=True)
+    except TypeError:
+        # 旧版本 Streamlit 的 width 只接受像素数
+        st.dataframe(table, use_container_width=True, hide_index=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📥 导出 JSON Lines", perf.export_jsonl(), file_name="perf.jsonl",
+                           mime="application/x-ndjson", key="perf_export", use_container_width=True)
+    with col2:
+        if st.button("🧹 清空计时数据", key="perf_reset", use_container_width=True):
+            perf.reset()
+            st.rerun()
+
+@perf.timed("rerun")
 def main():
     load_css()
     
     # 主标题
-    st.markdown('<div class="title">🍍 海绵宝宝的神奇视频播放器 🧽</div>', unsafe_allow_html=True)
+    st.markdown(cards.TITLE, unsafe_allow_html=True)
     
     # 装饰性元素
     col1, col2, col3 = st.columns([1, 2, 1])
     with col1:
-        st.markdown('<div class="decoration">🐠</div>', unsafe_allow_html=True)
+        st.markdown(cards.DECORATION_LEFT, unsafe_allow_html=True)
     with col3:
-        st.markdown('<div class="decoration">🪸</div>', unsafe_allow_html=True)
+        st.markdown(cards.DECORATION_RIGHT, unsafe_allow_html=True)
     
     # 置顶公告区域
     st.markdown("---")
-    with st.container():
+    with st.container(), perf.section("section.pinned_announcements"):
         st.markdown("### 📢 置顶公告")
         
         # 重新加载最新公告
@@ -854,19 +1102,7 @@ def main():
         # 显示最新的2条公告作为置顶
         if st.session_state.shared_announcements:
             for i, announcement in enumerate(st.session_state.shared_announcements[:2]):  # 只显示最新的2条
-                st.markdown(f"""
-                <div style="background: linear-gradient(45deg, #FFE4E1, #FFF0F5); padding: 1rem; border-radius: 15px; margin: 0.5rem 0; border: 3px solid #FF1493; box-shadow: 0 4px 8px rgba(255,20,147,0.3); animation: glow 2s infinite alternate;">
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <h4 style="color: #FF1493; margin: 0; font-family: 'Comic Sans MS', cursive; text-shadow: 1px 1px 2px rgba(0,0,0,0.1);">🔥 {announcement['title']}</h4>
-                        <span style="background: #FF1493; color: white; padding: 0.2rem 0.8rem; border-radius: 20px; font-size: 0.8rem; font-weight: bold;">置顶</span>
-                    </div>
-                    <p style="margin: 0.8rem 0; color: #333; font-size: 1rem; line-height: 1.5;">{announcement['content'][:100]}{'...' if len(announcement['content']) > 100 else ''}</p>
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <small style="color: #666; font-style: italic;">📅 {announcement['date']} | ✍️ {announcement['author']}</small>
-                        <small style="color: #FF1493; cursor: pointer;">📢 点击公告板查看详情</small>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(cards.pinned_announcement_card(announcement), unsafe_allow_html=True)
         else:
             st.info("🤔 暂时没有置顶公告，管理员可以在管理中心添加公告哦！")
         
@@ -879,26 +1115,24 @@ def main():
     st.markdown("---")
     
     # 创建标签页
-    tab1, tab2, tab3, tab4 = st.tabs(["🎬 视频播放", "📢 公告板", "💬 评论区", "🔧 管理中心"])
+    tab1, tab2, tab3, tab4 = main_tabs()
     
     # 视频播放标签页
     with tab1:
         # 首先添加内置浏览器功能
-        built_in_browser()
-        
-        st.markdown("---")
+        if tab_opened(tab1):
+            built_in_browser()
+            
+            st.markdown("---")
         
         # 侧边栏
-        with st.sidebar:
+        with st.sidebar, perf.section("section.sidebar"):
             st.markdown("### 🏠 比奇堡控制中心")
             st.markdown("---")
             
-            # 选择解析器
-            selected_parser = st.selectbox(
-                "🔧 选择你的解析器",
-                list(PARSERS.keys()),
-                help="不同的解析器可能对不同的视频网站有更好的支持哦！"
-            )
+            # 后台健康检测（每个进程只启动一次，页面只读取检测结果）
+            prober = probe_scheduler.ensure_scheduler(PARSERS)
+            health = parser_health.registry
             
             # 检查是否有从内置浏览器传来的URL
             auto_fill_url = ""
@@ -925,8 +1159,80 @@ def main():
                 st.session_state.auto_fill_url = ""
                 st.rerun()
             
+            # 选择解析器：识别出视频平台时按该平台上的播放成功率排序，否则按实时健康状况排序
+            stats = get_play_stats()
+            play_stats.settle_play(st.session_state, stats)
+            platform = play_stats.detect_platform(video_url, PLATFORM_LOOKUP) if video_url else None
+            if platform:
+                ranked_parsers = stats.rank(platform, PARSERS, health)
+            else:
+                ranked_parsers = health.rank_parsers(PARSERS)
+            selected_parser = st.selectbox(
+                "🔧 选择你的解析器",
+                [AUTO_PARSER] + ranked_parsers,
+                key="selected_parser",
+                help="不同的解析器可能对不同的视频网站有更好的支持哦！输入链接后，列表按这个网站上大家的播放成功率排序，失效的线路排在最后"
+            )
+            if platform:
+                st.caption(f"📊 已按 {platform} 上的播放成功率排序")
+            
+            # 解析器健康概况（健康标记不放进选项文字里，否则标记变化会让选择被重置）
+            if selected_parser != AUTO_PARSER:
+                st.caption(f"当前线路状态：{health.badge(PARSERS[selected_parser])}（🟢 可用 🟡 较慢 🟠 异常 🔴 失效 ⚪ 检测中）")
+            records = health.snapshot()
+            healthy_count = sum(1 for record in records.values() if record['ok'])
+            if records:
+                st.caption(f"🩺 解析器健康：{healthy_count}/{len(records)} 个线路可用")
+            else:
+                st.caption("🩺 正在检测解析器线路...")
+            if st.button("🔄 重新检测线路", key="reprobe_parsers", use_container_width=True):
+                prober.probe_now()
+                st.info("🩺 已开始重新检测，稍后刷新即可看到最新状态！")
+            
+            st.toggle(
+                "🎯 服务器端解析直链",
+                value=False,
+                key="server_resolve",
+                help="由服务器打开解析页面找出 m3u8/mp4 直链直接播放（没有解析页面的广告和跳转，同一集再次播放直接用缓存）；找不到直链时仍用解析页面播放，直链无法播放时关掉这个开关即可"
+            )
+            if st.session_state.get('server_resolve'):
+                st.toggle(
+                    "📡 经本机中继播放（HLS）",
+                    value=False,
+                    key="hls_relay",
+                    help="m3u8 直链的分片由服务器下载并缓存在磁盘上，看同一集的观众共用，起播更快、卡顿更少；上游限制来源时可能无法播放"
+                )
+            
             # 播放按钮
-            play_button = st.button("🚀 开始播放", use_container_width=True)
+            play_button = st.button("🚀 开始播放", use_container_width=True, on_click=show_tab, args=(MAIN_TABS[0],))
+            
+            # 批量播放列表
+            with st.expander("📃 批量播放列表（追剧模式）"):
+                playlist_text = st.text_area(
+                    "每行一个视频链接：",
+                    placeholder="https://v.qq.com/x/cover/...\nhttps://www.iqiyi.com/v_...",
+                    height=120,
+                    key="playlist_text"
+                )
+                playlist_file = st.file_uploader("或者上传链接列表文件", type=["txt", "m3u"], key="playlist_file")
+                if st.button("📥 生成播放队列", key="build_playlist", use_container_width=True,
+                             on_click=show_tab, args=(MAIN_TABS[0],)):
+                    text = playlist_text or ""
+                    if playlist_file is not None:
+                        text += "\n" + playlist_file.getvalue().decode("utf-8", errors="ignore")
+                    urls = url_rules.parse_url_list(text)
+                    if urls:
+                        with st.spinner(f"🚀 正在批量解析 {len(urls)} 个链接..."):
+                            st.session_state.playlist = build_playlist(urls, selected_parser)
+                        st.session_state.playlist_index = 0
+                        st.success(f"✅ 已生成 {len(urls)} 个视频的播放队列！")
+                    else:
+                        st.error("请先粘贴或上传视频链接！")
+                if st.session_state.get('playlist'):
+                    if st.button("🗑️ 清空队列", key="clear_playlist", use_container_width=True):
+                        st.session_state.playlist = []
+                        st.session_state.playlist_index = 0
+                        st.rerun()
             
             st.markdown("---")
             
@@ -942,18 +1248,32 @@ def main():
                 
                 **传统方式：**
                 1. 📝 直接在左侧输入你想播放的视频链接
-                2. 🔧 选择一个解析器（建议先试试默认的）
+                2. 🔧 选择一个解析器（建议先试试排在最前面的）
                 3. 🚀 点击"开始播放"按钮
                 4. 🍿 享受你的视频时光！
                 
+                **追剧模式：**
+                1. 📃 在"批量播放列表"里粘贴多条链接（或上传txt文件）
+                2. 📥 点击"生成播放队列"，所有链接一次性解析好
+                3. ⏭️ 用"上一集/下一集"直接切换，不用再重新输入链接
+                
                 **小贴士：**
                 - 🎬 支持腾讯视频、爱奇艺、优酷、B站、芒果TV等
                 - 📱 自动转换移动版链接为PC版
                 - 🔄 如果一个解析器不work，试试另一个！
-                - 🍍 优酷、腾讯视频推荐"默认解析器"！
-                - 🧽 B站、爱奇艺推荐"新海绵解析器"！
+                - 🤖 选择"自动选择"会同时预检多条线路，自动用最快的那条！
+                - 📊 输入链接后，解析器列表会按这个网站上大家的播放成功率排序！
                 - 🌐 内置浏览器让搜索更便捷！
                 """)
+                # 各平台目前成功率最高的线路（根据真实播放结果统计）
+                best_lines = []
+                for platform_name in VIDEO_PLATFORMS:
+                    best = stats.best(platform_name, PARSERS)
+                    if best:
+                        rate = stats.success_rate(platform_name, best)
+                        best_lines.append(f"- {platform_name}：{best}（成功率约 {rate:.0%}）")
+                if best_lines:
+                    st.markdown("**📊 各平台推荐线路：**\n" + "\n".join(best_lines))
             
             # 支持的网站
             with st.expander("🌐 支持的网站"):
@@ -977,6 +1297,7 @@ def main():
                 **智能功能：**
                 - 🔄 自动转换移动版为PC版
                 - 🎯 腾讯视频vid参数提取
+                - 📺 芒果TV、咪咕、CCTV、搜狐移动版链接转换
                 - 🛠️ 链接格式标准化
                 - ✨ 浏览器链接自动填充
                 """)
@@ -1001,144 +1322,198 @@ def main():
                 本播放器仅用于学习交流，请支持正版内容！
                 """)
         
-        # 主内容区域
-        if play_button and video_url:
-            # 处理视频链接
-            processed_url, conversion_msg = process_video_url(video_url)
+        # 主内容区域（切换到其他标签页时不运行）
+        if tab_opened(tab1):
+            if play_button and video_url:
+                # 处理视频链接（结果按原始链接缓存）
+                processed_url, conversion_msg, _ = url_rules.build_play_url(video_url)
             
-            # 显示转换信息
-            if conversion_msg:
-                st.info(conversion_msg)
+                # 显示转换信息
+                if conversion_msg:
+                    st.info(conversion_msg)
             
-            parser_url = PARSERS[selected_parser]
-            full_url = f"{parser_url}{quote(processed_url)}"
+                # 自动模式：并发预检排名靠前的解析器，选出最先成功的线路
+                if selected_parser == AUTO_PARSER:
+                    with st.spinner("🤖 正在为你挑选最快的解析线路..."), perf.section("parser.resolve"):
+                        selected_parser, from_memory = parser_health.resolve_parser(
+                            PARSERS, processed_url, health, parser_health.winners
+                        )
+                    if selected_parser is None:
+                        selected_parser = health.rank_parsers(PARSERS)[0]
+                        st.warning(f"⚠️ 所有线路预检都没有响应，先试试 {selected_parser} 吧！")
+                    elif from_memory:
+                        st.info(f"🧠 这个网站上次用 {selected_parser} 播放成功，直接为你选用！")
+                    else:
+                        st.info(f"🏁 线路竞速完成，{selected_parser} 最先响应！")
             
-            # 显示播放信息
-            st.success(f"🎉 太好了！正在使用 {selected_parser} 播放你的视频！")
+                _, _, full_url = url_rules.build_play_url(video_url, PARSERS[selected_parser])
             
-            # 视频播放区域
-            st.markdown('<div class="video-container">', unsafe_allow_html=True)
+                # 登记这次播放；短时间内换线路重播同一个视频时，上一条线路记为失败
+                play_stats.record_play(
+                    st.session_state, stats,
+                    play_stats.detect_platform(processed_url, PLATFORM_LOOKUP), selected_parser, processed_url
+                )
             
-            # 使用iframe嵌入播放器
-            st.markdown(f"""
-            <iframe src="{full_url}" 
-                    width="100%" 
-                    height="600" 
-                    frameborder="0" 
-                    allowfullscreen="true"
-                    style="border-radius: 15px;">
-            </iframe>
-            """, unsafe_allow_html=True)
+                # 显示播放信息
+                st.success(f"🎉 太好了！正在使用 {selected_parser} 播放你的视频！")
             
-            st.markdown('</div>', unsafe_allow_html=True)
+                # 视频播放区域
+                render_player(full_url, resolve_stream(video_url, PARSERS[selected_parser]))
             
-            # 显示解析链接（调试用）
-            with st.expander("🔍 解析链接（调试信息）"):
-                st.markdown("**原始链接：**")
-                st.code(video_url)
-                if processed_url != video_url:
-                    st.markdown("**处理后链接：**")
-                    st.code(processed_url)
-                st.markdown("**最终解析链接：**")
-                st.code(full_url)
+                # 显示解析链接（调试用）
+                with st.expander("🔍 解析链接（调试信息）"):
+                    st.markdown("**原始链接：**")
+                    st.code(video_url)
+                    if processed_url != video_url:
+                        st.markdown("**处理后链接：**")
+                        st.code(processed_url)
+                    st.markdown("**最终解析链接：**")
+                    st.code(full_url)
         
-        elif play_button and not video_url:
-            st.error("🤔 哎呀！海绵宝宝说你忘记输入视频链接了！")
+            elif play_button and not video_url:
+                st.error("🤔 哎呀！海绵宝宝说你忘记输入视频链接了！")
         
-        elif not video_url:
-            # 欢迎界面
-            st.markdown("""
-            <div style="text-align: center; padding: 2rem; background: linear-gradient(45deg, #FFFACD, #F0F8FF); border-radius: 20px; margin: 2rem 0; border: 3px solid #FF6B35;">
-                <h2 style="color: #FF6B35; font-family: 'Comic Sans MS', cursive;">🌊 欢迎来到比奇堡的视频播放器！</h2>
-                <p style="font-size: 1.2rem; color: #4169E1; font-family: 'Comic Sans MS', cursive;">
-                    我是海绵宝宝！我准备好了！🧽✨
-                </p>
-                <p style="color: #FF1493; font-family: 'Comic Sans MS', cursive;">
-                    在左边的控制中心输入视频链接，然后点击播放按钮就可以开始观看啦！
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # 功能展示
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.markdown("""
-                <div style="background: #FFE4E1; padding: 1rem; border-radius: 15px; text-align: center; border: 2px solid #FF69B4;">
-                    <h3 style="color: #FF1493;">🔧 多核解析</h3>
-                    <p>18个精选稳定解析器！</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown("""
-                <div style="background: #E0FFFF; padding: 1rem; border-radius: 15px; text-align: center; border: 2px solid #00CED1;">
-                    <h3 style="color: #008B8B;">🌐 内置浏览器</h3>
-                    <p>一站式搜索播放体验！</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown("""
-                <div style="background: #FFFACD; padding: 1rem; border-radius: 15px; text-align: center; border: 2px solid #FFD700;">
-                    <h3 style="color: #FF8C00;">🚀 智能解析</h3>
-                    <p>自动处理各种链接格式！</p>
-                </div>
-                """, unsafe_allow_html=True)
+            elif st.session_state.get('playlist'):
+                playlist_player()
+        
+            elif not video_url:
+                # 欢迎界面
+                st.markdown(cards.WELCOME_BANNER, unsafe_allow_html=True)
             
-            with col4:
-                st.markdown("""
-                <div style="background: #F0E68C; padding: 1rem; border-radius: 15px; text-align: center; border: 2px solid #DAA520;">
-                    <h3 style="color: #B8860B;">💬 互动社区</h3>
-                    <p>公告板和评论区等你！</p>
-                </div>
-                """, unsafe_allow_html=True)
+                # 功能展示
+                for column, tile in zip(st.columns(4), cards.FEATURE_TILES):
+                    with column:
+                        st.markdown(tile, unsafe_allow_html=True)
     
     # 公告板标签页
     with tab2:
-        display_announcements()
+        if tab_opened(tab2):
+            display_announcements()
     
     # 评论区标签页
     with tab3:
-        comment_section()
+        if tab_opened(tab3):
+            comment_section()
     
     # 管理中心标签页
     with tab4:
-        st.markdown("### 🔧 管理中心")
+        if tab_opened(tab4):
+            st.markdown("### 🔧 管理中心")
         
-        if not st.session_state.admin_logged_in:
-            admin_login()
-        else:
-            st.success("🎉 欢迎管理员！你现在可以管理公告和评论了。")
-            announcement_management()
+            if not st.session_state.admin_logged_in:
+                admin_login()
+            else:
+                st.success("🎉 欢迎管理员！你现在可以管理公告和评论了。")
+                announcement_management()
             
-            st.markdown("---")
-            st.markdown("### 📊 统计信息")
-            col1, col2, col3 = st.columns(3)
+                st.markdown("---")
+                st.markdown("### 📊 统计信息")
+                col1, col2, col3 = st.columns(3)
             
-            with col1:
-                st.metric("📢 公告数量", len(st.session_state.shared_announcements))
+                with col1:
+                    st.metric("📢 公告数量", len(st.session_state.shared_announcements))
             
-            with col2:
-                st.metric("💬 评论数量", len(st.session_state.shared_comments))
+                total_comments, total_likes = comment_stats()
+                with col2:
+                    st.metric("💬 评论数量", total_comments)
+            
+                with col3:
+                    st.metric("❤️ 总点赞数", total_likes)
+            
+                # 公告缓存命中情况（所有会话共享）
+                cache_stats = get_storage().announcement_cache.stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("📦 公告缓存命中", cache_stats['hits'])
+                with col2:
+                    st.metric("💾 公告缓存未命中", cache_stats['misses'])
+                with col3:
+                    st.metric("🎯 缓存命中率", f"{cache_stats['hit_ratio']:.1%}")
+            
+                # 数据文件监视（其他服务进程写入后通知本进程）
+                watch_stats = data_watcher.get_watcher().stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("🔔 数据监视方式", watch_stats['mode'])
+                with col2:
+                    st.metric("📨 收到的改动通知", watch_stats['notifications'])
+                with col3:
+                    st.metric("👀 监视的文件", watch_stats['files'])
+
+                # 进程预热（第一个会话显示完后在后台执行，见 warmup.py）
+                warm = warmup.current_warmup()
+                if warm is not None:
+                    warm_stats = warm.stats()
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("🔥 预热状态", "已完成" if warm_stats['done'] else "进行中")
+                    with col2:
+                        st.metric("⏱️ 预热耗时", f"{warm_stats['seconds'] * 1000:.0f} ms")
+                    with col3:
+                        st.metric("⚠️ 预热失败", len(warm_stats['errors']))
+            
+                # 播放链接缓存（标准化 + 拼接解析链接）
+                url_stats = url_rules.play_url_cache.stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("🔗 链接缓存条目", f"{url_stats['size']}/{url_stats['maxsize']}")
+                with col2:
+                    st.metric("⚡ 链接缓存命中", url_stats['hits'])
+                with col3:
+                    st.metric("🎯 链接缓存命中率", f"{url_stats['hit_ratio']:.1%}")
+            
+                # 卡片HTML缓存（内容没变的评论、公告直接复用）
+                card_stats = cards.cache_stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("🧩 卡片缓存条目", card_stats['size'])
+                with col2:
+                    st.metric("⚡ 卡片缓存命中", card_stats['hits'])
+                with col3:
+                    st.metric("🎯 卡片缓存命中率", f"{card_stats['hit_ratio']:.1%}")
+            
+                # 点赞合并写入（多次点击合并成一次写盘）
+                like_stats = get_storage().like_batcher.stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("👍 点赞次数", like_stats['clicks'])
+                with col2:
+                    st.metric("💾 点赞写入次数", like_stats['flushes'])
+                with col3:
+                    st.metric("⏳ 待写入点赞", like_stats['pending'])
             
-            with col3:
-                total_likes = sum(comment['likes'] for comment in st.session_state.shared_comments)
-                st.metric("❤️ 总点赞数", total_likes)
+                # 服务器端直链解析（按视频链接缓存）
+                import hls_relay
+                import stream_resolver
+                stream_stats = stream_resolver.get_resolver().stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("🎯 直链缓存条目", f"{stream_stats['size']}/{stream_stats['maxsize']}")
+                with col2:
+                    st.metric("🌐 解析页面请求", stream_stats['resolves'])
+                with col3:
+                    st.metric("❌ 未找到直链", stream_stats['failed'])
+            
+                # HLS 中继的分片磁盘缓存（没有人用过中继时不启动服务）
+                relay = hls_relay.current_relay()
+                if relay is not None:
+                    relay_stats = relay.stats()
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("📡 中继缓存", f"{relay_stats['bytes'] / 1048576:.0f}/{relay_stats['max_bytes'] / 1048576:.0f} MB")
+                    with col2:
+                        st.metric("🎯 分片命中率", f"{relay_stats['hit_ratio']:.1%}")
+                    with col3:
+                        st.metric("🌐 上游流量", f"{relay_stats['upstream_bytes'] / 1048576:.1f} MB")
+            
+                performance_panel()
     
     # 页脚
     st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; color: #FF6B35; font-family: 'Comic Sans MS', cursive; padding: 1rem;">
-        🍍 Made with love in Bikini Bottom 🧽 | 海绵宝宝 © 2024
-        <br>
-        <small>我准备好了！I'm ready! 🎵</small>
-        <br>
-        <small>🆕 全新功能：🌐 内置浏览器 | 📢 公告板 | 💬 评论区 | 🔧 管理系统</small>
-        <br>
-        <small style="color: #FF1493;">✨ 现在支持8大视频平台的内置浏览器搜索！</small>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(cards.FOOTER, unsafe_allow_html=True)
+    
+    # 页面显示完后在后台预热（每个进程只一次）
+    warmup.ensure_warmup(warmup_tasks)
 
 if __name__ == "__main__":
     main() 
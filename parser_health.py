@@ -0,0 +1,257 @@
+"""解析器健康检测 - 探测解析接口、登记健康状况并按健康排序，自动模式下竞速选出可用的解析器（后台定时探测见 probe_scheduler）
+
+requests 只在第一次创建HTTP会话时导入（导入需要几十毫秒，页面第一次显示时用不到它）。
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import quote, urlparse
+
+# 探测配置
+PROBE_TIMEOUT = (3, 5)        # (连接超时, 读取超时) 秒
+PROBE_WORKERS = 8             # 并发探测线程数
+FAILURE_THRESHOLD = 3         # 连续失败多少次视为失效
+SLOW_LATENCY = 2.0            # 超过这个延迟（秒）视为较慢
+RACE_TOP_N = 4                # 自动模式每轮同时预检的解析器数量
+
+PROBE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+}
+
+
+def make_session(pool_size=PROBE_WORKERS):
+    """创建带连接池的HTTP会话"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(PROBE_HEADERS)
+    return session
+
+
+class ParserHealthRegistry:
+    """进程内共享的解析器健康登记表，以解析接口地址为键"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = {}
+
+    def _record(self, parser_url):
+        record = self._records.get(parser_url)
+        if record is None:
+            record = {
+                'ok': None,
+                'status': None,
+                'latency': None,
+                'error': None,
+                'failure_streak': 0,
+                'success_count': 0,
+                'failure_count': 0,
+                'checked_at': None,
+            }
+            self._records[parser_url] = record
+        return record
+
+    def record_success(self, parser_url, status, latency):
+        """记录一次成功的探测"""
+        with self._lock:
+            record = self._record(parser_url)
+            record.update(ok=True, status=status, latency=latency, error=None, checked_at=time.time())
+            record['failure_streak'] = 0
+            record['success_count'] += 1
+
+    def record_failure(self, parser_url, status=None, error=None, latency=None):
+        """记录一次失败的探测"""
+        with self._lock:
+            record = self._record(parser_url)
+            record.update(ok=False, status=status, latency=latency, error=error, checked_at=time.time())
+            record['failure_streak'] += 1
+            record['failure_count'] += 1
+
+    def get(self, parser_url):
+        """返回某个解析接口的健康记录副本，没有探测过时返回None"""
+        with self._lock:
+            record = self._records.get(parser_url)
+            return dict(record) if record else None
+
+    def snapshot(self):
+        """返回所有健康记录的副本"""
+        with self._lock:
+            return {url: dict(record) for url, record in self._records.items()}
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def health_rank(self, parser_url):
+        """排序键：健康的按延迟在前，未探测的居中，失效的在最后"""
+        record = self.get(parser_url)
+        if record is None or record['ok'] is None:
+            return (1, 0.0)
+        if record['ok']:
+            return (0, record['latency'] or 0.0)
+        if record['failure_streak'] >= FAILURE_THRESHOLD:
+            return (3, float(record['failure_streak']))
+        return (2, float(record['failure_streak']))
+
+    def rank_parsers(self, parsers):
+        """按实时健康状况对解析器名称排序（稳定排序，保留原有顺序作为次序）"""
+        names = list(parsers.keys())
+        return sorted(names, key=lambda name: self.health_rank(parsers[name]))
+
+    def badge(self, parser_url):
+        """返回用于下拉框显示的健康标记"""
+        record = self.get(parser_url)
+        if record is None or record['ok'] is None:
+            return "⚪"
+        if record['ok']:
+            latency = record['latency'] or 0.0
+            icon = "🟢" if latency < SLOW_LATENCY else "🟡"
+            return f"{icon} {int(latency * 1000)}ms"
+        if record['failure_streak'] >= FAILURE_THRESHOLD:
+            return "🔴 失效"
+        return "🟠 异常"
+
+
+def probe_parser(session, parser_url, timeout=PROBE_TIMEOUT):
+    """探测单个解析接口，返回 (是否可用, 状态码, 延迟秒数, 错误信息)"""
+    import requests
+
+    start = time.perf_counter()
+    try:
+        # stream=True 只读取响应头，不下载整个页面
+        with session.get(parser_url, timeout=timeout, stream=True, allow_redirects=True) as response:
+            latency = time.perf_counter() - start
+            status = response.status_code
+            if status < 400:
+                return True, status, latency, None
+            return False, status, latency, f"HTTP {status}"
+    except requests.RequestException as e:
+        return False, None, time.perf_counter() - start, type(e).__name__
+
+
+def platform_domain(url):
+    """提取视频链接的平台域名，例如 m.v.qq.com -> qq.com（没有协议的链接按 https 处理）"""
+    if "://" not in url:
+        url = "https://" + url
+    host = (urlparse(url).hostname or "").lower()
+    labels = [label for label in host.split(".") if label]
+    if len(labels) >= 3 and labels[-2] in ("com", "net", "org", "gov", "edu") and len(labels[-1]) == 2:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+class WinnerMemory:
+    """记住每个平台域名上最近一次胜出的解析器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._winners = {}
+
+    def get(self, domain):
+        with self._lock:
+            return self._winners.get(domain)
+
+    def remember(self, domain, parser_name):
+        with self._lock:
+            self._winners[domain] = parser_name
+
+    def forget(self, domain):
+        with self._lock:
+            self._winners.pop(domain, None)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._winners)
+
+
+def race_parsers(parsers, processed_url, registry, session=None, top_n=RACE_TOP_N, timeout=PROBE_TIMEOUT):
+    """按健康排名每轮并发预检 top_n 个解析器，返回最先成功的解析器名称，全部失败返回None"""
+    # 已确认失效的线路不参与竞速，相同地址只保留排名最高的名称
+    ranked = {}
+    for name in registry.rank_parsers(parsers):
+        if registry.health_rank(parsers[name])[0] < 3:
+            ranked.setdefault(parsers[name], name)
+    ranked = list(ranked.values())
+    if session is None:
+        session = shared_session()
+    pool = ThreadPoolExecutor(max_workers=top_n, thread_name_prefix="parser-race")
+    try:
+        for start in range(0, len(ranked), top_n):
+            batch = ranked[start:start + top_n]
+            pending = {pool.submit(probe_parser, session, parsers[name] + quote(processed_url), timeout): name
+                       for name in batch}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    ok, status, latency, error = future.result()
+                    if ok:
+                        registry.record_success(parsers[name], status, latency)
+                        return name
+                    registry.record_failure(parsers[name], status, error, latency)
+        return None
+    finally:
+        # 不等待落后的预检请求，它们会在超时后自行结束
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def resolve_parser(parsers, processed_url, registry, memory, session=None, top_n=RACE_TOP_N,
+                   timeout=PROBE_TIMEOUT):
+    """自动模式：优先使用该平台上次胜出的解析器，否则竞速选出一个。
+
+    返回 (解析器名称, 是否来自记忆)，没有可用解析器时名称为None。
+    """
+    domain = platform_domain(processed_url)
+    remembered = memory.get(domain)
+    if remembered in parsers and registry.health_rank(parsers[remembered])[0] < 2:
+        return remembered, True
+    winner = race_parsers(parsers, processed_url, registry, session=session, top_n=top_n, timeout=timeout)
+    if winner is not None:
+        memory.remember(domain, winner)
+    elif remembered is not None:
+        memory.forget(domain)
+    return winner, False
+
+
+def resolve_many(parsers, processed_urls, registry, memory, session=None, top_n=RACE_TOP_N,
+                 timeout=PROBE_TIMEOUT, max_workers=PROBE_WORKERS):
+    """批量自动选线：同一平台域名只竞速一次，不同平台并发进行。
+
+    返回与 processed_urls 顺序一致的解析器名称列表（没有可用线路的为None）。
+    """
+    by_domain = {}
+    for url in processed_urls:
+        by_domain.setdefault(platform_domain(url), url)
+    if not by_domain:
+        return []
+    if session is None:
+        session = shared_session()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="parser-batch") as pool:
+        futures = {
+            domain: pool.submit(resolve_parser, parsers, url, registry, memory, session, top_n, timeout)
+            for domain, url in by_domain.items()
+        }
+        winners_by_domain = {domain: future.result()[0] for domain, future in futures.items()}
+    return [winners_by_domain[platform_domain(url)] for url in processed_urls]
+
+
+# 进程内共享的登记表和胜出记忆，所有Streamlit会话共用（后台探测见 probe_scheduler）
+registry = ParserHealthRegistry()
+winners = WinnerMemory()
+_session = None
+_session_lock = threading.Lock()
+
+
+def shared_session():
+    """进程内共享的连接池会话，供按需预检使用"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session(PROBE_WORKERS)
+        return _session
+
@@ -0,0 +1,160 @@
+"""热点路径计时 - 给页面的各个部分和存储调用计时，按名称汇总延迟分布
+
+每个名称对应一个固定大小的对数分桶直方图，所有会话共用，内存占用不随调用次数增长。
+关闭时 section() 返回同一个空的上下文管理器、timed() 只多一次判断，几乎没有开销。
+"""
+import contextlib
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# 直方图分桶：从 1 微秒开始，每个桶比上一个大约 19%，共 128 个桶（上限约 1 分钟，超出的计入最后一个桶）
+BUCKET_MIN = 1e-6
+BUCKET_FACTOR = 2 ** 0.25
+BUCKET_COUNT = 128
+_LOG_FACTOR = math.log(BUCKET_FACTOR)
+
+PERCENTILES = (50, 95, 99)
+
+_enabled = os.environ.get("PERF_TIMING", "0") == "1"
+
+
+class Histogram:
+    """固定内存的延迟直方图（秒）"""
+
+    __slots__ = ('buckets', 'count', 'total', 'max', '_lock')
+
+    def __init__(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        if seconds <= BUCKET_MIN:
+            index = 0
+        else:
+            index = min(BUCKET_COUNT - 1, int(math.log(seconds / BUCKET_MIN) / _LOG_FACTOR) + 1)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, p):
+        """估算第 p 百分位（取所在桶的上边界，不超过实际最大值）"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = self.count * p / 100
+            seen = 0
+            for index, n in enumerate(self.buckets):
+                seen += n
+                if n and seen >= rank:
+                    return min(self.max, BUCKET_MIN * BUCKET_FACTOR ** index)
+            return self.max
+
+    def summary(self):
+        with self._lock:
+            count, total, maximum = self.count, self.total, self.max
+        result = {'count': count, 'mean': total / count if count else 0.0, 'max': maximum}
+        for p in PERCENTILES:
+            result[f'p{p}'] = self.percentile(p)
+        return result
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def record(name, seconds):
+    """记录一次耗时"""
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    histogram.add(seconds)
+
+
+class _Section:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def section(name):
+    """给一段代码计时：with perf.section("名称"): ..."""
+    if not _enabled:
+        return _NOOP
+    return _Section(name)
+
+
+def timed(name):
+    """给函数计时的装饰器"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def snapshot():
+    """返回各名称的统计：[{name, count, mean, max, p50, p95, p99}]（秒），按名称排序"""
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    return [dict(name=name, **histogram.summary()) for name, histogram in items]
+
+
+def export_jsonl():
+    """导出为 JSON Lines，每个名称一行，时间单位为毫秒"""
+    now = time.time()
+    lines = []
+    for row in snapshot():
+        row = {key: round(value * 1000, 3) if isinstance(value, float) else value
+               for key, value in row.items()}
+        row['ts'] = now
+        lines.append(json.dumps(row, ensure_ascii=False))
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
@@ -0,0 +1,156 @@
+"""播放结果统计 - 按 (视频平台, 解析器) 累计播放成功/失败次数，用来给解析器排序
+
+一次播放如果在 RETRY_WINDOW 秒内被用户换了另一个解析器重新播放同一个视频，记为失败；
+否则（超过时间窗口、或者换了别的视频）记为成功。
+"""
+import threading
+import time
+
+import data_watcher
+import parser_health
+import storage
+
+RETRY_WINDOW = 120     # 多少秒内换线路重播算作上一次播放失败
+PRIOR_WEIGHT = 2       # 预设推荐相当于多少次成功播放，数据积累后会被真实结果覆盖
+
+
+def platform_lookup(platforms):
+    """平台名称 -> 网址 的字典转成 平台域名 -> 平台名称"""
+    return {parser_health.platform_domain(url): name for name, url in platforms.items()}
+
+
+def detect_platform(url, lookup):
+    """识别链接所属的平台，返回平台名称；不认识的网站返回其域名"""
+    domain = parser_health.platform_domain(url)
+    return lookup.get(domain, domain)
+
+
+class PlayStats:
+    """进程内共享的播放结果计数：{平台: {解析器: [成功次数, 失败次数]}}
+
+    记录时在文件锁下读-改-写，多个服务进程的计数会合并而不是互相覆盖；
+    其他进程记录的结果在文件变化后重新读取：有数据文件监视器时看变化代号，
+    没有（DATA_WATCH=off）时每次比较文件的版本标记。
+    """
+
+    def __init__(self, path=None, priors=None, watcher=None):
+        self.path = path
+        self.priors = priors or {}
+        self.watcher = watcher or data_watcher.UNWATCHED
+        self._paths = self.watcher.watch(path) if path else ()
+        self._checked = self.watcher.generation(self._paths)
+        self._version = storage.file_version(path) if path else None
+        self._lock = threading.Lock()
+        self._counts = (storage.read_json_file(path, {}) if path else None) or {}
+
+    def _reload(self):
+        """文件被其他进程改动过时重新读取（调用方持有锁）"""
+        if not self.path:
+            return
+        generation = self.watcher.generation(self._paths)
+        if generation is not None and generation == self._checked:
+            return
+        # 变化代号变了，或者没有监视器：文件的版本标记没变时不用重新读取
+        version = storage.file_version(self.path)
+        if version != self._version:
+            self._counts = storage.read_json_file(self.path, {}) or {}
+            self._version = version
+        self._checked = generation
+
+    def record(self, platform, parser_name, ok):
+        """记录一次播放结果"""
+        def add(counts):
+            platform_counts = counts.setdefault(platform, {}).setdefault(parser_name, [0, 0])
+            platform_counts[0 if ok else 1] += 1
+
+        with self._lock:
+            if self.path:
+                self._counts = storage.update_json_file(self.path, add, {})
+            else:
+                add(self._counts)
+
+    def counts(self, platform, parser_name):
+        """返回 (成功次数, 失败次数)"""
+        with self._lock:
+            self._reload()
+            successes, failures = self._counts.get(platform, {}).get(parser_name, (0, 0))
+            return successes, failures
+
+    def _platform_counts(self, platform):
+        with self._lock:
+            self._reload()
+            return dict(self._counts.get(platform, {}))
+
+    def _rate(self, platform, parser_name, platform_counts):
+        successes, failures = platform_counts.get(parser_name, (0, 0))
+        if self.priors.get(platform) == parser_name:
+            successes += PRIOR_WEIGHT
+        return (successes + 1) / (successes + failures + 2)
+
+    def success_rate(self, platform, parser_name):
+        """平滑后的成功率估计（没有数据时为0.5，预设推荐的线路略高）"""
+        return self._rate(platform, parser_name, self._platform_counts(platform))
+
+    def rank(self, platform, parsers, registry):
+        """按该平台上的成功率排序解析器名称；已确认失效的线路排在最后，成功率相同时按健康状况"""
+        platform_counts = self._platform_counts(platform)
+
+        def key(name):
+            health = registry.health_rank(parsers[name])
+            return (health[0] >= 3, -self._rate(platform, name, platform_counts), health)
+        return sorted(parsers, key=key)
+
+    def best(self, platform, parsers):
+        """该平台上有真实播放数据、成功率最高的解析器，没有数据时返回None"""
+        platform_counts = self._platform_counts(platform)
+        played = [name for name in platform_counts if name in parsers]
+        if not played:
+            return None
+        return max(played, key=lambda name: self._rate(platform, name, platform_counts))
+
+    def snapshot(self):
+        with self._lock:
+            self._reload()
+            return {platform: {name: list(counts) for name, counts in by_parser.items()}
+                    for platform, by_parser in self._counts.items()}
+
+
+def record_play(state, stats, platform, parser_name, url, now=None):
+    """登记一次新的播放，同时结算当前会话中上一次播放的结果。
+
+    state 是会话状态（st.session_state），只保存尚未结算的那一次播放。
+    """
+    now = time.time() if now is None else now
+    pending = state.get('pending_play')
+    if pending is not None:
+        if pending['url'] == url and pending['parser'] == parser_name:
+            # 同一线路重播同一个视频，不算新的一次
+            pending['at'] = now
+            return
+        retried = pending['url'] == url and now - pending['at'] <= RETRY_WINDOW
+        stats.record(pending['platform'], pending['parser'], not retried)
+    state['pending_play'] = {'platform': platform, 'parser': parser_name, 'url': url, 'at': now}
+
+
+def settle_play(state, stats, now=None):
+    """上一次播放超过时间窗口仍没有换线路重播，记为成功"""
+    now = time.time() if now is None else now
+    pending = state.get('pending_play')
+    if pending is not None and now - pending['at'] > RETRY_WINDOW:
+        stats.record(pending['platform'], pending['parser'], True)
+        state['pending_play'] = None
+
+
+# 进程内共享的统计实例，所有Streamlit会话共用
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def open_stats(path, priors=None):
+    """获取（必要时创建）进程内共享的播放统计，带有本进程的数据文件监视器"""
+    with _stats_lock:
+        stats = _stats.get(path)
+        if stats is None:
+            stats = PlayStats(path, priors, data_watcher.get_watcher())
+            _stats[path] = stats
+        return stats
@@ -0,0 +1,242 @@
+"""解析器探测调度器 - 在独立线程的 asyncio 事件循环中持续探测所有解析接口
+
+- 同一个域名只探测一次（PARSERS 中有好几个线路共用同一个域名），结果写给所有共用它的线路
+- 稳定可用的域名少探测，时好时坏或刚恢复的域名多探测，一直失效的域名按指数退避
+- 每个域名同时只有一个探测在进行（上一次没结束不会再发起），全局并发探测数有上限
+Streamlit 页面只读取 parser_health.registry 中的结果，不会在页面脚本里发起探测。
+设置环境变量 PARSER_PROBE=0 可以关闭后台探测（例如本地压测时不访问外网）。
+"""
+import asyncio
+import os
+import random
+import ssl
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import parser_health
+
+# 调度配置（秒）
+HEALTHY_INTERVAL = 600        # 稳定可用：10分钟探测一次
+UNSTABLE_INTERVAL = 30        # 时好时坏或刚恢复：30秒探测一次
+BACKOFF_BASE = 30             # 失效后的第一次重试间隔，之后每次翻倍
+BACKOFF_MAX = 3600            # 退避上限
+STABLE_STREAK = 3             # 连续成功多少次算稳定
+FLAP_WINDOW = 8               # 统计最近多少次结果的状态切换
+FLAP_THRESHOLD = 2            # 最近结果中状态切换多少次算时好时坏
+JITTER = 0.1                  # 间隔随机抖动比例，避免所有域名同时探测
+
+MAX_CONCURRENT_PROBES = 16    # 全局并发探测上限
+PROBE_TIMEOUT = 8             # 单次探测超时
+
+PROBE_ENABLED = os.environ.get("PARSER_PROBE", "1") != "0"
+
+
+def parser_host(parser_url):
+    """解析接口的域名（含端口）"""
+    return urlsplit(parser_url).netloc.lower()
+
+
+def group_by_host(parsers):
+    """按域名分组：域名 -> 共用这个域名的解析接口地址列表（去重，保留顺序）"""
+    groups = {}
+    for parser_url in dict.fromkeys(parsers.values()):
+        groups.setdefault(parser_host(parser_url), []).append(parser_url)
+    return groups
+
+
+async def http_probe(url, timeout=PROBE_TIMEOUT):
+    """用 asyncio 发一个 GET 请求，只读取状态行。返回 (是否可用, 状态码, 延迟秒数, 错误信息)"""
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if https else None),
+            timeout
+        )
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            f"User-Agent: {parser_health.PROBE_HEADERS['User-Agent']}\r\n"
+            "Accept: */*\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(request.encode("latin-1", errors="ignore"))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        latency = loop.time() - start
+        fields = status_line.split()
+        if len(fields) < 2 or not fields[1].isdigit():
+            return False, None, latency, "BadStatusLine"
+        status = int(fields[1])
+        if status < 400:
+            return True, status, latency, None
+        return False, status, latency, f"HTTP {status}"
+    except asyncio.TimeoutError:
+        return False, None, loop.time() - start, "Timeout"
+    except (OSError, ssl.SSLError, ValueError) as e:
+        return False, None, loop.time() - start, type(e).__name__
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+
+class HostState:
+    """单个域名的探测历史，用来计算下一次探测间隔"""
+
+    def __init__(self, host, parser_urls):
+        self.host = host
+        self.parser_urls = parser_urls
+        self.history = deque(maxlen=FLAP_WINDOW)
+        self.success_streak = 0
+        self.failure_streak = 0
+        self.next_due = 0.0
+        self.interval = 0.0
+        self.probes = 0
+
+    def record(self, ok):
+        self.history.append(ok)
+        self.probes += 1
+        if ok:
+            self.success_streak += 1
+            self.failure_streak = 0
+        else:
+            self.failure_streak += 1
+            self.success_streak = 0
+
+    def flaps(self):
+        """最近结果中状态切换的次数"""
+        history = list(self.history)
+        return sum(1 for a, b in zip(history, history[1:]) if a != b)
+
+    def next_interval(self):
+        if self.failure_streak:
+            # 一直失效：指数退避
+            base = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failure_streak - 1))
+        elif self.success_streak < STABLE_STREAK or self.flaps() >= FLAP_THRESHOLD:
+            # 刚恢复或时好时坏：频繁探测
+            base = UNSTABLE_INTERVAL
+        else:
+            base = HEALTHY_INTERVAL
+        return base * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+class ProbeScheduler:
+    """在后台线程中运行的 asyncio 探测调度器"""
+
+    def __init__(self, parsers, registry, probe=http_probe, timeout=PROBE_TIMEOUT,
+                 max_concurrent=MAX_CONCURRENT_PROBES):
+        self.registry = registry
+        self.probe = probe
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.hosts = {host: HostState(host, urls) for host, urls in group_by_host(parsers).items()}
+        self._loop = None
+        self._wake = None
+        self._stopping = False
+        self._thread = None
+        self._ready = threading.Event()
+
+    # ---- 供页面线程调用 ----
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="probe-scheduler", daemon=True)
+            self._thread.start()
+            self._ready.wait(5)
+
+    def probe_now(self):
+        """让所有域名立即重新探测一次"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._reschedule_all)
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def schedule(self):
+        """各域名的探测计划：[(域名, 距离下次探测的秒数, 当前间隔, 探测次数)]"""
+        now = time.monotonic()
+        return [(state.host, max(0.0, state.next_due - now), state.interval, state.probes)
+                for state in self.hosts.values()]
+
+    # ---- 事件循环内部 ----
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    def _reschedule_all(self):
+        for state in self.hosts.values():
+            state.next_due = 0.0
+        self._wake.set()
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        global_limit = asyncio.Semaphore(self.max_concurrent)
+        running = {}
+        self._ready.set()
+        while not self._stopping:
+            now = time.monotonic()
+            due = [state for state in self.hosts.values()
+                   if state.next_due <= now and state.host not in running]
+            for state in due:
+                running[state.host] = asyncio.create_task(
+                    self._probe_host(state, global_limit)
+                )
+            for host in [host for host, task in running.items() if task.done()]:
+                del running[host]
+            # 睡到最近一个域名到期，或者被 probe_now / stop 唤醒
+            pending = [state.next_due for state in self.hosts.values() if state.host not in running]
+            delay = max(0.05, min(pending) - time.monotonic()) if pending else 1.0
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), min(delay, 60))
+            except asyncio.TimeoutError:
+                pass
+        for task in running.values():
+            task.cancel()
+
+    async def _probe_host(self, state, global_limit):
+        async with global_limit:
+            ok, status, latency, error = await self.probe(state.parser_urls[0], self.timeout)
+        state.record(ok)
+        # 结果写给所有共用这个域名的线路
+        for parser_url in state.parser_urls:
+            if ok:
+                self.registry.record_success(parser_url, status, latency)
+            else:
+                self.registry.record_failure(parser_url, status, error, latency)
+        state.interval = state.next_interval()
+        state.next_due = time.monotonic() + state.interval
+        self._wake.set()
+
+
+# 进程内只运行一个调度器，所有Streamlit会话共用
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def ensure_scheduler(parsers):
+    """启动（仅一次）后台探测调度器，返回调度器（关闭探测时调度器不运行，probe_now 不做任何事）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ProbeScheduler(parsers, parser_health.registry)
+            if PROBE_ENABLED:
+                _scheduler.start()
+        return _scheduler
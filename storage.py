@@ -0,0 +1,893 @@
+"""数据存储后端 - 评论和公告的可插拔持久化
+
+可选后端（环境变量 STORAGE_BACKEND）：
+- json:   整个 comments.json / announcements.json 读出再整体写回（最初的实现）
+- log:    评论使用追加日志存储，公告仍然是 JSON 文件（默认）
+- sqlite: 评论和公告都存放在 WAL 模式的 SQLite 数据库中
+
+所有后端都提供同样的方法：load_comments / save_comments / page_comments /
+comment_stats / add_comment / like_comment / like_comments / delete_comment /
+get_comments / comment_version / comment_changes / load_announcements / save_announcements /
+update_announcements。评论搜索用每个后端的 search_index（见 comment_search.py）。
+JSON 文件都是原子替换写入，读-改-写在跨进程的文件锁下确认版本后才写入（见 update_json_file），
+多个服务进程可以共用同一个数据目录。open_backend 创建的后端带有数据文件监视器（见 data_watcher.py），
+文件没有被改动时读取评论、公告不再 stat 文件或查询数据库，其他进程写入后由监视器通知。
+点赞通过每个后端的 like_batcher 合并后批量写入（见 LikeBatcher）。
+
+comment_changes(since) 返回 (当前版本号, since 之后的变更)，会话据此只在评论变化时重新读取；
+变更无法给出时（版本号太旧，或后端只能判断"有变化"）变更为None，调用方整页重新读取。
+"""
+import atexit
+import copy
+import heapq
+import json
+import operator
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+
+import comment_log
+import data_watcher
+from comment_log import FileLock, comment_time_key, cursor_key, new_comment_id
+from comment_search import CommentSearchIndex
+
+# 读-改-写时文件被其他进程改动后的重试次数，用完后在锁内重新读取
+WRITE_RETRIES = 3
+
+
+def read_json_file(path, default=None):
+    """读取JSON文件，文件不存在时返回 default"""
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def file_version(path):
+    """文件的版本标记：(inode, 修改时间, 大小)，文件不存在时为None。
+
+    写入都是替换整个文件，inode 每次都会变化，修改时间精度不够时也能区分两次写入
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def write_json_file(path, data):
+    """原子地写入JSON文件：先写同目录下的临时文件并落盘，再用 os.replace 替换。
+
+    读者（包括其他进程）看到的要么是旧文件，要么是完整的新文件，写到一半崩溃也不会留下残缺的文件
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def update_json_file(path, mutate, default=None, lock=None, retries=WRITE_RETRIES):
+    """对JSON文件做读-改-写，mutate(data) 原地修改读出的数据，返回写入的数据。
+
+    乐观并发：在文件锁外读取和修改，持锁后确认文件版本没有变化才写入；
+    其他进程在这期间写过文件时重新读取重试，重试用完后在锁内读取
+    """
+    lock = lock or FileLock(path + ".lock")
+    for attempt in range(retries + 1):
+        if attempt < retries:
+            version = file_version(path)
+            data = read_json_file(path, copy.deepcopy(default))
+            mutate(data)
+        with lock:
+            if attempt == retries:
+                data = read_json_file(path, copy.deepcopy(default))
+                mutate(data)
+            elif file_version(path) != version:
+                continue
+            write_json_file(path, data)
+            return data
+
+
+class AnnouncementCache:
+    """进程内共享的公告缓存，所有会话共用。
+
+    每次读取只比较后端的版本标记（JSON 文件的 mtime/大小，或 SQLite 中的版本号），
+    没有变化时直接返回缓存；save_announcements 之后调用 invalidate() 立即失效。
+    后端有数据文件监视器时，文件的变化代号没变就连版本标记也不用读取。
+    """
+
+    _EMPTY = object()
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._value = self._EMPTY
+        self._token = None
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self):
+        """返回公告列表的副本（从未保存过公告时返回None）"""
+        generation = self.backend.watcher.generation(self.backend.announcement_paths)
+        with self._lock:
+            if self._value is not self._EMPTY and generation is not None and generation == self._generation:
+                self.hits += 1
+                return None if self._value is None else list(self._value)
+        token = self.backend.announcements_version()
+        with self._lock:
+            if self._value is not self._EMPTY and token == self._token:
+                self.hits += 1
+                self._generation = generation
+                return None if self._value is None else list(self._value)
+        value = self.backend.load_announcements()
+        with self._lock:
+            self.misses += 1
+            self._value = value
+            self._token = token
+            self._generation = generation
+        return None if value is None else list(value)
+
+    def invalidate(self):
+        with self._lock:
+            self._value = self._EMPTY
+            self._token = None
+            self._generation = None
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+# 点赞缓冲的写入间隔（秒）
+LIKE_FLUSH_INTERVAL = 0.3
+
+# 所有点赞缓冲，进程退出时统一写入
+_like_batchers = weakref.WeakSet()
+
+
+class LikeBatcher:
+    """点赞的写后缓冲，所有会话共用。
+
+    点赞先在内存中按评论ID累加，后台线程在第一次点赞后等待 interval 秒，
+    把这段时间内的所有点赞用一次 like_comments 写入后端；
+    写入失败时计数放回缓冲下次重试，进程正常退出时（atexit）写入剩余的点赞。
+    """
+
+    def __init__(self, backend, interval=LIKE_FLUSH_INTERVAL):
+        self.backend = backend
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        self.clicks = 0
+        self.flushes = 0
+        self.dropped = 0
+        _like_batchers.add(self)
+
+    def add(self, comment_id, n=1):
+        """记录一次点赞（不写磁盘）"""
+        with self._lock:
+            if not self._closed:
+                self._pending[comment_id] = self._pending.get(comment_id, 0) + n
+                self.clicks += 1
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="like-batcher", daemon=True)
+                    self._thread.start()
+                self._wake.set()
+                return
+        # 已经关闭（进程正在退出）：直接写入
+        self.backend.like_comments({comment_id: n})
+
+    def pending(self):
+        """还没有写入的点赞 {评论ID: 次数}"""
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """立即写入缓冲中的点赞，返回写入的评论数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                applied = self.backend.like_comments(batch)
+            except Exception:
+                with self._lock:
+                    for comment_id, n in batch.items():
+                        self._pending[comment_id] = self._pending.get(comment_id, 0) + n
+                raise
+            with self._lock:
+                self.flushes += 1
+                # 评论在写入前已被删除
+                self.dropped += len(batch) - applied
+            return applied
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait()
+            if self._closed:
+                return
+            # 等一会儿，把这段时间内的点赞合并成一次写入
+            time.sleep(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                self._wake.set()
+
+    def close(self):
+        """停止后台线程并写入剩余的点赞"""
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clicks': self.clicks,
+                'flushes': self.flushes,
+                'pending': sum(self._pending.values()),
+                'dropped': self.dropped,
+            }
+
+
+def flush_pending_likes():
+    """写入所有后端缓冲中的点赞（进程退出时自动调用）"""
+    for batcher in list(_like_batchers):
+        batcher.close()
+
+
+atexit.register(flush_pending_likes)
+
+
+# 评论排序方式：最新在前 / 点赞最多在前
+COMMENT_ORDERS = ("newest", "likes")
+
+
+def page_from_list(comments, order="newest", limit=20, cursor=None, time_key=comment_time_key):
+    """对完整评论列表做游标分页，供没有索引的后端使用，返回的是本页评论的副本。
+
+    游标是最后一条评论的排序键（newest 为时间键，likes 为 (点赞数, 时间键)），
+    翻页之间删除或新增评论时，后面的页不会跳过或重复评论。
+    """
+    if order == "likes":
+        keyed = [((comment.get('likes', 0), time_key(comment)), comment) for comment in comments]
+    else:
+        keyed = [(time_key(comment), comment) for comment in comments]
+    if cursor is not None:
+        cursor = cursor_key(order, cursor)
+        keyed = [item for item in keyed if item[0] < cursor]
+    # 只需要本页和下一条，不用给全部评论排序（排序键含ID，不会重复）
+    page = heapq.nlargest(limit + 1, keyed, key=operator.itemgetter(0))
+    next_cursor = page[limit - 1][0] if len(page) > limit else None
+    return [dict(comment) for _, comment in page[:limit]], next_cursor
+
+
+def _new_comment(username, content, date):
+    return {
+        'id': new_comment_id(),
+        'username': username,
+        'content': content,
+        'date': date,
+        'likes': 0
+    }
+
+
+class JsonBackend:
+    """最初的实现：每次修改都整体读出再整体写回 JSON 文件"""
+    name = "json"
+
+    def __init__(self, comments_file, announcements_file, watcher=None):
+        self.comments_file = comments_file
+        self.announcements_file = announcements_file
+        self.watcher = watcher or data_watcher.UNWATCHED
+        self.comment_paths = self.watcher.watch(comments_file)
+        self.announcement_paths = self.watcher.watch(announcements_file)
+        self.announcement_cache = AnnouncementCache(self)
+        self.like_batcher = LikeBatcher(self)
+        self.search_index = CommentSearchIndex(self)
+        self._lock = threading.RLock()
+        self._comments = []      # 最近一次读取的评论列表（最新的在前）
+        self._by_id = {}         # id -> 评论，和 _comments 中是同一个对象
+        self._time_keys = {}     # id -> 时间键，分页时用，评论的时间和ID不会变
+        self._version = None     # 读取时 comments.json 的版本标记
+        self._checked = None     # 上次检查文件版本时的变化代号
+        self._change_version = 0 # 每次重新读取或写入评论加一
+        self._file_lock = FileLock(comments_file + ".lock")
+        self._announcements_file_lock = FileLock(announcements_file + ".lock")
+        self.write_conflicts = 0 # 读-改-写时发现文件已被其他进程修改的次数
+
+    def _indexed(self, check=False):
+        """返回 (评论列表, ID索引)，文件没有变化时不重新解析。
+
+        变化代号没变时连 stat 也不做；check=True（写入前）时总是检查文件版本，不依赖异步的通知
+        """
+        with self._lock:
+            generation = self.watcher.generation(self.comment_paths)
+            if not check and generation is not None and generation == self._checked:
+                return self._comments, self._by_id
+            version = file_version(self.comments_file)
+            if version is None or version != self._version:
+                comments = read_json_file(self.comments_file, [])
+                # 旧数据没有ID，补上后写回一次，之后点赞、删除都按ID定位
+                if any('id' not in comment for comment in comments):
+                    for comment in comments:
+                        comment.setdefault('id', new_comment_id())
+                    write_json_file(self.comments_file, comments)
+                    version = file_version(self.comments_file)
+                self._comments = comments
+                self._by_id = {comment['id']: comment for comment in comments}
+                if version != self._version:
+                    self._change_version += 1
+                self._version = version
+            self._checked = generation
+            return self._comments, self._by_id
+
+    def load_comments(self):
+        comments, _ = self._indexed()
+        return [dict(comment) for comment in comments]
+
+    def save_comments(self, comments):
+        with self._lock, self._file_lock:
+            write_json_file(self.comments_file, comments)
+            self._version = None
+            self.watcher.touch(self.comment_paths)
+
+    def _time_key(self, comment):
+        key = self._time_keys.get(comment['id'])
+        if key is None:
+            key = self._time_keys[comment['id']] = comment_time_key(comment)
+        return key
+
+    def page_comments(self, order="newest", limit=20, cursor=None):
+        """游标分页，返回 (本页评论, 下一页游标)"""
+        with self._lock:
+            comments, _ = self._indexed()
+            if len(self._time_keys) > 2 * len(comments):
+                # 删除的评论积累太多时重建
+                self._time_keys = {}
+            return page_from_list(comments, order, limit, cursor, self._time_key)
+
+    def comment_stats(self):
+        """返回 (评论数量, 总点赞数)"""
+        comments = self.load_comments()
+        return len(comments), sum(comment.get('likes', 0) for comment in comments)
+
+    def get_comments(self, ids):
+        """按ID取评论，顺序和 ids 一致，不存在的跳过"""
+        _, by_id = self._indexed()
+        return [dict(by_id[comment_id]) for comment_id in ids if comment_id in by_id]
+
+    def comment_version(self):
+        """进程内的评论版本号：文件没有变化时不变"""
+        with self._lock:
+            self._indexed()
+            return self._change_version
+
+    def comment_changes(self, since):
+        """JSON 文件只能判断是否变化，有变化时返回 (版本号, None) 让调用方重新读取"""
+        version = self.comment_version()
+        return version, [] if since == version else None
+
+    def _write_indexed(self):
+        """把内存中的评论列表写回文件并记录新的版本标记（调用方持有文件锁）"""
+        write_json_file(self.comments_file, self._comments)
+        self._version = file_version(self.comments_file)
+        self._change_version += 1
+        self.watcher.touch(self.comment_paths)
+
+    def _update(self, mutate):
+        """对评论做读-改-写，mutate(评论列表, ID索引) 返回 (结果, 是否有修改)。
+
+        乐观并发：解析文件（最耗时的部分）在文件锁外进行，持锁后确认文件版本没有变化
+        才修改并写入；其他进程在这期间写过文件时重新读取重试，重试用完后在锁内读取
+        """
+        with self._lock:
+            for attempt in range(WRITE_RETRIES + 1):
+                if attempt < WRITE_RETRIES:
+                    self._indexed(check=True)
+                    version = self._version
+                with self._file_lock:
+                    if attempt == WRITE_RETRIES:
+                        self._indexed(check=True)
+                    elif file_version(self.comments_file) != version:
+                        self.write_conflicts += 1
+                        continue
+                    result, changed = mutate(self._comments, self._by_id)
+                    if changed:
+                        self._write_indexed()
+                    return result
+
+    def add_comment(self, username, content, date):
+        comment = _new_comment(username, content, date)
+
+        def insert(comments, by_id):
+            comments.insert(0, comment)
+            by_id[comment['id']] = comment
+            return comment, True
+
+        return self._update(insert)
+
+    def like_comment(self, comment_id, n=1):
+        return self.like_comments({comment_id: n}) > 0
+
+    def like_comments(self, counts):
+        """批量点赞 {评论ID: 次数}，整个文件只写一次，返回生效的评论数"""
+        def add_likes(comments, by_id):
+            # 按ID索引定位（O(1)），但 JSON 文件只能整体写回
+            applied = 0
+            for comment_id, n in counts.items():
+                comment = by_id.get(comment_id)
+                if comment is not None:
+                    comment['likes'] = comment.get('likes', 0) + n
+                    applied += 1
+            return applied, applied > 0
+
+        return self._update(add_likes)
+
+    def delete_comment(self, comment_id):
+        def remove(comments, by_id):
+            comment = by_id.pop(comment_id, None)
+            if comment is None:
+                return False, False
+            comments.remove(comment)
+            return True, True
+
+        return self._update(remove)
+
+    def load_announcements(self):
+        return read_json_file(self.announcements_file)
+
+    def announcements_version(self):
+        return file_version(self.announcements_file)
+
+    def save_announcements(self, announcements):
+        with self._announcements_file_lock:
+            write_json_file(self.announcements_file, announcements)
+        self.watcher.touch(self.announcement_paths)
+
+    def update_announcements(self, mutate, default=None):
+        """读-改-写公告列表（mutate 原地修改），文件还不存在时从 default 开始，返回写入的列表"""
+        announcements = update_json_file(self.announcements_file, mutate, list(default or []),
+                                         lock=self._announcements_file_lock)
+        self.watcher.touch(self.announcement_paths)
+        return announcements
+
+
+class LogBackend(JsonBackend):
+    """评论使用追加日志存储（见 comment_log.py），公告沿用 JSON 文件"""
+    name = "log"
+
+    def __init__(self, comments_file, announcements_file, log_file, snapshot_file, watcher=None):
+        super().__init__(comments_file, announcements_file, watcher)
+        self.store = comment_log.open_store(
+            log_file, snapshot_file, legacy_comments=lambda: read_json_file(comments_file, [])
+        )
+        self.log_paths = self.watcher.watch(log_file, snapshot_file)
+        self._log_checked = None   # 上次读取日志时的变化代号
+
+    def _refresh(self):
+        """读取其他进程追加的事件；日志文件的变化代号没变时什么都不做（本进程的写入在追加时已经应用）"""
+        generation = self.watcher.generation(self.log_paths)
+        if generation is not None and generation == self._log_checked:
+            return
+        self.store.refresh()
+        self._log_checked = generation
+
+    def load_comments(self):
+        self._refresh()
+        return self.store.comments()
+
+    def save_comments(self, comments):
+        # 整体替换：把差异转换成日志事件，而不是重写全部评论
+        current = {comment['id']: comment for comment in self.load_comments()}
+        wanted = {comment['id'] for comment in comments if 'id' in comment}
+        for comment_id in current:
+            if comment_id not in wanted:
+                self.store.delete(comment_id)
+        for comment in comments:
+            old = current.get(comment.get('id'))
+            if old is None:
+                # 保留调用方给出的ID和点赞数，下次整体保存时才能对上
+                self.store.add(comment['username'], comment['content'], comment.get('date'),
+                               comment.get('id'), comment.get('likes', 0))
+            elif comment.get('likes', 0) != old.get('likes', 0):
+                self.store.like(old['id'], comment.get('likes', 0) - old.get('likes', 0))
+
+    def page_comments(self, order="newest", limit=20, cursor=None):
+        self._refresh()
+        return self.store.page(order, limit, cursor)
+
+    def comment_stats(self):
+        self._refresh()
+        return len(self.store), self.store.total_likes()
+
+    def get_comments(self, ids):
+        self._refresh()
+        return [comment for comment in map(self.store.get, ids) if comment is not None]
+
+    def comment_version(self):
+        self._refresh()
+        return self.store.version()
+
+    def comment_changes(self, since):
+        # refresh() 只读取新追加的字节，没有新事件时只是一次 stat；有监视器时连 stat 也不做
+        self._refresh()
+        return self.store.changes_since(since)
+
+    def add_comment(self, username, content, date):
+        return self.store.add(username, content, date)
+
+    def like_comment(self, comment_id, n=1):
+        if self.store.get(comment_id) is None:
+            return False
+        self.store.like(comment_id, n)
+        return True
+
+    def like_comments(self, counts):
+        counts = {comment_id: n for comment_id, n in counts.items() if self.store.get(comment_id) is not None}
+        self.store.like_many(counts)
+        return len(counts)
+
+    def delete_comment(self, comment_id):
+        if self.store.get(comment_id) is None:
+            return False
+        self.store.delete(comment_id)
+        return True
+
+
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS comments (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    username TEXT NOT NULL,
+    content TEXT NOT NULL,
+    date TEXT NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_comments_likes ON comments (likes DESC, seq DESC);
+CREATE INDEX IF NOT EXISTS idx_comments_username ON comments (username);
+
+CREATE TABLE IF NOT EXISTS announcements (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    date TEXT NOT NULL,
+    author TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_announcements_date ON announcements (date);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+-- 评论的变更记录，由触发器写入，version 是跨进程单调递增的版本号
+CREATE TABLE IF NOT EXISTS comment_events (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    comment_id TEXT NOT NULL,
+    likes INTEGER
+);
+CREATE TRIGGER IF NOT EXISTS comments_event_new AFTER INSERT ON comments BEGIN
+    INSERT INTO comment_events (op, comment_id, likes) VALUES ('new', NEW.id, NEW.likes);
+END;
+CREATE TRIGGER IF NOT EXISTS comments_event_like AFTER UPDATE OF likes ON comments BEGIN
+    INSERT INTO comment_events (op, comment_id, likes) VALUES ('like', NEW.id, NEW.likes);
+END;
+CREATE TRIGGER IF NOT EXISTS comments_event_delete AFTER DELETE ON comments BEGIN
+    INSERT INTO comment_events (op, comment_id) VALUES ('delete', OLD.id);
+END;
+-- 只保留最近的变更（每 100 条清理一次）
+CREATE TRIGGER IF NOT EXISTS comment_events_prune AFTER INSERT ON comment_events
+WHEN NEW.version % 100 = 0 BEGIN
+    DELETE FROM comment_events WHERE version <= NEW.version - {comment_log.CHANGE_FEED_SIZE};
+END;
+"""
+
+COMMENT_COLUMNS = "id, username, content, date, likes"
+
+
+class SqliteBackend:
+    """WAL 模式的 SQLite 后端，点赞是原子的 likes = likes + 1，不存在读-改-写竞争"""
+    name = "sqlite"
+
+    def __init__(self, db_file, comments_file=None, announcements_file=None, busy_timeout=10.0, watcher=None):
+        self.db_file = db_file
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        # 提交先写入 -wal 文件，检查点时才写回数据库文件，两个都要监视
+        self.watcher = watcher or data_watcher.UNWATCHED
+        self.announcement_paths = self.db_paths = self.watcher.watch(db_file, db_file + "-wal")
+        self._checked_version = None   # (变化代号, 当时的评论版本号)
+        conn = self._conn()
+        conn.executescript(SQLITE_SCHEMA)
+        self._import_legacy(comments_file, announcements_file)
+        self.announcement_cache = AnnouncementCache(self)
+        self.like_batcher = LikeBatcher(self)
+        self.search_index = CommentSearchIndex(self)
+
+    def _conn(self):
+        """每个线程一个连接（Streamlit 的每个会话运行在自己的线程中）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    def _import_legacy(self, comments_file, announcements_file):
+        """只导入一次旧的 JSON 数据"""
+        with self._transaction() as conn:
+            done = {row['key'] for row in conn.execute("SELECT key FROM meta")}
+            if comments_file and 'imported_comments' not in done:
+                comments = read_json_file(comments_file, [])
+                conn.executemany(
+                    "INSERT OR IGNORE INTO comments (id, username, content, date, likes) VALUES (?, ?, ?, ?, ?)",
+                    [(comment.get('id') or new_comment_id(), comment['username'], comment['content'],
+                      comment['date'], comment.get('likes', 0)) for comment in reversed(comments)]
+                )
+                conn.execute("INSERT INTO meta (key, value) VALUES ('imported_comments', ?)", (comments_file,))
+            if announcements_file and 'imported_announcements' not in done:
+                announcements = read_json_file(announcements_file)
+                if announcements is not None:
+                    self._insert_announcements(conn, announcements)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('imported_announcements', ?)",
+                             (announcements_file,))
+
+    def load_comments(self):
+        rows = self._conn().execute(f"SELECT {COMMENT_COLUMNS} FROM comments ORDER BY seq DESC")
+        return [dict(row) for row in rows]
+
+    def page_comments(self, order="newest", limit=20, cursor=None):
+        """键集分页：只扫描索引上本页需要的行"""
+        if order == "likes":
+            sql = f"SELECT {COMMENT_COLUMNS}, seq FROM comments"
+            params = []
+            if cursor is not None:
+                sql += " WHERE likes < ? OR (likes = ? AND seq < ?)"
+                params = [cursor[0], cursor[0], cursor[1]]
+            sql += " ORDER BY likes DESC, seq DESC LIMIT ?"
+        else:
+            sql = f"SELECT {COMMENT_COLUMNS}, seq FROM comments"
+            params = []
+            if cursor is not None:
+                sql += " WHERE seq < ?"
+                params = [cursor]
+            sql += " ORDER BY seq DESC LIMIT ?"
+        rows = [dict(row) for row in self._conn().execute(sql, params + [limit + 1])]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = (last['likes'], last['seq']) if order == "likes" else last['seq']
+        for row in rows:
+            del row['seq']
+        return rows[:limit], next_cursor
+
+    def comment_stats(self):
+        row = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(likes), 0) FROM comments").fetchone()
+        return row[0], row[1]
+
+    def get_comments(self, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        rows = self._conn().execute(
+            f"SELECT {COMMENT_COLUMNS} FROM comments WHERE id IN ({', '.join('?' * len(ids))})", ids
+        )
+        by_id = {row['id']: dict(row) for row in rows}
+        return [by_id[comment_id] for comment_id in ids if comment_id in by_id]
+
+    def _written(self):
+        """本进程提交了写入"""
+        self.watcher.touch(self.db_paths)
+
+    def comment_version(self):
+        generation = self.watcher.generation(self.db_paths)
+        checked = self._checked_version
+        if generation is not None and checked is not None and checked[0] == generation:
+            return checked[1]
+        row = self._conn().execute("SELECT COALESCE(MAX(version), 0) FROM comment_events").fetchone()
+        self._checked_version = (generation, row[0])
+        return row[0]
+
+    def comment_changes(self, since):
+        """按版本号读取变更记录（走主键索引），新评论的内容从 comments 表取"""
+        generation = self.watcher.generation(self.db_paths)
+        if generation is not None and self._checked_version == (generation, since):
+            # 数据库文件没有改动过，不用查询
+            return since, []
+        version, changes = self._query_changes(since)
+        self._checked_version = (generation, version)
+        return version, changes
+
+    def _query_changes(self, since):
+        conn = self._conn()
+        oldest, version = conn.execute(
+            "SELECT COALESCE(MIN(version), 0), COALESCE(MAX(version), 0) FROM comment_events"
+        ).fetchone()
+        if since == version:
+            return version, []
+        if since > version or since < oldest - 1:
+            return version, None
+        rows = conn.execute(
+            "SELECT e.op, e.comment_id, e.likes, c.username, c.content, c.date FROM comment_events e "
+            "LEFT JOIN comments c ON c.id = e.comment_id WHERE e.version > ? AND e.version <= ? "
+            "ORDER BY e.version", (since, version)
+        )
+        changes = []
+        for row in rows:
+            if row['op'] == 'new':
+                if row['username'] is None:
+                    continue  # 之后又被删除了
+                changes.append({'op': 'new', 'comment': {
+                    'id': row['comment_id'], 'username': row['username'], 'content': row['content'],
+                    'date': row['date'], 'likes': row['likes']}})
+            elif row['op'] == 'like':
+                changes.append({'op': 'like', 'id': row['comment_id'], 'likes': row['likes']})
+            else:
+                changes.append({'op': 'delete', 'id': row['comment_id']})
+        return version, changes
+
+    def save_comments(self, comments):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM comments")
+            conn.executemany(
+                "INSERT INTO comments (id, username, content, date, likes) VALUES (?, ?, ?, ?, ?)",
+                [(comment.get('id') or new_comment_id(), comment['username'], comment['content'],
+                  comment['date'], comment.get('likes', 0)) for comment in reversed(comments)]
+            )
+        self._written()
+
+    def add_comment(self, username, content, date):
+        comment = _new_comment(username, content, date)
+        self._conn().execute(
+            "INSERT INTO comments (id, username, content, date, likes) VALUES (:id, :username, :content, :date, :likes)",
+            comment
+        )
+        self._written()
+        return comment
+
+    def like_comment(self, comment_id, n=1):
+        cursor = self._conn().execute("UPDATE comments SET likes = likes + ? WHERE id = ?", (n, comment_id))
+        self._written()
+        return cursor.rowcount > 0
+
+    def like_comments(self, counts):
+        """批量点赞，一个事务提交"""
+        applied = 0
+        with self._transaction() as conn:
+            for comment_id, n in counts.items():
+                applied += conn.execute("UPDATE comments SET likes = likes + ? WHERE id = ?", (n, comment_id)).rowcount
+        self._written()
+        return applied
+
+    def delete_comment(self, comment_id):
+        cursor = self._conn().execute("DELETE FROM comments WHERE id = ?", (comment_id,))
+        self._written()
+        return cursor.rowcount > 0
+
+    def load_announcements(self):
+        return self._load_announcements(self._conn())
+
+    @staticmethod
+    def _load_announcements(conn):
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'announcements_saved'").fetchone() is None \
+                and conn.execute("SELECT 1 FROM announcements LIMIT 1").fetchone() is None:
+            # 从未保存过公告，和 JSON 文件不存在一样，让调用方显示默认公告
+            return None
+        rows = conn.execute("SELECT title, content, date, author FROM announcements ORDER BY seq DESC")
+        return [dict(row) for row in rows]
+
+    def announcements_version(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'announcements_version'").fetchone()
+        return row['value'] if row else None
+
+    @staticmethod
+    def _insert_announcements(conn, announcements):
+        conn.executemany(
+            "INSERT INTO announcements (title, content, date, author) VALUES (?, ?, ?, ?)",
+            [(a['title'], a['content'], a['date'], a['author']) for a in reversed(announcements)]
+        )
+
+    def _replace_announcements(self, conn, announcements):
+        conn.execute("DELETE FROM announcements")
+        self._insert_announcements(conn, announcements)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('announcements_saved', '1')")
+        # 版本号供各进程的公告缓存判断是否需要重新读取
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('announcements_version', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def save_announcements(self, announcements):
+        with self._transaction() as conn:
+            self._replace_announcements(conn, announcements)
+        self._written()
+
+    def update_announcements(self, mutate, default=None):
+        """在一个写事务中读-改-写公告列表（BEGIN IMMEDIATE 保证不会和其他进程交错）"""
+        with self._transaction() as conn:
+            announcements = self._load_announcements(conn)
+            if announcements is None:
+                announcements = copy.deepcopy(list(default or []))
+            mutate(announcements)
+            self._replace_announcements(conn, announcements)
+        self._written()
+        return announcements
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT，出错时回滚"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+
+
+BACKENDS = ("json", "log", "sqlite")
+
+# 进程内共享的后端实例
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def open_backend(kind, comments_file, announcements_file, log_file=None, snapshot_file=None, db_file=None):
+    """获取（必要时创建）进程内共享的存储后端，带有本进程的数据文件监视器"""
+    if kind not in BACKENDS:
+        raise ValueError(f"未知的存储后端: {kind}（可选: {', '.join(BACKENDS)}）")
+    key = (kind, os.path.abspath(comments_file), os.path.abspath(announcements_file))
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            watcher = data_watcher.get_watcher()
+            if kind == "json":
+                backend = JsonBackend(comments_file, announcements_file, watcher)
+            elif kind == "log":
+                backend = LogBackend(comments_file, announcements_file, log_file, snapshot_file, watcher)
+            else:
+                backend = SqliteBackend(db_file, comments_file, announcements_file, watcher=watcher)
+            _backends[key] = backend
+        return backend
@@ -0,0 +1,170 @@
+"""服务器端解析直链 - 请求解析接口的页面，从中找出 m3u8 / mp4 直链，按视频链接缓存
+
+解析页面通常把直链写在脚本变量或 JSON 里（可能带 \\/ 转义或 URL 编码），或者再嵌一层 iframe；
+这里只做静态提取（不执行页面脚本），最多跟随两层 iframe。解析结果按 (标准化后的视频链接, 解析接口) 缓存，
+同一集视频在同一条线路上再次播放时（不论哪个会话）直接使用缓存的直链，不再请求解析接口；
+换一条线路重播时重新解析（原来线路的直链可能就是播放不了的原因）。
+"""
+import html
+import re
+import threading
+from urllib.parse import unquote, urljoin
+
+import requests
+
+import parser_health
+import url_rules
+
+RESOLVE_TIMEOUT = (3, 8)          # (连接超时, 读取超时) 秒
+STREAM_CACHE_SIZE = 1024
+STREAM_CACHE_TTL = 600            # 直链通常带有时效签名，只缓存 10 分钟
+FAILURE_CACHE_TTL = 60            # 同一线路解析失败后 1 分钟内不再重复请求
+MAX_IFRAME_DEPTH = 2              # 最多跟随几层 iframe
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # 解析页面最多读取的字节数
+
+# 引号中的直链（可以是相对路径；扩展名在查询参数里的是播放器页面，不算），和正文中的绝对直链
+QUOTED_MEDIA_RE = re.compile(r"""["']([^"'\s<>?]+?\.(?:m3u8|mp4)(?:\?[^"'\s<>]*)?)["']""", re.I)
+BARE_MEDIA_RE = re.compile(r"""(?:https?:)?//[^\s"'<>()\\]+?\.(?:m3u8|mp4)(?:\?[^\s"'<>()\\]*)?""", re.I)
+IFRAME_RE = re.compile(r"""<iframe[^>]+src\s*=\s*["']([^"']+)["']""", re.I)
+
+
+def stream_kind(url):
+    """'hls'（m3u8）或 'mp4'"""
+    return 'hls' if '.m3u8' in url.lower() else 'mp4'
+
+
+def find_streams(text, base_url):
+    """从页面文本中找出所有直链（绝对地址，按出现顺序去重）"""
+    text = html.unescape(text.replace('\\/', '/'))
+    candidates = []
+    for source in (text, unquote(text)):
+        candidates += [match.group(1) for match in QUOTED_MEDIA_RE.finditer(source)]
+        candidates += [match.group(0) for match in BARE_MEDIA_RE.finditer(source)]
+        if candidates:
+            break
+    streams = []
+    for candidate in candidates:
+        url = urljoin(base_url, candidate)
+        if url.startswith(('http://', 'https://')) and url not in streams:
+            streams.append(url)
+    return streams
+
+
+def pick_stream(streams):
+    """优先选 m3u8（整集的播放列表），其次是 mp4"""
+    for url in streams:
+        if stream_kind(url) == 'hls':
+            return url
+    return streams[0] if streams else None
+
+
+def fetch_page(session, url, referer=None, timeout=RESOLVE_TIMEOUT):
+    """请求页面，返回 (最终地址, 文本)，最多读取 MAX_PAGE_BYTES"""
+    headers = {'Referer': referer} if referer else None
+    with session.get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=True) as response:
+        response.raise_for_status()
+        data = b""
+        for chunk in response.iter_content(64 * 1024):
+            data += chunk
+            if len(data) >= MAX_PAGE_BYTES:
+                break
+        return response.url, data.decode(response.encoding or 'utf-8', errors='replace')
+
+
+def extract_stream(fetch, page_url, depth=MAX_IFRAME_DEPTH, referer=None):
+    """请求解析页面并找出直链；页面里没有直链时跟随其中的 iframe。找不到时返回None"""
+    final_url, text = fetch(page_url, referer)
+    stream = pick_stream(find_streams(text, final_url))
+    if stream is not None or depth <= 0:
+        return stream
+    for src in IFRAME_RE.findall(text):
+        stream = extract_stream(fetch, urljoin(final_url, html.unescape(src)), depth - 1, final_url)
+        if stream is not None:
+            return stream
+    return None
+
+
+class StreamResolver:
+    """带缓存的直链解析，所有会话共用。
+
+    成功和失败的结果都按 (视频链接, 解析接口) 缓存（失败只缓存很短时间）；
+    多个会话同时用同一条线路解析同一个视频时只请求一次。
+    """
+
+    def __init__(self, fetch=None, ttl=STREAM_CACHE_TTL, failure_ttl=FAILURE_CACHE_TTL,
+                 maxsize=STREAM_CACHE_SIZE):
+        if fetch is None:
+            session = parser_health.make_session()
+            fetch = lambda url, referer=None: fetch_page(session, url, referer)  # noqa: E731
+        self.fetch = fetch
+        self.cache = url_rules.LRUCache(maxsize, ttl)
+        self.failures = url_rules.LRUCache(maxsize, failure_ttl)
+        self._lock = threading.Lock()
+        self._inflight = {}   # (视频链接, 解析接口) -> 正在解析时的 Event
+        self.resolves = 0     # 实际请求解析页面的次数
+        self.failed = 0
+
+    def resolve(self, video_url, parser_url):
+        """返回 ({'url', 'kind', 'parser'}, 是否来自缓存)；解析不出直链时第一项为None"""
+        processed_url, _, page_url = url_rules.build_play_url(video_url, parser_url)
+        key = (processed_url, parser_url)
+        stream = self.cache.get(key)
+        if stream is not None:
+            return stream, True
+        if self.failures.get(key):
+            return None, True
+
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            # 其他会话正在用同一条线路解析同一个视频，等它的结果（失败也直接沿用，不再请求一次）
+            event.wait(sum(RESOLVE_TIMEOUT) * (MAX_IFRAME_DEPTH + 1))
+            stream = self.cache.get(key)
+            if stream is not None:
+                return stream, True
+            if self.failures.get(key):
+                return None, True
+
+        try:
+            with self._lock:
+                self.resolves += 1
+            try:
+                url = extract_stream(self.fetch, page_url)
+            except (requests.RequestException, ValueError):
+                url = None
+            if url is None:
+                with self._lock:
+                    self.failed += 1
+                self.failures.put(key, True)
+                return None, False
+            stream = {'url': url, 'kind': stream_kind(url), 'parser': parser_url}
+            self.cache.put(key, stream)
+            return stream, False
+        finally:
+            if owner:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self._lock:
+            stats['resolves'] = self.resolves
+            stats['failed'] = self.failed
+        return stats
+
+
+# 进程内共享的解析器
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver():
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = StreamResolver()
+        return _resolver
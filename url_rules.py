@@ -0,0 +1,286 @@
+"""视频链接标准化规则 - 按域名查表分派，每个链接只解析一次"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, quote
+
+# 只匹配 协议 和 域名 部分，其余部分原样保留（比 urlsplit 快得多）
+URL_RE = re.compile(r'([a-zA-Z][a-zA-Z0-9+.-]*)://([^/?#]*)')
+# 批量处理时一次匹配所有链接（每行一个）：(协议, 域名部分, 剩余部分)，没有协议的行前两项为空
+BATCH_RE = re.compile(r'^(?:([a-zA-Z][a-zA-Z0-9+.-]*)://([^/?#\n]*))?(.*)$', re.M)
+
+# 播放链接缓存的容量和有效期（秒）
+PLAY_CACHE_SIZE = 2048
+PLAY_CACHE_TTL = 6 * 3600
+
+# 预编译的各平台正则
+TENCENT_VID_RE = re.compile(r'vid=([^&]+)')
+BILIBILI_EP_RE = re.compile(r'/bangumi/play/ep(\d+)')
+MGTV_PLAY_RE = re.compile(r'^/b/(\d+)/(\d+)\.html')
+MIGU_DETAIL_RE = re.compile(r'^/(?:m|mgs)/detail/(\d+)')
+
+# 域名 -> 处理函数，处理函数返回 (标准化链接, 提示信息) 或 None
+RULES = {}
+
+
+def rule(*domains):
+    """注册某些域名（及其子域名）的处理函数"""
+    def register(handler):
+        for domain in domains:
+            RULES[domain] = handler
+        return handler
+    return register
+
+
+def _path(parts):
+    """链接的路径部分"""
+    return parts[2].partition("#")[0].partition("?")[0]
+
+
+def _query(parts):
+    """链接的参数部分"""
+    return parts[2].partition("#")[0].partition("?")[2]
+
+
+def _with_host(parts, host):
+    """替换链接中的域名，其余部分保持不变"""
+    return f"{parts[0]}://{host}{parts[2]}"
+
+
+@rule("v.qq.com")
+def _tencent(parts, host, url):
+    # 提取vid参数，转换为PC版标准链接
+    query = _query(parts)
+    # 参数里没有 vid（也没有转义字符）时不用解析参数，直接看整个链接
+    vid = parse_qs(query).get('vid', [None])[0] if "vid" in query or "%" in query else None
+    if vid is None:
+        match = TENCENT_VID_RE.search(url)
+        vid = match.group(1) if match else None
+    if vid:
+        return f"https://v.qq.com/x/cover/{vid}.html", f"🎬 腾讯视频链接已转换: {vid}"
+    return None
+
+
+@rule("iqiyi.com")
+def _iqiyi(parts, host, url):
+    if host == "m.iqiyi.com":
+        return _with_host(parts, "www.iqiyi.com"), "📺 爱奇艺链接已转换为PC版"
+    return None
+
+
+@rule("youku.com")
+def _youku(parts, host, url):
+    if host == "m.youku.com":
+        return _with_host(parts, "v.youku.com"), "🎞️ 优酷链接已转换为PC版"
+    return None
+
+
+@rule("bilibili.com")
+def _bilibili(parts, host, url):
+    if host == "m.bilibili.com":
+        return _with_host(parts, "www.bilibili.com"), "📱 B站链接已转换为PC版"
+    # 番剧链接（ep开头的）去掉多余参数
+    match = BILIBILI_EP_RE.match(_path(parts))
+    if match:
+        ep_id = match.group(1)
+        return f"https://www.bilibili.com/bangumi/play/ep{ep_id}", f"📺 B站番剧链接已标准化: ep{ep_id}"
+    return None
+
+
+@rule("mgtv.com")
+def _mgtv(parts, host, url):
+    if host in ("m.mgtv.com", "mgtv.com"):
+        match = MGTV_PLAY_RE.match(_path(parts))
+        if match:
+            return (f"https://www.mgtv.com/b/{match.group(1)}/{match.group(2)}.html",
+                    "🍊 芒果TV链接已转换为PC版")
+    return None
+
+
+@rule("miguvideo.com")
+def _migu(parts, host, url):
+    if host != "www.miguvideo.com":
+        match = MIGU_DETAIL_RE.match(_path(parts))
+        if match:
+            return f"https://www.miguvideo.com/p/detail/{match.group(1)}", "🎵 咪咕视频链接已转换为PC版"
+    return None
+
+
+@rule("cctv.com")
+def _cctv(parts, host, url):
+    if host == "m.tv.cctv.com":
+        return _with_host(parts, "tv.cctv.com"), "🏠 CCTV链接已转换为PC版"
+    return None
+
+
+@rule("sohu.com")
+def _sohu(parts, host, url):
+    if host == "m.tv.sohu.com":
+        return _with_host(parts, "tv.sohu.com"), "🌟 搜狐视频链接已转换为PC版"
+    return None
+
+
+# 域名 -> 处理函数 的查找结果缓存（域名种类很少，超过上限就清空）
+_host_cache = {}
+HOST_CACHE_SIZE = 4096
+
+
+def find_rule(host):
+    """按域名查找处理函数：先查完整域名，再逐级查上级域名"""
+    try:
+        return _host_cache[host]
+    except KeyError:
+        pass
+    handler = None
+    domain = host
+    while domain:
+        handler = RULES.get(domain)
+        if handler is not None:
+            break
+        _, _, domain = domain.partition(".")
+    if len(_host_cache) >= HOST_CACHE_SIZE:
+        _host_cache.clear()
+    _host_cache[host] = handler
+    return handler
+
+
+def _host(netloc):
+    """去掉用户名和端口，统一小写"""
+    return netloc.rpartition("@")[2].partition(":")[0].lower()
+
+
+def split_url(url):
+    """拆分链接，返回 (协议, 域名, 剩余部分) 和小写域名；没有协议的链接按 https 处理"""
+    match = URL_RE.match(url)
+    if match is None:
+        url = "https://" + url
+        match = URL_RE.match(url)
+    scheme, netloc = match.groups()
+    return (scheme, netloc, url[match.end():]), _host(netloc)
+
+
+def normalize_url(url):
+    """标准化一个视频链接，返回 (处理后的链接, 提示信息或None)"""
+    url = url.strip()
+    parts, host = split_url(url)
+    handler = find_rule(host)
+    if handler is not None:
+        result = handler(parts, host, url)
+        if result is not None:
+            return result
+    return url, None
+
+
+def normalize_many(urls):
+    """批量标准化，返回与输入顺序一致的 [(处理后的链接, 提示信息), ...]
+
+    所有链接拼成一段文本用一次正则拆分，同一个域名部分只计算一次小写域名和处理函数，
+    没有处理规则的域名（大多数链接）不再调用处理函数。
+    """
+    urls = [url.strip() for url in urls]
+    rows = BATCH_RE.findall("\n".join(urls))
+    if len(rows) != len(urls):
+        # 链接中间含有换行，无法按行对应，逐个处理
+        return [normalize_url(url) for url in urls]
+    hosts = {}   # 域名部分 -> (小写域名, 处理函数)
+    results = []
+    append = results.append
+    for url, (scheme, netloc, rest) in zip(urls, rows):
+        if not scheme:
+            append(normalize_url(url))
+            continue
+        entry = hosts.get(netloc)
+        if entry is None:
+            host = _host(netloc)
+            entry = hosts[netloc] = (host, find_rule(host))
+        host, handler = entry
+        result = handler((scheme, netloc, rest), host, url) if handler is not None else None
+        append(result if result is not None else (url, None))
+    return results
+
+
+def parse_url_list(text):
+    """从粘贴的文本或上传的文件内容中提取链接：每行一个（也可用空格分隔），
+    忽略空行和 # 开头的注释行，重复的链接只保留第一次出现的"""
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        urls.extend(line.split())
+    return list(dict.fromkeys(urls))
+
+
+class LRUCache:
+    """线程安全、有容量上限和有效期的 LRU 缓存"""
+
+    def __init__(self, maxsize=PLAY_CACHE_SIZE, ttl=PLAY_CACHE_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._data = OrderedDict()   # key -> (过期时间, 值)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+# 进程内共享的播放链接缓存：(原始链接, 解析接口) -> (处理后的链接, 提示信息, 最终播放链接)
+play_url_cache = LRUCache()
+
+
+def build_play_url(url, parser_url=None):
+    """标准化链接并拼出解析播放链接，结果按 (原始链接, 解析接口) 缓存。
+
+    parser_url 为None时只做标准化，最终播放链接为None。
+    """
+    key = (url, parser_url)
+    result = play_url_cache.get(key)
+    if result is None:
+        processed_url, conversion_msg = normalize_url(url)
+        full_url = f"{parser_url}{quote(processed_url)}" if parser_url is not None else None
+        result = (processed_url, conversion_msg, full_url)
+        play_url_cache.put(key, result)
+    return result
@@ -0,0 +1,90 @@
+"""进程预热 - 在后台线程中提前准备各会话共用的缓存，不占用页面第一次显示的时间
+
+新会话的第一屏只需要置顶公告和侧边栏，评论、搜索索引、直链解析等都在打开对应标签页或开始播放时才读取/导入。
+页面显示完后，预热线程依次执行各项任务（读取评论、建立搜索索引、导入播放时才用到的模块……），
+之后第一个打开评论区、搜索或播放的用户就不用再等这些。
+
+Streamlit 没有服务启动时的回调，预热由进程中第一个会话的第一次运行触发（每个进程只执行一次）；
+设置环境变量 APP_WARMUP=0 可以关闭。每项任务的耗时记入性能计时（warmup.<名称>），失败只记录，不影响页面。
+"""
+import os
+import threading
+import time
+
+import perf
+
+WARMUP_ENABLED = os.environ.get("APP_WARMUP", "1") != "0"
+
+
+class Warmup:
+    """按顺序执行一组 (名称, 函数) 预热任务"""
+
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+        self.timings = {}    # 名称 -> 耗时（秒）
+        self.errors = {}     # 名称 -> 异常说明
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    def run(self):
+        self.started = time.time()
+        try:
+            for name, task in self.tasks:
+                start = time.perf_counter()
+                try:
+                    task()
+                except Exception as e:
+                    self.errors[name] = f"{type(e).__name__}: {e}"
+                elapsed = time.perf_counter() - start
+                self.timings[name] = elapsed
+                perf.record(f"warmup.{name}", elapsed)
+        finally:
+            self.finished = time.time()
+            self._done.set()
+
+    def start(self):
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        """等待预热完成，返回是否已完成"""
+        return self._done.wait(timeout)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def stats(self):
+        return {
+            'done': self.done,
+            'seconds': sum(self.timings.values()),
+            'tasks': dict(self.timings),
+            'errors': dict(self.errors),
+        }
+
+
+# 每个进程只预热一次
+_warmup = None
+_warmup_lock = threading.Lock()
+
+
+def ensure_warmup(tasks):
+    """启动（仅一次）后台预热，返回预热对象；关闭预热时返回None。
+
+    tasks 是返回任务列表的函数，只在第一次调用时执行，之后的会话调用这里几乎没有开销。
+    """
+    global _warmup
+    if not WARMUP_ENABLED:
+        return None
+    if _warmup is not None:
+        return _warmup
+    with _warmup_lock:
+        if _warmup is None:
+            _warmup = Warmup(tasks()).start()
+        return _warmup
+
+
+def current_warmup():
+    """已经开始的预热（还没有会话运行过时为None）"""
+    return _warmup